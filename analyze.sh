@@ -24,18 +24,30 @@ TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 # Create log file path
 LOG_FILE="/tmp/${EXECUTABLE_NAME}-${TIMESTAMP}.log"
 
+# With MEMLOG_FORMAT=compact the stores go to a binary stream next to the log;
+# with MEMLOG_FORMAT=stats only per-buffer statistics are logged
+PARSE_INPUT="$LOG_FILE"
+PARSER_OPTS=""
+if [ "$MEMLOG_FORMAT" = "compact" ]; then
+    PARSE_INPUT="/tmp/${EXECUTABLE_NAME}-${TIMESTAMP}.mlc"
+    MEMLOG_OPTS="$MEMLOG_OPTS --memlog-format=compact --memlog-compact-file=$PARSE_INPUT"
+elif [ "$MEMLOG_FORMAT" = "stats" ]; then
+    MEMLOG_OPTS="$MEMLOG_OPTS --memlog-format=stats"
+    PARSER_OPTS="--stats"
+fi
+
 echo "Running valgrind on $EXECUTABLE..."
 echo "Log file: $LOG_FILE"
 
 # Run valgrind
-/opt/valgrind/inst/bin/valgrind --tool=memcheck --leak-check=no --track-origins=no --log-file="$LOG_FILE" --undef-value-errors=no --time-stamp=yes -- "$EXECUTABLE"
+/opt/valgrind/inst/bin/valgrind --tool=memcheck --leak-check=no --track-origins=no --log-file="$LOG_FILE" --undef-value-errors=no --time-stamp=yes $MEMLOG_OPTS -- "$EXECUTABLE"
 
 # Check if valgrind ran successfully
 if [ $? -eq 0 ]; then
     echo "Valgrind completed successfully. Parsing log file..."
     
     # Run the memory log parser
-    /usr/memlog_parser.py "$LOG_FILE"
+    /usr/memlog_parser.py $PARSER_OPTS "$PARSE_INPUT"
     
     echo "Analysis complete. Log file: $LOG_FILE"
 else
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Local multi-process check of the --claims protocol.
+
+Parses a synthetic log, then starts several `memlog_parser.py --parsed-dir
+... --claims` workers on the same directory at once, optionally killing one
+of them mid-run so that its claims have to be reclaimed. Once all workers
+exit it checks that:
+  - every float/double buffer has a .compression output and a .done marker
+  - without a kill, the compressor ran exactly once per buffer (from each
+    worker's metrics JSON); with a kill, the survivors ran it at most once
+    per buffer, plus once per reclaimed claim
+  - exactly one worker wrote the .analyzed files
+Exits with status 1 and prints the failed checks otherwise.
+"""
+from __future__ import annotations
+import argparse
+import json
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PARSER = BENCH_DIR.parent / "memlog_parser.py"
+sys.path.insert(0, str(BENCH_DIR))
+
+import memlog_bench  # noqa: E402
+from memlog_bench import memlog_parser  # noqa: E402
+
+def make_parsed_dir(work_dir: Path, buffers: int, stores: int, seed: int) -> tuple:
+    """A parsed directory of `buffers` smooth double buffers; returns
+    (parsed_dir, float/double buffer names)."""
+    log_path = work_dir / "claims.log"
+    memlog_bench.generate_log(log_path, live_set=8, buffers=buffers, stores_per_buffer=stores,
+                              interleave=16, reuse=0.0, pattern="smooth", buffer_size=stores * 8,
+                              float_fraction=0.0, fmt="text", seed=seed)
+    parsed_dir = memlog_parser.parse_log(log_path)
+    names = [f.name for f in memlog_parser.list_buffers(parsed_dir) if "_object_" not in f.name]
+    return parsed_dir, names
+
+def run_workers(parsed_dir: Path, work_dir: Path, processes: int, workers: int, lease: float,
+                kill_after: float | None) -> list:
+    """Runs the workers to completion; returns [(proc, metrics_dir, output, killed)]."""
+    runs = []
+    for k in range(processes):
+        metrics_dir = work_dir / f"worker{k}"
+        metrics_dir.mkdir()
+        out = open(metrics_dir / "output.txt", "w")
+        cmd = [sys.executable, str(PARSER), "--parsed-dir", str(parsed_dir), "--claims",
+               "--lease", str(lease), "--workers", str(workers), "--no-prescreen",
+               "--metrics-dir", str(metrics_dir)]
+        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT)
+        runs.append([proc, metrics_dir, out, False])
+
+    if kill_after is not None:
+        time.sleep(kill_after)
+        if runs[0][0].poll() is None:
+            runs[0][0].send_signal(signal.SIGKILL)
+            runs[0][3] = True
+            print(f"[claims-check] Killed worker0 after {kill_after:g}s", file=sys.stderr)
+
+    results = []
+    for proc, metrics_dir, out, killed in runs:
+        proc.wait()
+        out.close()
+        results.append((proc, metrics_dir, (metrics_dir / "output.txt").read_text(), killed))
+    return results
+
+def check(parsed_dir: Path, names: list, results: list) -> list:
+    """The failed checks (empty when the run was correct)."""
+    failures = []
+    claims_dir = parsed_dir / memlog_parser.CLAIMS_DIR
+    missing = [n for n in names if memlog_parser.read_compression_output(parsed_dir / n) is None
+               or not (claims_dir / f"{n}.done").exists()]
+    if missing:
+        failures.append(f"{len(missing)} buffers without output or .done marker, e.g. {missing[0]}")
+
+    jobs = reclaimed = 0
+    analysis_writers = 0
+    killed_any = False
+    for proc, metrics_dir, output, killed in results:
+        if killed:
+            killed_any = True
+            continue
+        if proc.returncode != 0:
+            failures.append(f"{metrics_dir.name} exited with {proc.returncode}")
+        summary = json.loads((metrics_dir / "memlog_parser.metrics.json").read_text())
+        jobs += len(summary["jobs"])
+        reclaimed += summary["counters"].get("memlog_claims_reclaimed_total", 0)
+        if "[claims] Analysis" not in output:
+            analysis_writers += 1
+        print(f"[claims-check] {metrics_dir.name}: {len(summary['jobs'])} jobs, "
+              f"{summary['counters'].get('memlog_claims_total', 0)} claims, "
+              f"{summary['counters'].get('memlog_claims_reclaimed_total', 0)} reclaimed", file=sys.stderr)
+
+    if killed_any:
+        if jobs > len(names) + reclaimed:
+            failures.append(f"{jobs} compressor jobs for {len(names)} buffers and {reclaimed} reclaims")
+    elif jobs != len(names):
+        failures.append(f"{jobs} compressor jobs for {len(names)} buffers")
+    if analysis_writers != 1:
+        failures.append(f"{analysis_writers} workers wrote the analysis")
+    return failures
+
+# -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Check the --claims protocol with several local processes.")
+    parser.add_argument("--work-dir", default="/tmp/memlog-claims", help="Scratch directory (wiped on start)")
+    parser.add_argument("--buffers", type=int, default=200, help="Buffers in the parsed directory")
+    parser.add_argument("--stores", type=int, default=512, help="Stores per buffer")
+    parser.add_argument("--processes", type=int, default=3, help="Workers started on the directory")
+    parser.add_argument("--workers", type=int, default=2, help="Compressors per worker process")
+    parser.add_argument("--lease", type=float, default=5.0, help="Claim lease in seconds")
+    parser.add_argument("--kill-after", type=float, default=None, help="SIGKILL the first worker after this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not memlog_bench.COMPRESSOR.exists():
+        print(f"[claims-check] {memlog_bench.COMPRESSOR} not found", file=sys.stderr)
+        sys.exit(1)
+    work_dir = Path(args.work_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True)
+
+    parsed_dir, names = make_parsed_dir(work_dir, args.buffers, args.stores, args.seed)
+    print(f"[claims-check] {len(names)} buffers in {parsed_dir}, starting {args.processes} workers", file=sys.stderr)
+    start = time.perf_counter()
+    results = run_workers(parsed_dir, work_dir, args.processes, args.workers, args.lease, args.kill_after)
+    print(f"[claims-check] Workers finished in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    failures = check(parsed_dir, names, results)
+    for failure in failures:
+        print(f"[claims-check] FAILED: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("[claims-check] OK", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+/*
+ * Parameterized store kernel for the memlog benchmarks (see memlog_bench.py).
+ *
+ *   kernel <buffers> <elements> <live> <timesteps> <pattern> <type>
+ *
+ * Allocates <buffers> arrays of <elements> floats or doubles, keeping at most
+ * <live> of them alive at a time, and rewrites every element of each array
+ * <timesteps> times with values following <pattern>:
+ *   zeros     all elements are 0
+ *   constant  all elements hold the same value
+ *   smooth    slowly varying values (small XOR with the previous element)
+ *   random    pseudo-random mantissas
+ */
+
+static uint64_t rng_state = 0x9E3779B97F4A7C15ULL;
+
+static uint64_t next_random(void)
+{
+    rng_state ^= rng_state << 13;
+    rng_state ^= rng_state >> 7;
+    rng_state ^= rng_state << 17;
+    return rng_state;
+}
+
+static double pattern_value(const char* pattern, size_t i, int step)
+{
+    if (strcmp(pattern, "zeros") == 0) {
+        return 0.0;
+    } else if (strcmp(pattern, "constant") == 0) {
+        return 1.5;
+    } else if (strcmp(pattern, "smooth") == 0) {
+        return 1.0 + 1e-3 * (double)i + 1e-6 * step;
+    }
+    return (double)(next_random() >> 11) / (double)(1ULL << 53);
+}
+
+static void fill(void* buf, size_t elements, int is_double, const char* pattern, int step)
+{
+    for (size_t i = 0; i < elements; i++) {
+        double v = pattern_value(pattern, i, step);
+        if (is_double) {
+            ((volatile double*)buf)[i] = v;
+        } else {
+            ((volatile float*)buf)[i] = (float)v;
+        }
+    }
+}
+
+int main(int argc, char** argv)
+{
+    if (argc != 7) {
+        fprintf(stderr, "Usage: %s <buffers> <elements> <live> <timesteps> <zeros|constant|smooth|random> <float|double>\n", argv[0]);
+        return 1;
+    }
+
+    int buffers      = atoi(argv[1]);
+    size_t elements  = strtoull(argv[2], NULL, 10);
+    int live         = atoi(argv[3]);
+    int timesteps    = atoi(argv[4]);
+    const char* pattern = argv[5];
+    int is_double    = strcmp(argv[6], "double") == 0;
+    size_t elem_size = is_double ? sizeof(double) : sizeof(float);
+
+    if (live < 1) live = 1;
+    void** ring = calloc(live, sizeof(void*));
+
+    for (int b = 0; b < buffers; b++) {
+        int slot = b % live;
+        free(ring[slot]);
+        ring[slot] = malloc(elements * elem_size);
+        for (int t = 0; t < timesteps; t++) {
+            fill(ring[slot], elements, is_double, pattern, t);
+        }
+    }
+
+    for (int i = 0; i < live; i++) {
+        free(ring[i]);
+    }
+    free(ring);
+    return 0;
+}
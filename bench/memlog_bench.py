@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Reproducible benchmarks for the memlog pipeline.
+
+Generates synthetic memlog logs with controlled properties, runs each
+pipeline stage (parse_log, FileCache, robust_parallel_compress,
+process_compression) in a fresh process and, optionally, runs the
+parameterized kernel in kernel.c under the memlog tool. Results are printed
+as JSON and can be compared against a stored baseline.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import queue as queue_mod
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(1, "/usr")
+
+import memlog_parser  # noqa: E402
+
+COMPRESSOR = Path("/usr/mmu_compressor")
+BASE_ADDR = 0x10000000
+PAGE_SIZE = 4096
+
+# ---------------- Synthetic log generator ----------------
+def _pattern_values(rng: np.random.Generator, pattern: str, n: int, first: int, is_double: bool) -> np.ndarray:
+    """Raw bit patterns of n stored values (element indices first..first+n)."""
+    if pattern == "zeros":
+        vals = np.zeros(n)
+    elif pattern == "constant":
+        vals = np.full(n, 1.5)
+    elif pattern == "smooth":
+        vals = 1.0 + 1e-3 * np.arange(first, first + n)
+    elif pattern == "random":
+        vals = rng.random(n)
+    else:
+        raise ValueError(f"Unknown value pattern: {pattern}")
+    if is_double:
+        return vals.astype(np.float64).view(np.uint64)
+    return vals.astype(np.float32).view(np.uint32).astype(np.uint64)
+
+def _varint(v: int, out: bytearray):
+    while v >= 0x80:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+
+class _CompactWriter:
+    """Python mirror of the tool's --memlog-format=compact encoder."""
+    SYNC_INTERVAL = 4096
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.prev_addr = 0
+        self.prev_value = 0
+        self.since_sync = 0
+        fh.write(memlog_parser.COMPACT_MAGIC)
+
+    def _record(self, tag: int, a: int, b: int, out: bytearray):
+        _varint(tag, out)
+        _varint(a, out)
+        _varint(b, out)
+
+    def block_event(self, tag: int, start: int, size: int):
+        out = bytearray()
+        self._record(tag, start, size, out)
+        self._record(memlog_parser.COMPACT_TAG_EXTRA, 1, 0, out)
+        self.fh.write(out)
+
+    def stores(self, addrs: List[int], values: List[int]):
+        out = bytearray()
+        for addr, value in zip(addrs, values):
+            if self.since_sync == 0:
+                self._record(memlog_parser.COMPACT_TAG_SYNC, addr, value, out)
+            else:
+                delta = (addr - self.prev_addr) & 0xFFFFFFFFFFFFFFFF
+                if delta >= 1 << 63:
+                    delta -= 1 << 64
+                zz = ((delta << 1) ^ (delta >> 63)) & 0xFFFFFFFFFFFFFFFF
+                x = value ^ self.prev_value
+                tz = (x & -x).bit_length() - 1 if x else 0
+                self._record(tz, zz, x >> tz, out)
+            self.prev_addr, self.prev_value = addr, value
+            self.since_sync = (self.since_sync + 1) % self.SYNC_INTERVAL
+        self.fh.write(out)
+
+def generate_log(path: Path, *, live_set: int, buffers: int, stores_per_buffer: int,
+                 interleave: int, reuse: float, pattern: str, buffer_size: int,
+                 float_fraction: float, fmt: str, seed: int) -> Dict[str, int]:
+    """Writes a synthetic memlog log and returns its store and byte counts.
+
+    live_set          buffers alive at the same time
+    buffers           allocation lifetimes in the whole log
+    stores_per_buffer stores to each buffer before it is freed
+    interleave        consecutive stores to one buffer before switching to the
+                      next live buffer (1 = fully interleaved)
+    reuse             probability that a new buffer reuses a freed address
+    """
+    rng = np.random.default_rng(seed)
+    next_addr = BASE_ADDR
+    freed: List[int] = []
+    live: List[dict] = []
+    allocated = 0
+    total_stores = 0
+
+    fh = open(path, "wb")
+    compact = _CompactWriter(fh) if fmt == "compact" else None
+    if not compact:
+        # Allocation (ECU 1) and free (ECU 2) sites, written once like the tool does
+        fh.write(b"===CONTEXT START===\nECU 1\n"
+                 b"==1==    at 0x484177B: malloc (vg_replace_malloc.c:446)\n"
+                 b"==1==    by 0x109178: kernel (bench.c:1)\n===CONTEXT END===\n"
+                 b"===CONTEXT START===\nECU 2\n"
+                 b"==1==    at 0x4844B83: free (vg_replace_malloc.c:989)\n"
+                 b"==1==    by 0x1091A0: kernel (bench.c:2)\n===CONTEXT END===\n")
+
+    def _alloc():
+        nonlocal next_addr, allocated
+        if freed and rng.random() < reuse:
+            start = freed.pop(int(rng.integers(len(freed))))
+        else:
+            start = next_addr
+            next_addr += (buffer_size + PAGE_SIZE) // PAGE_SIZE * PAGE_SIZE
+        is_double = rng.random() >= float_fraction
+        live.append({"start": start, "is_double": is_double, "done": 0})
+        allocated += 1
+        if compact:
+            compact.block_event(memlog_parser.COMPACT_TAG_ALLOC, start, buffer_size)
+        else:
+            fh.write(f"===ALLOC START===\nStart 0x{start:x}, size {buffer_size}, ecu 1\n===ALLOC END===\n".encode())
+
+    def _free(buf: dict):
+        live.remove(buf)
+        freed.append(buf["start"])
+        if compact:
+            compact.block_event(memlog_parser.COMPACT_TAG_FREE, buf["start"], buffer_size)
+        else:
+            fh.write(f"===FREE START===\nStart 0x{buf['start']:x}, size {buffer_size}, ecu 2\n===FREE END===\n".encode())
+
+    while allocated < min(live_set, buffers):
+        _alloc()
+
+    turn = 0
+    while live:
+        buf = live[turn % len(live)]
+        elem = 8 if buf["is_double"] else 4
+        n_elems = buffer_size // elem
+        n = min(interleave, stores_per_buffer - buf["done"])
+        idx = (buf["done"] + np.arange(n)) % n_elems
+        addrs = (buf["start"] + idx * elem).tolist()
+        values = _pattern_values(rng, pattern, n, buf["done"], buf["is_double"]).tolist()
+        if compact:
+            compact.stores(addrs, values)
+        else:
+            fh.write("".join(f"0x{a:x} 0x{v:x}\n" for a, v in zip(addrs, values)).encode())
+        buf["done"] += n
+        total_stores += n
+        turn += 1
+
+        if buf["done"] >= stores_per_buffer:
+            _free(buf)
+            if allocated < buffers:
+                _alloc()
+
+    fh.close()
+    return {"stores": total_stores, "bytes": path.stat().st_size}
+
+# ---------------- Stages ----------------
+def _peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _stage_parse(log_path: str) -> dict:
+    memlog_parser.parse_log(log_path)
+    return {}
+
+def _stage_filecache(out_dir: str, paths: int, lines: int, max_open: int) -> dict:
+    cache = memlog_parser.FileCache(max_open=max_open)
+    targets = [Path(out_dir) / f"cache_{i}.txt" for i in range(paths)]
+    line = "0x10000000 0x3ff8000000000000 0\n"
+    for i in range(lines):
+        cache.write_line(targets[i % paths], line)
+    cache.close_all()
+    return {"lines": lines}
+
+def _stage_compress(parsed_dir: str, workers: int) -> dict:
+    files = [f for f in Path(parsed_dir).iterdir() if f.name.endswith(".stores")]
+    results = memlog_parser.robust_parallel_compress(files, num_workers=workers)
+    return {"jobs": len(files), "succeeded": sum(1 for r in results if r[1])}
+
+def _stage_process(parsed_dir: str) -> dict:
+    memlog_parser.process_compression(parsed_dir)
+    return {}
+
+class StageFailed(RuntimeError):
+    """A benchmark stage raised or its process died."""
+
+def _stage_child(queue, func, args):
+    sys.stdout = open(os.devnull, "w")
+    sys.stderr = open(os.devnull, "w")
+    start = time.perf_counter()
+    try:
+        extra = func(*args)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+    queue.put({"wall_s": time.perf_counter() - start, "peak_rss_kb": _peak_rss_kb(), **extra})
+
+def run_stage(func, *args) -> dict:
+    """Runs one stage in a fresh spawned process so peak RSS is per stage.
+    Raises StageFailed if the stage raises or its process exits without a result."""
+    ctx = get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_child, args=(queue, func, args))
+    proc.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except queue_mod.Empty:
+            if proc.is_alive():
+                continue
+            # The result may have been queued right before the exit
+            try:
+                result = queue.get(timeout=1)
+            except queue_mod.Empty:
+                proc.join()
+                raise StageFailed(f"Stage {func.__name__} exited with code {proc.exitcode} and no result")
+    proc.join()
+    if "error" in result:
+        raise StageFailed(f"Stage {func.__name__} failed: {result['error']}")
+    return result
+
+# ---------------- Kernels under the tool ----------------
+def run_kernels(valgrind: str, kernel_bin: Path, work_dir: Path, configs: List[dict]) -> List[dict]:
+    """Builds kernel.c and runs each configuration under the memlog tool.
+    The binary must live under /usr: the tool only instruments code there."""
+    kernel_bin.parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["gcc", "-O1", "-g", "-o", str(kernel_bin), str(BENCH_DIR / "kernel.c")], check=True)
+
+    results = []
+    for cfg in configs:
+        log_file = work_dir / f"kernel_{cfg['name']}.log"
+        cmd = [valgrind, "--tool=memcheck", "--leak-check=no", "--undef-value-errors=no",
+               f"--log-file={log_file}", *cfg.get("tool_args", []), "--", str(kernel_bin),
+               str(cfg["buffers"]), str(cfg["elements"]), str(cfg["live"]),
+               str(cfg["timesteps"]), cfg["pattern"], cfg["type"]]
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+        # wait4 gives the usage of this kernel alone, RUSAGE_CHILDREN would
+        # be the maximum over every child so far
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        log_bytes = sum(f.stat().st_size for f in work_dir.glob(f"kernel_{cfg['name']}.*") if f.is_file())
+        results.append({"name": cfg["name"], "wall_s": wall, "log_bytes": log_bytes,
+                        "peak_rss_kb": usage.ru_maxrss})
+    return results
+
+DEFAULT_KERNELS = [
+    {"name": "smooth_double", "buffers": 8, "elements": 100000, "live": 2, "timesteps": 4,
+     "pattern": "smooth", "type": "double"},
+    {"name": "random_float", "buffers": 8, "elements": 100000, "live": 2, "timesteps": 4,
+     "pattern": "random", "type": "float"},
+    {"name": "many_small", "buffers": 2000, "elements": 2048, "live": 64, "timesteps": 1,
+     "pattern": "constant", "type": "double"},
+]
+
+# ---------------- Baseline comparison ----------------
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and "name" in item:
+                    flat.update(_flatten(item, f"{name}.{item['name']}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(results: dict, baseline: dict) -> List[str]:
+    """One line per metric present in both runs, with the relative change."""
+    current, previous = _flatten(results["results"]), _flatten(baseline["results"])
+    lines = []
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        change = (new - old) / old * 100 if old else 0.0
+        lines.append(f"{name:45s} {old:14.3f} -> {new:14.3f} ({change:+.1f}%)")
+    return lines
+
+# -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memlog parse/compress pipeline.")
+    parser.add_argument("--work-dir", default="/tmp/memlog-bench", help="Scratch directory (wiped on start)")
+    parser.add_argument("--format", choices=["text", "compact"], default="text", help="Synthetic log format")
+    parser.add_argument("--live-set", type=int, default=64, help="Buffers alive at the same time")
+    parser.add_argument("--buffers", type=int, default=256, help="Allocation lifetimes in the log")
+    parser.add_argument("--stores", type=int, default=8192, help="Stores per buffer")
+    parser.add_argument("--interleave", type=int, default=16, help="Consecutive stores per buffer before switching")
+    parser.add_argument("--reuse", type=float, default=0.5, help="Probability of reusing a freed address")
+    parser.add_argument("--pattern", choices=["zeros", "constant", "smooth", "random"], default="smooth")
+    parser.add_argument("--buffer-size", type=int, default=65536, help="Size of each buffer in bytes")
+    parser.add_argument("--float-fraction", type=float, default=0.5, help="Fraction of float (vs double) buffers")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--cache-paths", type=int, default=600, help="Distinct files in the FileCache stage")
+    parser.add_argument("--cache-lines", type=int, default=100000, help="Lines written in the FileCache stage")
+    parser.add_argument("--cache-max-open", type=int, default=512, help="FileCache max_open in the FileCache stage")
+    parser.add_argument("--workers", type=int, default=None, help="Compression workers")
+    parser.add_argument("--skip-compress", action="store_true", help="Skip robust_parallel_compress even if the compressor exists")
+    parser.add_argument("--valgrind", default=None, help="Valgrind binary; runs the kernel.c configurations under the tool")
+    parser.add_argument("--kernel-bin", default="/usr/local/bin/memlog-bench-kernel", help="Where to build kernel.c (must be under /usr)")
+    parser.add_argument("--output", default=None, help="Write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", default=None, help="JSON results of a previous run to compare against")
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "work_dir")}
+    results: Dict[str, object] = {}
+
+    log_path = work_dir / ("synthetic.mlc" if args.format == "compact" else "synthetic.log")
+    start = time.perf_counter()
+    generated = generate_log(log_path, live_set=args.live_set, buffers=args.buffers,
+                             stores_per_buffer=args.stores, interleave=args.interleave,
+                             reuse=args.reuse, pattern=args.pattern, buffer_size=args.buffer_size,
+                             float_fraction=args.float_fraction, fmt=args.format, seed=args.seed)
+    results["generate"] = {"wall_s": time.perf_counter() - start, **generated}
+    print(f"[bench] Generated {generated['stores']} stores ({generated['bytes'] / 1e6:.1f} MB) in {log_path}", file=sys.stderr)
+
+    parse = run_stage(_stage_parse, str(log_path))
+    parse["mb_per_s"] = generated["bytes"] / 1e6 / parse["wall_s"]
+    parse["stores_per_s"] = generated["stores"] / parse["wall_s"]
+    results["parse"] = parse
+    print(f"[bench] parse_log: {parse['mb_per_s']:.1f} MB/s, {parse['stores_per_s']:.0f} stores/s", file=sys.stderr)
+
+    cache_dir = work_dir / "filecache"
+    cache = run_stage(_stage_filecache, str(cache_dir), args.cache_paths, args.cache_lines, args.cache_max_open)
+    cache["lines_per_s"] = args.cache_lines / cache["wall_s"]
+    results["filecache"] = cache
+
+    parsed_dir = log_path.with_suffix(log_path.suffix + ".parsed")
+    if COMPRESSOR.exists() and not args.skip_compress:
+        results["compress"] = run_stage(_stage_compress, str(parsed_dir), args.workers)
+    else:
+        print(f"[bench] Skipping compression stage ({COMPRESSOR} not available or --skip-compress)", file=sys.stderr)
+    results["process_compression"] = run_stage(_stage_process, str(parsed_dir))
+
+    if args.valgrind:
+        results["kernels"] = run_kernels(args.valgrind, Path(args.kernel_bin), work_dir, DEFAULT_KERNELS)
+
+    report = {
+        "config": config,
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count(), "numpy": np.__version__},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("config") != config:
+            print("[bench] WARNING: baseline was run with a different configuration", file=sys.stderr)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except StageFailed as e:
+        print(f"[bench] {e}", file=sys.stderr)
+        sys.exit(1)
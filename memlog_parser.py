@@ -1,19 +1,133 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import bisect
+import math
 import os
 import re
+from array import array
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, TextIO
+from typing import Dict, Iterable, Iterator, List, TextIO
+import numpy as np
 from tqdm import tqdm
-from multiprocessing import cpu_count, get_context
+from multiprocessing import cpu_count
 import time
 
 # ---------------- Regex ----------------
-ALLOC_HEADER_RE = re.compile(r"^Start\s+0x([0-9a-fA-F]+),\s+size\s+(\d+)")
+# The ECU is only present in logs that write each stack trace once as a
+# ===CONTEXT START=== record; legacy logs print the trace inside every event.
+ALLOC_HEADER_RE = re.compile(r"^Start\s+0x([0-9a-fA-F]+),\s+size\s+(\d+)(?:,\s+ecu\s+(\d+))?")
 STORE_RE = re.compile(r"^0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)")
 
+# ---------------- Compact stream (--memlog-format=compact) ----------------
+# Every record is three LEB128 varints: tag, operand, operand. Tags below
+# COMPACT_TAG_SYNC are stores (zigzag address delta, XOR with the previous
+# value shifted right by `tag` bits); a SYNC store carries absolute values.
+# ALLOC/FREE (start, size) are followed by an EXTRA record holding the ECU.
+# LIVE records, shaped like ALLOC, open log segments (see parse_segments).
+COMPACT_MAGIC = b"\x89MLC\r\n\x1a\n"
+COMPACT_TAG_SYNC = 64
+COMPACT_TAG_ALLOC = 65
+COMPACT_TAG_FREE = 66
+COMPACT_TAG_EXTRA = 67
+COMPACT_TAG_LIVE = 68
+COMPACT_EVENT_TAGS = {COMPACT_TAG_ALLOC: "ALLOC", COMPACT_TAG_FREE: "FREE", COMPACT_TAG_LIVE: "LIVE"}
+
+def is_compact_log(log_path: str | os.PathLike) -> bool:
+    """True if the file starts with the compact stream magic."""
+    with open(log_path, "rb") as fh:
+        return fh.read(len(COMPACT_MAGIC)) == COMPACT_MAGIC
+
+def _decode_varints(buf: np.ndarray):
+    """Decodes all complete LEB128 varints in a uint8 buffer.
+    Returns (values, ends) where ends[i] is the offset just past varint i."""
+    ends = np.flatnonzero(buf < 0x80) + 1
+    if ends.size == 0:
+        return np.empty(0, dtype=np.uint64), ends
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1]
+    data = buf[:ends[-1]]
+    pos = np.arange(data.size) - np.repeat(starts, ends - starts)
+    contrib = (data & 0x7F).astype(np.uint64) << (7 * pos).astype(np.uint64)
+    return np.bitwise_or.reduceat(contrib, starts), ends
+
+def _decode_stores(tags, ops_a, ops_b, prev_addr: int, prev_value: int):
+    """Rebuilds absolute (addr, value) arrays for a run of store records.
+    Address deltas are summed and value XORs accumulated, both restarting at
+    each SYNC; a synthetic SYNC carrying the previous state is prepended so
+    the run can continue a stream decoded in an earlier chunk."""
+    sync = np.concatenate(([True], tags == COMPACT_TAG_SYNC))
+    tags = np.concatenate(([0], tags)).astype(np.uint64)
+    ops_a = np.concatenate((np.array([prev_addr], dtype=np.uint64), ops_a))
+    ops_b = np.concatenate((np.array([prev_value], dtype=np.uint64), ops_b))
+
+    one = np.uint64(1)
+    deltas = (ops_a >> one) ^ (np.uint64(0) - (ops_a & one))
+    addr_terms = np.where(sync, ops_a, deltas)
+    value_terms = np.where(sync, ops_b, ops_b << np.where(sync, 0, tags).astype(np.uint64))
+
+    addr_sum = np.cumsum(addr_terms, dtype=np.uint64)
+    value_xor = np.bitwise_xor.accumulate(value_terms)
+    last_sync = np.maximum.accumulate(np.where(sync, np.arange(sync.size), 0))
+    before = last_sync - 1
+    addr_base = np.where(before >= 0, addr_sum[before], np.uint64(0))
+    value_base = np.where(before >= 0, value_xor[before], np.uint64(0))
+    return (addr_sum - addr_base)[1:], (value_xor ^ value_base)[1:]
+
+def iter_compact_log(log_path: str | os.PathLike, chunk_size: int = 16 << 20,
+                     offset: int | None = None, state: tuple = (0, 0)) -> Iterator[tuple]:
+    """Streams the events of a compact memlog file in log order.
+    Yields ("STORE", addrs, values) with uint64 arrays for each run of stores,
+    ("ALLOC", start, size, ecu, offset, state) / ("FREE", ...) / ("LIVE", ...)
+    for block events, and ("BYTES", n) after each chunk for progress reporting.
+    `offset` is the event's byte offset and `state` the (address, value)
+    decoder state before it; passing both back resumes decoding there."""
+    prev_addr, prev_value = state
+    with open(log_path, "rb") as fh:
+        if fh.read(len(COMPACT_MAGIC)) != COMPACT_MAGIC:
+            raise ValueError(f"{log_path} is not a compact memlog stream")
+        if offset is not None:
+            fh.seek(offset)
+        base = fh.tell()
+        carry = b""
+        while True:
+            chunk = fh.read(chunk_size)
+            buf = np.frombuffer(carry + chunk, dtype=np.uint8)
+            values, ends = _decode_varints(buf)
+            n_rec = values.size // 3
+            recs = values[:n_rec * 3].reshape(-1, 3)
+            # Never split an ALLOC/FREE/LIVE from its EXTRA record
+            if n_rec and int(recs[-1, 0]) in COMPACT_EVENT_TAGS:
+                n_rec -= 1
+                recs = recs[:n_rec]
+            consumed = int(ends[n_rec * 3 - 1]) if n_rec else 0
+            carry = buf[consumed:].tobytes()
+
+            tags = recs[:, 0]
+            events = np.flatnonzero((tags >= COMPACT_TAG_ALLOC) & (tags != COMPACT_TAG_EXTRA))
+            begin = 0
+            for ev in list(events) + [n_rec]:
+                run = recs[begin:ev]
+                run = run[run[:, 0] != COMPACT_TAG_EXTRA]
+                if run.size:
+                    addrs, vals = _decode_stores(run[:, 0], run[:, 1], run[:, 2], prev_addr, prev_value)
+                    prev_addr, prev_value = int(addrs[-1]), int(vals[-1])
+                    yield ("STORE", addrs, vals)
+                if ev < n_rec:
+                    kind = COMPACT_EVENT_TAGS[int(tags[ev])]
+                    ev_offset = base + (int(ends[ev * 3 - 1]) if ev else 0)
+                    yield (kind, int(recs[ev, 1]), int(recs[ev, 2]), int(recs[ev + 1, 1]),
+                           ev_offset, (prev_addr, prev_value))
+                begin = ev + 1
+            base += consumed
+            yield ("BYTES", consumed)
+
+            if not chunk:
+                if carry:
+                    raise ValueError(f"{log_path}: truncated compact stream ({len(carry)} trailing bytes)")
+                break
+
 # ---------------- Memory monitoring without psutil ----------------
 def get_memory_percent():
     """Get memory usage percentage from /proc/meminfo (Linux only)"""
@@ -35,6 +149,134 @@ def get_memory_percent():
         pass
     return 0  # Return 0 if we can't determine memory usage
 
+def get_memory_available() -> int:
+    """MemAvailable from /proc/meminfo in bytes (0 if unknown)."""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def get_process_rss(pid: int) -> int:
+    """Resident set size of a live process in bytes (0 if gone)."""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+# ---------------- Metrics ----------------
+class Metrics:
+    """Pipeline counters, gauges and timings.
+
+    Exported as a Prometheus text file (rewritten at most every `interval`
+    seconds, for node_exporter's textfile collector) and a JSON summary
+    written at the end of the run. Disabled until configure() is called.
+    """
+    def __init__(self):
+        self.prom_path: Path | None = None
+        self.json_path: Path | None = None
+        self.interval = 10.0
+        self._last_flush = 0.0
+        self._t0 = time.time()
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.jobs: List[dict] = []
+        self.extra: Dict[str, object] = {}
+
+    def configure(self, metrics_dir: str | os.PathLike, interval: float = 10.0):
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        self.prom_path = metrics_dir / "memlog_parser.prom"
+        self.json_path = metrics_dir / "memlog_parser.metrics.json"
+        self.interval = interval
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] += value
+
+    def set_total(self, name: str, value: float):
+        """Set a counter from a tally kept elsewhere (e.g. FileCache.hits)."""
+        self.counters[name] = value
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def add_phase(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    def observe_job(self, file: Path, wall_s: float, max_rss_kb: int, success: bool):
+        self.jobs.append({"file": file.name, "wall_s": wall_s, "max_rss_kb": max_rss_kb, "success": success})
+        self.inc("memlog_compress_jobs_total")
+        self.inc("memlog_compress_job_seconds_sum", wall_s)
+        if not success:
+            self.inc("memlog_compress_job_failures_total")
+        self.set("memlog_compress_job_max_rss_kb", max(self.gauges.get("memlog_compress_job_max_rss_kb", 0), max_rss_kb))
+
+    def _prometheus(self) -> str:
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter\n{name} {value}")
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge\n{name} {value}")
+        if self.phases:
+            lines.append("# TYPE memlog_phase_seconds gauge")
+            for phase, seconds in sorted(self.phases.items()):
+                lines.append(f'memlog_phase_seconds{{phase="{phase}"}} {seconds:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        parse_s = self.phases.get("parse", 0.0)
+        latencies = sorted(j["wall_s"] for j in self.jobs)
+        rates = {}
+        if parse_s > 0:
+            rates["parse_bytes_per_s"] = self.counters["memlog_parse_bytes_total"] / parse_s
+            rates["parse_stores_per_s"] = self.counters["memlog_parse_stores_total"] / parse_s
+        if latencies:
+            rates["compress_job_p50_s"] = latencies[len(latencies) // 2]
+            rates["compress_job_p95_s"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            rates["compress_job_max_s"] = latencies[-1]
+        return {
+            "elapsed_s": time.time() - self._t0,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "rates": rates,
+            "jobs": self.jobs,
+            **self.extra,
+        }
+
+    @staticmethod
+    def _write_atomic(path: Path, text: str):
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+
+    def maybe_flush(self):
+        """Rewrite the Prometheus file if `interval` seconds have passed."""
+        if self.prom_path is None:
+            return
+        now = time.time()
+        if now - self._last_flush >= self.interval:
+            self._last_flush = now
+            self._write_atomic(self.prom_path, self._prometheus())
+
+    def flush(self):
+        if self.prom_path is None:
+            return
+        import json
+        self._last_flush = time.time()
+        self._write_atomic(self.prom_path, self._prometheus())
+        self._write_atomic(self.json_path, json.dumps(self.summary(), indent=2) + "\n")
+
+METRICS = Metrics()
+
 # ---------------- File handle cache (LRU) ----------------
 class FileCache:
     """LRU cache for file handles to avoid too many open files."""
@@ -42,6 +284,9 @@ class FileCache:
         self.max_open = max_open
         self._handles: Dict[Path, Tuple[TextIO, int]] = {}
         self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def _evict_if_needed(self):
         if len(self._handles) < self.max_open:
@@ -52,13 +297,16 @@ class FileCache:
             self._handles[lru_path][0].close()
         finally:
             del self._handles[lru_path]
+            self.evictions += 1
 
     def write_line(self, path: Path, line: str):
         self._tick += 1
         if path in self._handles:
+            self.hits += 1
             fh, _ = self._handles[path]
             self._handles[path] = (fh, self._tick)
         else:
+            self.misses += 1
             self._evict_if_needed()
             path.parent.mkdir(parents=True, exist_ok=True)
             fh = open(path, "a", encoding="utf-8")
@@ -81,6 +329,457 @@ class FileCache:
                 pass
         self._handles.clear()
 
+# ---------------- In-memory buffers ----------------
+# In-memory mode (--memory-budget): finalized buffers are kept in the parsing
+# process as packed (n, 3) uint64 arrays of (address, value, offset) instead
+# of .stores files. They are keyed by the path the .stores file would have
+# had, so the rest of the pipeline names buffers the same way. Compressors
+# get them as text through a pipe, and the pre-screen, predictor and
+# process_compression() read the arrays directly. The arrays do not survive
+# the run: a later --parsed-dir run over the same directory only finds the
+# buffers that spilled to disk.
+MEMORY_STORE_BYTES = 24
+MEMORY_RESERVE_STORES = 4096  # budget is reserved in blocks of this many stores
+
+class InMemoryStores:
+    """Registry of the buffers held in memory, within a byte budget.
+
+    `buffers` maps each buffer path to its (rows, 3) uint64 array. The
+    registry is shared by the stages of one process, not between processes.
+    Disabled while the budget is 0.
+    """
+    def __init__(self):
+        self.budget = 0
+        self.used = 0
+        self.buffers: Dict[Path, np.ndarray] = {}
+
+    def configure(self, budget: int):
+        self.budget = budget
+
+    def reserve(self, nbytes: int) -> bool:
+        if self.used + nbytes > self.budget:
+            return False
+        self.used += nbytes
+        METRICS.set("memlog_memory_bytes", self.used)
+        return True
+
+    def release(self, nbytes: int):
+        self.used -= nbytes
+        METRICS.set("memlog_memory_bytes", self.used)
+
+    def put(self, path: Path, stores, reserved: int):
+        """Takes over a flat (address, value, offset) array('Q') as a buffer."""
+        array = np.frombuffer(stores, dtype=np.uint64).reshape(-1, 3)
+        self.buffers[path] = array
+        self.used += len(array) * MEMORY_STORE_BYTES - reserved
+        METRICS.set("memlog_memory_bytes", self.used)
+        METRICS.set("memlog_memory_buffers", len(self.buffers))
+
+    def __contains__(self, path) -> bool:
+        return path in self.buffers
+
+    def paths(self, parent: Path | None = None) -> List[Path]:
+        return sorted(p for p in self.buffers if parent is None or p.parent == parent)
+
+    def array(self, path: Path) -> np.ndarray:
+        """(rows, 3) uint64 array of a buffer."""
+        return self.buffers[path]
+
+    def close(self):
+        self.buffers.clear()
+        self.used = 0
+
+IN_MEMORY_STORES = InMemoryStores()
+
+# ---------------- Disk budget and retention ----------------
+# A log, its .parsed directory and the logs of other programs of a batch
+# share one disk. With --min-free-disk, parsing pauses while less than that
+# many bytes are free (other pipelines keep compressing and freeing space
+# meanwhile) instead of failing half-way with ENOSPC. --retention decides
+# which .stores files may go before the pipeline ends:
+#   keep           every buffer stays on disk (default)
+#   drop-objects   object buffers, which are never compressed, are dropped
+#                  as soon as they are parsed
+#   drop-analyzed  float/double buffers are dropped too, once their
+#                  compressor output is recorded
+# A dropped buffer's .analyzed row is computed just before it goes and
+# appended to <parsed>/<name>.retired, which process_compression() reads back
+# for buffers no longer on disk. Buffers in a pack or in memory stay.
+RETENTION_POLICIES = ("keep", "drop-objects", "drop-analyzed")
+RETIRED_SUFFIX = ".retired"
+
+class DiskBudget:
+    """Free-space floor for the directories the pipeline writes to."""
+    def __init__(self):
+        self.min_free = 0
+        self.retention = "keep"
+        self.poll = 5.0
+        self.check_every = 1.0   # seconds between free-space checks
+        self._last_check = 0.0
+
+    def configure(self, min_free: int = 0, retention: str = "keep"):
+        if retention not in RETENTION_POLICIES:
+            raise ValueError(f"Unknown retention policy: {retention}")
+        self.min_free = min_free
+        self.retention = retention
+
+    def wait(self, path: Path, who: str = "parse_log") -> None:
+        """Blocks while the filesystem of `path` has less than min_free
+        bytes free. Cheap to call often: statvfs runs at most once per
+        check_every seconds."""
+        if not self.min_free:
+            return
+        now = time.time()
+        if now - self._last_check < self.check_every:
+            return
+        import shutil
+        self._last_check = now
+        free = shutil.disk_usage(path).free
+        METRICS.set("memlog_disk_free_bytes", free)
+        if free >= self.min_free:
+            return
+        message = (f"[{who}] {free / (1 << 30):.1f} GiB free, below --min-free-disk "
+                   f"{self.min_free / (1 << 30):.1f} GiB; pausing")
+        print(message)
+        with open("/tmp/memlog_parser_status.log", "a") as log:
+            log.write(message + "\n")
+        METRICS.inc("memlog_disk_pauses_total")
+        paused = time.time()
+        while free < self.min_free:
+            time.sleep(self.poll)
+            free = shutil.disk_usage(path).free
+            METRICS.set("memlog_disk_free_bytes", free)
+            METRICS.maybe_flush()
+        METRICS.inc("memlog_disk_pause_seconds_total", time.time() - paused)
+        print(f"[{who}] {free / (1 << 30):.1f} GiB free, resuming")
+        self._last_check = time.time()
+
+    def drops(self, file: Path) -> bool:
+        """Whether the policy drops buffer `file` once it is decided."""
+        if self.retention == "keep" or file in IN_MEMORY_STORES or _packed(file) is not None:
+            return False
+        parts = file.name.replace('.stores', '').split('_')
+        if len(parts) >= 4 and parts[2] == "object":
+            return True
+        return self.retention == "drop-analyzed"
+
+DISK_BUDGET = DiskBudget()
+
+def retired_path(parsed_dir: Path) -> Path:
+    return parsed_dir / (parsed_dir.name + RETIRED_SUFFIX)
+
+def retire_buffer(file: Path) -> bool:
+    """Records the .analyzed row of `file` in the retired ledger and deletes
+    the .stores file, if the retention policy drops it. Float/double buffers
+    are only dropped once a compressor output exists for them."""
+    if not DISK_BUDGET.drops(file) or not file.is_file():
+        return False
+    row = analyze_buffer(file)
+    if row["element_type"] in ("float", "double") and read_compression_output(file) is None:
+        return False
+    ledger = retired_path(file.parent)
+    new = not ledger.exists()
+    with open(ledger, "a") as out:
+        if new:
+            print(",".join(ANALYZED_COLUMNS), file=out)
+        print(",".join(str(row[c]) for c in ANALYZED_COLUMNS), file=out)
+    file.unlink()
+    METRICS.inc("memlog_retired_buffers_total")
+    METRICS.inc("memlog_retired_bytes_total", row["file_size"])
+    return True
+
+def read_retired_rows(parsed_dir: Path) -> Dict[str, dict]:
+    """Buffer name -> .analyzed row of the buffers dropped from `parsed_dir`."""
+    import csv
+
+    ledger = retired_path(parsed_dir)
+    if not ledger.exists():
+        return {}
+    with open(ledger, newline="") as fh:
+        return {row["filename"]: row for row in csv.DictReader(fh)}
+
+# Smallest value with k + 1 digits, for every k that fits in a uint64
+_DIGIT_THRESHOLDS = {base: np.array([base ** k for k in range(1, 20 if base == 10 else 16)], dtype=np.uint64)
+                     for base in (10, 16)}
+
+def _digit_count(x: np.ndarray, base: int) -> np.ndarray:
+    return np.searchsorted(_DIGIT_THRESHOLDS[base], x, side="right") + 1
+
+def store_text_size(stores: np.ndarray) -> int:
+    """Bytes the (n, 3) store array takes as .stores text."""
+    if not len(stores):
+        return 0
+    # "0x<addr> 0x<value> <offset>\n"
+    return int(np.sum(_digit_count(stores[:, 0], 16) + _digit_count(stores[:, 1], 16)
+                      + _digit_count(stores[:, 2], 10)) + 7 * len(stores))
+
+_HEX_CHARS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+def _digit_columns(x: np.ndarray, digits: np.ndarray, base: int) -> tuple:
+    """(chars, keep): x as (n, width) right-aligned digit characters for the
+    widest value, and the mask of the digits each value actually uses."""
+    width = int(digits.max())
+    if base == 16:
+        # Nibbles straight from the big-endian bytes
+        be = np.ascontiguousarray(x, dtype=">u8").view(np.uint8).reshape(-1, 8)
+        nibbles = np.empty((len(x), 16), dtype=np.uint8)
+        nibbles[:, 0::2] = be >> 4
+        nibbles[:, 1::2] = be & 15
+        nibbles = nibbles[:, 16 - width:]
+    else:
+        small = np.uint32 if width < 10 else np.uint64
+        powers = (10 ** np.arange(width - 1, -1, -1)).astype(small)
+        nibbles = (x.astype(small)[:, None] // powers) % small(10)
+    return _HEX_CHARS[nibbles], np.arange(width) >= width - digits[:, None]
+
+# Below this many stores, formatting line by line beats the array setup
+STORE_TEXT_SMALL_ROWS = 256
+
+def iter_store_text(stores: np.ndarray, batch: int = 1 << 16) -> Iterator[bytes]:
+    """Renders an (n, 3) store array as .stores text, `batch` lines at a time.
+    Lines ("0x<addr> 0x<value> <offset>\n") are laid out as fixed-width rows
+    of characters and the leading zeros of each field masked out."""
+    if len(stores) < STORE_TEXT_SMALL_ROWS:
+        if len(stores):
+            yield "".join(f"0x{a:x} 0x{v:x} {o}\n" for a, v, o in stores.tolist()).encode()
+        return
+    for i in range(0, len(stores), batch):
+        rows = stores[i:i + batch]
+        if not len(rows):
+            break
+        fields = [_digit_columns(rows[:, 0], _digit_count(rows[:, 0], 16), 16),
+                  _digit_columns(rows[:, 1], _digit_count(rows[:, 1], 16), 16),
+                  _digit_columns(rows[:, 2], _digit_count(rows[:, 2], 10), 10)]
+        chars, keep = [], []
+        for text, field in zip((b"0x", b" 0x", b" "), fields):
+            chars += [np.broadcast_to(np.frombuffer(text, dtype=np.uint8), (len(rows), len(text))), field[0]]
+            keep += [np.ones((len(rows), len(text)), dtype=bool), field[1]]
+        chars.append(np.full((len(rows), 1), ord("\n"), dtype=np.uint8))
+        keep.append(np.ones((len(rows), 1), dtype=bool))
+        yield np.hstack(chars)[np.hstack(keep)].tobytes()
+
+# ---------------- Pack files ----------------
+# Pack mode (--pack): instead of one .stores and one .compression file per
+# allocation lifetime, a .parsed directory holds two append-only packs,
+# stores.pack and compression.pack. Each <name>.pack keeps the per-buffer
+# segments back to back and <name>.pack.idx one fixed-size record per
+# segment. Buffers keep their .stores names (built from the index fields),
+# so the rest of the pipeline addresses them by path as before.
+STORES_PACK = "stores.pack"
+COMPRESSION_PACK = "compression.pack"
+PACK_TYPES = ("float", "double", "object")
+PACK_INDEX_DTYPE = np.dtype([
+    ("start", "<u8"), ("size", "<u8"), ("type", "u1"),
+    ("usage", "<u4"), ("offset", "<u8"), ("length", "<u8"),
+])
+
+class PackFile:
+    """Append-only container of per-buffer segments with an index table."""
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path.with_name(path.name + ".idx")
+        self._index: Dict[str, tuple] | None = None
+
+    @staticmethod
+    def buffer_name(start: int, size: int, type_name: str, usage: int) -> str:
+        return f"0x{start:x}_{size}_{type_name}_{usage}.stores"
+
+    def _load(self) -> Dict[str, tuple]:
+        if self._index is None:
+            self._index = {}
+            if self.index_path.exists():
+                for rec in np.fromfile(self.index_path, dtype=PACK_INDEX_DTYPE).tolist():
+                    start, size, type_code, usage, offset, length = rec
+                    # A later segment for the same buffer replaces the earlier one
+                    self._index[self.buffer_name(start, size, PACK_TYPES[type_code], usage)] = (offset, length)
+        return self._index
+
+    def records(self) -> np.ndarray:
+        """The raw index table (one PACK_INDEX_DTYPE record per segment)."""
+        if not self.index_path.exists():
+            return np.zeros(0, dtype=PACK_INDEX_DTYPE)
+        return np.fromfile(self.index_path, dtype=PACK_INDEX_DTYPE)
+
+    def append(self, name: str, chunks) -> None:
+        """Appends a segment for buffer `name` (a .stores file name)."""
+        start_hex, size, type_name, usage = name[:-len(".stores")].split('_')
+        with open(self.path, "ab") as out:
+            offset = out.tell()
+            for chunk in chunks:
+                out.write(chunk)
+            length = out.tell() - offset
+        rec = np.array([(int(start_hex, 16), int(size), PACK_TYPES.index(type_name), int(usage),
+                         offset, length)], dtype=PACK_INDEX_DTYPE)
+        with open(self.index_path, "ab") as idx:
+            idx.write(rec.tobytes())
+        self._load()[name] = (offset, length)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._load()
+
+    def names(self) -> List[str]:
+        return sorted(self._load())
+
+    def length(self, name: str) -> int:
+        return self._load()[name][1]
+
+    def iter_chunks(self, name: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        offset, length = self._load()[name]
+        with open(self.path, "rb") as fh:
+            fh.seek(offset)
+            while length > 0:
+                chunk = fh.read(min(chunk_size, length))
+                if not chunk:
+                    raise ValueError(f"{self.path}: truncated segment for {name}")
+                length -= len(chunk)
+                yield chunk
+
+    def read(self, name: str) -> bytes:
+        return b"".join(self.iter_chunks(name))
+
+_PACKS: Dict[Path, PackFile] = {}
+# compression.pack takes one appender at a time; with --claims several
+# processes share a directory, so their outputs stay .compression files.
+PACK_COMPRESSION_OUTPUTS = True
+
+def open_pack(parsed_dir: Path, pack_name: str, create: bool = False) -> PackFile | None:
+    """The cached PackFile `pack_name` of a parsed directory, or None when
+    the directory is not in pack mode (unless `create`)."""
+    path = Path(parsed_dir) / pack_name
+    pack = _PACKS.get(path)
+    if pack is None and (create or path.with_name(path.name + ".idx").exists()):
+        pack = _PACKS[path] = PackFile(path)
+    return pack
+
+def _packed(file: Path) -> PackFile | None:
+    """The stores pack holding buffer `file`, if any."""
+    pack = open_pack(file.parent, STORES_PACK)
+    return pack if pack is not None and file.name in pack else None
+
+def list_buffers(parsed_dir: Path) -> List[Path]:
+    """Every buffer of a parsed directory: .stores files, in-memory
+    buffers and pack segments."""
+    buffers = [f for f in parsed_dir.iterdir() if f.is_file() and f.name.endswith('.stores')]
+    buffers += IN_MEMORY_STORES.paths(parsed_dir)
+    pack = open_pack(parsed_dir, STORES_PACK)
+    if pack is not None:
+        # Buffers extracted with extract_stores() are listed once
+        on_disk = {f.name for f in buffers}
+        buffers += [parsed_dir / name for name in pack.names() if name not in on_disk]
+    return buffers
+
+def buffer_text_size(file: Path) -> int:
+    """Size in bytes of a buffer's .stores text, wherever it is kept."""
+    if file in IN_MEMORY_STORES:
+        return store_text_size(IN_MEMORY_STORES.array(file))
+    pack = _packed(file)
+    if pack is not None:
+        return pack.length(file.name)
+    return file.stat().st_size
+
+def iter_store_chunks(file: Path) -> Iterator[bytes]:
+    """A buffer's .stores text in chunks, wherever it is kept."""
+    if file in IN_MEMORY_STORES:
+        yield from iter_store_text(IN_MEMORY_STORES.array(file))
+        return
+    pack = _packed(file)
+    if pack is not None:
+        yield from pack.iter_chunks(file.name)
+        return
+    with open(file, "rb") as fh:
+        while True:
+            chunk = fh.read(1 << 20)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_store_lines(file: Path, batch_bytes: int = 1 << 21) -> Iterator[List[str]]:
+    """A buffer's .stores lines in batches of about `batch_bytes`."""
+    if file in IN_MEMORY_STORES or _packed(file) is not None:
+        carry = b""
+        for chunk in iter_store_chunks(file):
+            data = carry + chunk
+            cut = data.rfind(b"\n") + 1
+            carry = data[cut:]
+            if cut:
+                yield data[:cut].decode().splitlines(keepends=True)
+        if carry:
+            yield [carry.decode()]
+        return
+    with open(file, "r") as fh:
+        while True:
+            lines = fh.readlines(batch_bytes)
+            if not lines:
+                break
+            yield lines
+
+def _output_dir(file: Path, config: str | None) -> Path:
+    """Where the compressor outputs of buffer `file` live: its parsed
+    directory, or sweep/<config> inside it for a sweep configuration."""
+    return file.parent if config is None else file.parent / SWEEP_DIR / config
+
+def read_compression_output(file: Path, config: str | None = None) -> str | None:
+    """The compressor output recorded for buffer `file` (under sweep
+    configuration `config`), or None."""
+    out_dir = _output_dir(file, config)
+    pack = open_pack(out_dir, COMPRESSION_PACK)
+    if pack is not None and file.name in pack:
+        return pack.read(file.name).decode(errors="replace")
+    try:
+        return (out_dir / f"{file.name}.compression").read_text()
+    except OSError:
+        return None
+
+def write_compression_output(file: Path, text: str, config: str | None = None) -> None:
+    """Records a (synthetic or merged) compressor output for buffer `file`."""
+    out_dir = _output_dir(file, config)
+    if PACK_COMPRESSION_OUTPUTS and open_pack(file.parent, STORES_PACK) is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        open_pack(out_dir, COMPRESSION_PACK, create=True).append(file.name, [text.encode()])
+    else:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        tmp = out_dir / f"{file.name}.compression.{os.getpid()}.tmp"
+        tmp.write_text(text)
+        os.replace(tmp, out_dir / f"{file.name}.compression")
+
+def _pack_compression_output(file: Path) -> None:
+    """Moves the .compression file the compressor wrote for a buffer of a
+    pack-mode directory into compression.pack."""
+    if not PACK_COMPRESSION_OUTPUTS or open_pack(file.parent, STORES_PACK) is None:
+        return
+    output = Path(f"{file}.compression")
+    try:
+        data = output.read_bytes()
+    except OSError:
+        return
+    open_pack(file.parent, COMPRESSION_PACK, create=True).append(file.name, [data])
+    output.unlink()
+
+def extract_stores(parsed_dir: Path, names: List[str] | None = None,
+                   dest: Path | None = None) -> List[Path]:
+    """Compatibility path: writes packed buffers out as regular .stores files
+    (all of them unless `names` is given) into `dest` (default: parsed_dir)."""
+    pack = open_pack(parsed_dir, STORES_PACK)
+    if pack is None:
+        raise FileNotFoundError(parsed_dir / STORES_PACK)
+    dest = dest or parsed_dir
+    written = []
+    for name in names or pack.names():
+        if name not in pack:
+            raise KeyError(f"{name} is not in {pack.path}")
+        target = dest / name
+        with open(target, "wb") as out:
+            for chunk in pack.iter_chunks(name):
+                out.write(chunk)
+        written.append(target)
+    return written
+
+# Stores written to disk are rendered as text in chunks: a block renders its
+# pending stores once it holds STORE_RENDER_ROWS of them, and parse_log()
+# renders every block once they hold PARSE_PENDING_ROWS together.
+STORE_RENDER_ROWS = 1 << 16
+PARSE_PENDING_ROWS = 1 << 22
+
 # -------------------------------------------------------
 class LiveAlloc:
     """Represents a live memory allocation block between ALLOC and FREE."""
@@ -94,9 +793,14 @@ class LiveAlloc:
         "base_core",
         "tmp_path",      # temp file of the alloc
         "usage_num",
+        "mem",           # array('Q') of stores while kept in memory (--memory-budget)
+        "reserved",      # IN_MEMORY_STORES budget held by `mem`
+        "pending",       # (n, 3) store arrays not yet rendered to tmp_path
+        "pending_rows",
     )
 
-    def __init__(self, start: int, size: int, base_core: str, out_dir: Path, usage_num: int):
+    def __init__(self, start: int, size: int, base_core: str, out_dir: Path, usage_num: int,
+                 in_memory: bool = False):
         self.start = start
         self.size = size
         self.end = start + size
@@ -107,27 +811,69 @@ class LiveAlloc:
         self.usage_num = usage_num
         # Temporal per-alloc
         self.tmp_path = out_dir / f".{base_core}_{usage_num}.tmp"
+        self.mem = array("Q") if in_memory else None
+        self.reserved = 0
+        self.pending: List[np.ndarray] = []
+        self.pending_rows = 0
 
-    def write_store(self, addr_hex: str, value_hex: str, file_cache: FileCache) -> None:
-        addr = int(addr_hex, 16)
-        # sanity: bounds
-        if not (self.start <= addr < self.end):
-            raise
-        offset = addr - self.start
+    def write_stores(self, stores: np.ndarray, low_bits: int, file_cache: FileCache) -> None:
+        """Appends (n, 3) uint64 rows [addr, value, offset] of stores that fall
+        in this block; `low_bits` is the OR of their offsets' three low bits.
+        Stores bound for disk wait in `pending` until render_pending()."""
+        n = len(stores)
 
-        line = f"0x{addr_hex.lower()} 0x{value_hex.lower()} {offset}\n"
-        file_cache.write_line(self.tmp_path, line)
-        self.store_count += 1
+        if self.mem is not None:
+            missing = (self.store_count + n) * MEMORY_STORE_BYTES - self.reserved
+            if missing > 0:
+                # Out of reserved room: take the blocks this batch needs or spill to disk
+                block = MEMORY_RESERVE_STORES * MEMORY_STORE_BYTES
+                nbytes = -(-missing // block) * block
+                if IN_MEMORY_STORES.reserve(nbytes):
+                    self.reserved += nbytes
+                else:
+                    self._spill(file_cache)
+        if self.mem is not None:
+            self.mem.frombytes(stores.tobytes())
+        else:
+            self.pending.append(stores)
+            self.pending_rows += n
+        self.store_count += n
 
-        if self.aligned32 and (offset % 4 != 0):
+        if low_bits & 3:
             self.aligned32 = False
-        if self.aligned64 and (offset % 8 != 0):
+        if low_bits & 7:
             self.aligned64 = False
 
-    def close_and_finalize(self, out_dir: Path, file_cache: FileCache) -> None:
+    def render_pending(self, file_cache: FileCache) -> None:
+        """Writes the pending stores to the temp file as .stores text."""
+        if not self.pending:
+            return
+        stores = np.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0]
+        for chunk in iter_store_text(stores):
+            file_cache.write_line(self.tmp_path, chunk.decode())
+        self.pending = []
+        self.pending_rows = 0
+
+    def _spill(self, file_cache: FileCache) -> None:
+        """Moves the stores kept in memory to the temp file (budget exceeded)."""
+        stores = np.frombuffer(self.mem, dtype=np.uint64).reshape(-1, 3)
+        for chunk in iter_store_text(stores):
+            file_cache.write_line(self.tmp_path, chunk.decode())
+        IN_MEMORY_STORES.release(self.reserved)
+        METRICS.inc("memlog_memory_spills_total")
+        self.mem = None
+        self.reserved = 0
+
+    def close_and_finalize(self, out_dir: Path, file_cache: FileCache,
+                           pack: PackFile | None = None) -> None:
+        self.render_pending(file_cache)
         # Close the file handle if it's cached
         file_cache.close_path(self.tmp_path)
 
+        if self.mem is not None and self.store_count == 0:
+            IN_MEMORY_STORES.release(self.reserved)
+            self.mem = None
+
         if self.store_count == 0:
             # No stores written, delete temp file if exists
             try:
@@ -144,6 +890,19 @@ class LiveAlloc:
 
         target = out_dir / f"{self.base_core}_{type_name}_{self.usage_num}.stores"
 
+        if self.mem is not None:
+            IN_MEMORY_STORES.put(target, self.mem, self.reserved)
+            self.mem = None
+            self.reserved = 0
+            return
+
+        if pack is not None:
+            # Pack mode: append the temp file as a segment and drop it
+            with open(self.tmp_path, "rb") as src:
+                pack.append(target.name, iter(lambda: src.read(1024 * 1024), b""))
+            os.unlink(self.tmp_path)
+            return
+
         # Rename atomically
         try:
             os.replace(self.tmp_path, target)
@@ -162,11 +921,79 @@ class LiveAlloc:
                     pass
             else:
                 raise
+        if type_name == "object":
+            retire_buffer(target)
+
+# -------------------------------------------------------
+class LiveSet:
+    """Live blocks (anything with .start/.end) ordered by start address.
+    A FREE closes the newest block at its start; a store belongs to the
+    block found by binary search, or else the first live block holding it."""
+    def __init__(self):
+        self.starts: List[int] = []
+        self.blocks: list = []
+        self.by_start: Dict[int, list] = defaultdict(list)
+        self._bounds = None     # (starts, ends) uint64 arrays for owners()/bounds()
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def add(self, block) -> None:
+        idx = bisect.bisect_left(self.starts, block.start)
+        self.starts.insert(idx, block.start)
+        self.blocks.insert(idx, block)
+        self.by_start[block.start].append(block)
+        self._bounds = None
+
+    def remove(self, block) -> None:
+        idx = self.blocks.index(block)
+        self.starts.pop(idx)
+        self.blocks.pop(idx)
+        self.by_start[block.start].pop()
+        self._bounds = None
+
+    def newest(self, start: int):
+        """The block a FREE of `start` closes, or None."""
+        stack = self.by_start.get(start)
+        return stack[-1] if stack else None
+
+    def owner(self, addr: int):
+        pos = bisect.bisect_right(self.starts, addr) - 1
+        if pos >= 0:
+            block = self.blocks[pos]
+            if block.start <= addr < block.end:
+                return block
+        # Fallback linear search (rare case)
+        for block in self.blocks:
+            if block.start <= addr < block.end:
+                return block
+        return None
+
+    def bounds(self) -> tuple:
+        """(starts, ends) of self.blocks as uint64 arrays."""
+        if self._bounds is None:
+            self._bounds = (np.array(self.starts, dtype=np.uint64),
+                            np.array([b.end for b in self.blocks], dtype=np.uint64))
+        return self._bounds
+
+    def owners(self, addrs: np.ndarray) -> np.ndarray:
+        """owner() for a uint64 array of addresses at once: the position of
+        each owning block in self.blocks, or -1."""
+        starts, ends = self.bounds()
+        pos = np.searchsorted(starts, addrs, side="right").astype(np.int64) - 1
+        hit = pos >= 0
+        hit[hit] = addrs[hit] < ends[pos[hit]]
+        for i in np.flatnonzero(~hit).tolist():
+            block = self.owner(int(addrs[i]))
+            pos[i] = self.blocks.index(block) if block is not None else -1
+        return pos
 
 # -------------------------------------------------------
-def parse_log(log_path: str | os.PathLike, max_open_files: int = 512) -> Path:
+def parse_log(log_path: str | os.PathLike, max_open_files: int = 512, pack: bool = False) -> Path:
     """Parses a huge Valgrind log; outputs files only for ALLOCs that get STOREs.
        FIX: cada alloc escribe a su propio temporal; no hay intercalado incorrecto.
+       With `pack`, finished buffers are appended to <out_dir>/stores.pack
+       instead of becoming one .stores file each.
     """
     log_path = Path(log_path)
     if not log_path.is_file():
@@ -175,287 +1002,1309 @@ def parse_log(log_path: str | os.PathLike, max_open_files: int = 512) -> Path:
     out_dir = log_path.with_suffix(log_path.suffix + ".parsed")
     out_dir.mkdir(exist_ok=True)
 
-    live_allocs: Dict[int, List[LiveAlloc]] = defaultdict(list)
-    starts_sorted: List[int] = []
-    live_list: List[LiveAlloc] = []
+    live = LiveSet()
     address_usage_count: Dict[int, int] = defaultdict(int)
 
     file_cache = FileCache(max_open=max_open_files)
 
-    def _add(alloc: LiveAlloc):
-        idx = bisect.bisect_left(starts_sorted, alloc.start)
-        starts_sorted.insert(idx, alloc.start)
-        live_list.insert(idx, alloc)
-        live_allocs[alloc.start].append(alloc)
+    stores_pack = None
+    if pack:
+        # A fresh pack per parse; stale segments would shadow nothing but waste space
+        for name in (STORES_PACK, COMPRESSION_PACK):
+            for path in (out_dir / name, out_dir / (name + ".idx")):
+                if path.exists():
+                    path.unlink()
+            _PACKS.pop(out_dir / name, None)
+        stores_pack = open_pack(out_dir, STORES_PACK, create=True)
+
+    stores_seen = 0
+    pending: set = set()  # Text-mode blocks holding stores not rendered yet
+    pending_rows = 0
+
+    def _write(alloc: LiveAlloc, stores: np.ndarray, low_bits: int):
+        nonlocal pending_rows
+        held = alloc.pending_rows
+        alloc.write_stores(stores, low_bits, file_cache)
+        if alloc.pending_rows == held:
+            return
+        pending.add(alloc)
+        pending_rows += alloc.pending_rows - held
+        if alloc.pending_rows >= STORE_RENDER_ROWS:
+            pending_rows -= alloc.pending_rows
+            alloc.render_pending(file_cache)
+            pending.discard(alloc)
+        elif pending_rows >= PARSE_PENDING_ROWS:
+            # Bound the parser's memory across many partly filled blocks
+            for held_alloc in pending:
+                held_alloc.render_pending(file_cache)
+            pending.clear()
+            pending_rows = 0
+
+    def _stores(addrs: np.ndarray, values: np.ndarray):
+        nonlocal stores_seen
+        stores_seen += len(addrs)
+        pos = live.owners(addrs)
+        if pos.min() < 0:
+            # STORE out of any live ALLOC
+            addr = int(addrs[int(np.argmax(pos < 0))])
+            raise ValueError(
+                f"STORE 0x{addr:x} does not belong to any live ALLOC. "
+                f"(live={len(live)})."
+            )
+        if pos[0] == pos[-1] and (pos == pos[0]).all():
+            cuts = np.empty(0, dtype=np.int64)
+        else:
+            # Group by owner, keeping each block's stores in log order
+            order = np.argsort(pos, kind="stable")
+            pos, addrs, values = pos[order], addrs[order], values[order]
+            cuts = np.flatnonzero(pos[1:] != pos[:-1]) + 1
+        # owners() already bounds every store by its block: offsets cannot wrap
+        offsets = addrs - live.bounds()[0][pos]
+        stores = np.stack((addrs, values, offsets), axis=1)
+        cuts = cuts.tolist()
+        los = [0] + cuts
+        low_bits = np.bitwise_or.reduceat(offsets & np.uint64(7), los).tolist()
+        for lo, hi, low in zip(los, cuts + [len(pos)], low_bits):
+            _write(live.blocks[int(pos[lo])], stores[lo:hi], low)
+
+    def _alloc(start_int: int, size_int: int):
+        base_core = f"0x{start_int:x}_{size_int}"
+        address_usage_count[start_int] += 1
+        live.add(LiveAlloc(start_int, size_int, base_core, out_dir, address_usage_count[start_int],
+                       in_memory=IN_MEMORY_STORES.budget > 0))
 
-    def _remove(alloc: LiveAlloc):
-        idx = live_list.index(alloc)
-        starts_sorted.pop(idx)
-        live_list.pop(idx)
-        live_allocs[alloc.start].pop()
+    def _free(start_int: int):
+        nonlocal pending_rows
+        alloc = live.newest(start_int)
+        if alloc is not None:
+            if alloc in pending:
+                pending_rows -= alloc.pending_rows
+                pending.discard(alloc)
+            alloc.close_and_finalize(out_dir, file_cache, stores_pack)
+            live.remove(alloc)
 
     file_size = log_path.stat().st_size
     status_log = Path("/tmp/memlog_parser_status.log")
     bytes_processed = 0
     last_log_bytes = 0
     log_interval = file_size // 100  # Log every 1% of progress
-    
-    with tqdm(total=file_size, desc="Parsing log", unit="B", unit_scale=True) as pbar, \
-         log_path.open("r", encoding="utf-8", errors="ignore") as fh:
+    last_metrics_bytes = 0
+    metrics_interval = 1 << 20  # Publish metrics every MB
+    parse_start = time.time()
 
-        inside_alloc = inside_free = False
+    def _publish_metrics():
+        METRICS.set_total("memlog_parse_bytes_total", bytes_processed)
+        METRICS.set_total("memlog_parse_stores_total", stores_seen)
+        METRICS.set("memlog_live_allocations", len(live))
+        METRICS.set_total("memlog_filecache_hits_total", file_cache.hits)
+        METRICS.set_total("memlog_filecache_misses_total", file_cache.misses)
+        METRICS.set_total("memlog_filecache_evictions_total", file_cache.evictions)
+        METRICS.set("memlog_filecache_open_files", len(file_cache._handles))
+        METRICS.maybe_flush()
 
-        for line in fh:
-            pbar.update(len(line))
-            bytes_processed += len(line)
-            
-            # Log progress at intervals
-            if bytes_processed - last_log_bytes >= log_interval or bytes_processed >= file_size:
-                percent = (bytes_processed / file_size) * 100
-                with open(status_log, "a") as log:
-                    if bytes_processed >= file_size:
-                        log.write(f"[{log_path.name}] Parsing completed. Files in: {out_dir}\n")
-                    else:
-                        log.write(f"[{log_path.name}] Parsing progress: {percent:.1f}%. Files in: {out_dir}\n")
-                last_log_bytes = bytes_processed
+    def _progress(nbytes: int):
+        nonlocal bytes_processed, last_log_bytes, last_metrics_bytes
+        bytes_processed += nbytes
 
-            # STORE ------------------------------------------------------
-            m_store = STORE_RE.match(line)
-            if m_store:
-                addr_hex, value_hex = m_store.groups()
-                addr_int = int(addr_hex, 16)
-
-                # Find the containing alloc using binary search
-                pos = bisect.bisect_right(starts_sorted, addr_int) - 1
-                found = False
-                if pos >= 0:
-                    alloc = live_list[pos]
-                    if alloc.start <= addr_int < alloc.end:
-                        alloc.write_store(addr_hex, value_hex, file_cache)
-                        found = True
-
-                if not found:
-                    # Fallback linear search (rare case)
-                    for alloc in live_list:
-                        if alloc.start <= addr_int < alloc.end:
-                            alloc.write_store(addr_hex, value_hex, file_cache)
-                            found = True
-                            break
-
-                if not found:
-                    # STORE out of any live ALLOC
-                    raise ValueError(
-                        f"STORE 0x{addr_hex} does not belong to any live ALLOC. "
-                        f"(live={len(live_list)})."
-                    )
-                continue
+        if bytes_processed - last_metrics_bytes >= metrics_interval:
+            _publish_metrics()
+            last_metrics_bytes = bytes_processed
+            DISK_BUDGET.wait(out_dir)
 
-            # ALLOC / FREE delimiters -----------------------------------
-            if line.startswith("===ALLOC START==="):
-                inside_alloc = True; continue
-            if line.startswith("===ALLOC END==="):
-                inside_alloc = False; continue
-            if line.startswith("===FREE START==="):
-                inside_free = True; continue
-            if line.startswith("===FREE END==="):
-                inside_free = False; continue
-
-            # ALLOC header ----------------------------------------------
-            if inside_alloc:
-                m_alloc = ALLOC_HEADER_RE.match(line)
-                if m_alloc:
-                    start_hex, size_str = m_alloc.groups()
-                    start_int = int(start_hex, 16)
-                    size_int = int(size_str)
-                    base_core = f"0x{start_hex.lower()}_{size_int}"
-                    address_usage_count[start_int] += 1
-                    _add(LiveAlloc(start_int, size_int, base_core, out_dir, address_usage_count[start_int]))
-                continue
+        # Log progress at intervals
+        if bytes_processed - last_log_bytes >= log_interval or bytes_processed >= file_size:
+            percent = (bytes_processed / file_size) * 100
+            with open(status_log, "a") as log:
+                if bytes_processed >= file_size:
+                    log.write(f"[{log_path.name}] Parsing completed. Files in: {out_dir}\n")
+                else:
+                    log.write(f"[{log_path.name}] Parsing progress: {percent:.1f}%. Files in: {out_dir}\n")
+            last_log_bytes = bytes_processed
 
-            # FREE header -----------------------------------------------
-            if inside_free:
-                m_free = ALLOC_HEADER_RE.match(line)
-                if m_free:
-                    start_hex, _size_str = m_free.groups()
-                    start_int = int(start_hex, 16)
-                    stack = live_allocs.get(start_int)
-                    if stack:
-                        alloc = stack[-1]
-                        alloc.close_and_finalize(out_dir, file_cache)
-                        _remove(alloc)
-                continue
+    compact = is_compact_log(log_path)
+    source = iter_compact_log(log_path) if compact else iter_text_log(log_path)
+    with tqdm(total=file_size, desc="Parsing log", unit="B", unit_scale=True) as pbar:
+        if compact:
+            pbar.update(len(COMPACT_MAGIC))
+            _progress(len(COMPACT_MAGIC))
+        # Stores arrive in runs between block events; each run is attributed
+        # and written in bulk
+        for event in source:
+            kind = event[0]
+            if kind == "STORE":
+                _stores(event[1], event[2])
+            elif kind in ("ALLOC", "LIVE"):
+                _alloc(event[1], event[2])
+            elif kind == "FREE":
+                _free(event[1])
+            elif kind == "BYTES":
+                pbar.update(event[1])
+                _progress(event[1])
 
     # Finalize all live allocations that didn't get a FREE
-    for alloc in list(live_list):
-        alloc.close_and_finalize(out_dir, file_cache)
-        _remove(alloc)
+    for alloc in list(live.blocks):
+        alloc.close_and_finalize(out_dir, file_cache, stores_pack)
+        live.remove(alloc)
 
     # Close all file handles in the cache
     file_cache.close_all()
 
+    _publish_metrics()
+    METRICS.add_phase("parse", time.time() - parse_start)
+
     print(f"[parse_log] Finished. Files are in: {out_dir}")
     return out_dir
 
-# Process parsed files
-def process_compression(parsed_dir: str | os.PathLike) -> Path:
-    parsed_dir = Path(parsed_dir)
-    if not parsed_dir.is_dir():
-        raise NotADirectoryError(parsed_dir)
+# ---------------- Log segments ----------------
+# With --memlog-segment-mb/--memlog-segment-events the tool rolls its output
+# into <prefix>.00000, <prefix>.00001, ... (renamed from .tmp once complete)
+# and writes <prefix>.end with the segment count when the run is over. Every
+# segment opens with a LIVE record per block live at that point, so segments
+# are parsed independently in a process pool: each yields per-block part
+# files plus its events. The parts are then stitched in segment order into the
+# same .stores files parse_log() writes for the whole log.
+SEGMENT_END_SUFFIX = ".end"
+SEGMENT_POLL = 1.0      # seconds between checks for new segments with follow
 
-    analyzed_file = parsed_dir / (parsed_dir.name + ".analyzed")
-    summary_file = parsed_dir / (parsed_dir.name + ".summary")
+def segment_path(prefix: str | os.PathLike, index: int) -> Path:
+    return Path(f"{prefix}.{index:05d}")
 
-    # Simple counting: total_buffers = qty of .stores files, buffers_processed = qty of .compression files
-    total_buffers = sum(1 for f in parsed_dir.iterdir() if f.is_file() and f.name.endswith('.stores'))
-    buffers_processed = sum(1 for f in parsed_dir.iterdir() if f.is_file() and f.name.endswith('.compression'))
+def segment_count(prefix: str | os.PathLike) -> int | None:
+    """Number of segments of a finished run, or None while it still runs."""
+    end = Path(f"{prefix}{SEGMENT_END_SUFFIX}")
+    if not end.is_file():
+        return None
+    return int(end.read_text().strip() or 0)
 
-    buffers_compressed = 0  # Will count successful compressions
-    total_compressible_size = 0
-    total_compressed_size = 0
+def _parse_segment(segment: str, part_dir: str) -> tuple:
+    """Parses one segment on its own. Returns (events, parts): events are
+    ("LIVE"/"ALLOC", start, size, block) and ("FREE", start, block) in log
+    order, block numbering the blocks of this segment; parts maps a block to
+    (part file, store count, aligned32, aligned64). The stores of a segment
+    are kept in memory until it is parsed."""
+    segment, part_dir = Path(segment), Path(part_dir)
+    part_dir.mkdir(parents=True, exist_ok=True)
+    source = iter_compact_log(segment) if is_compact_log(segment) else iter_text_log(segment)
+    live = LiveSet()
+    blocks: List[LogBlock] = []
+    rows: Dict[int, List[np.ndarray]] = defaultdict(list)
+    events = []
+    ids = None
 
+    for event in source:
+        kind = event[0]
+        if kind == "STORE":
+            addrs, values = event[1], event[2]
+            if ids is None:
+                ids = np.array([b.row for b in live.blocks] + [-1], dtype=np.int64)
+            owner = ids[live.owners(addrs)]
+            if (owner < 0).any():
+                addr = int(addrs[np.argmax(owner < 0)])
+                raise ValueError(f"{segment}: STORE 0x{addr:x} does not belong to any live ALLOC. "
+                                 f"(live={len(live)}).")
+            order = np.argsort(owner, kind="stable")
+            owner, addrs, values = owner[order], addrs[order], values[order]
+            bounds = np.flatnonzero(np.diff(owner)) + 1
+            for lo, hi in zip([0, *bounds.tolist()], [*bounds.tolist(), owner.size]):
+                block = blocks[int(owner[lo])]
+                rows[block.row].append(np.stack((addrs[lo:hi], values[lo:hi],
+                                                 addrs[lo:hi] - np.uint64(block.start)), axis=1))
+        elif kind in ("LIVE", "ALLOC"):
+            block = LogBlock(event[1], event[2], len(blocks))
+            blocks.append(block)
+            live.add(block)
+            ids = None
+            events.append((kind, event[1], event[2], block.row))
+        elif kind == "FREE":
+            block = live.newest(event[1])
+            if block is not None:
+                live.remove(block)
+                ids = None
+                events.append(("FREE", event[1], block.row))
 
-    with open(analyzed_file, "w") as outfile:
-        # Imprimir encabezado CSV - updated column names
-        print("filename,element_type,buffer_size,all_zeros,line_too_big_error,footer_full_error,ulr_miss_qty,footer_write_qty,footer_read_qty,size_reduced_percentage,lossless,file_size,total_lines", file=outfile)
+    parts = {}
+    for row, chunks in rows.items():
+        stores = np.concatenate(chunks)
+        offsets = stores[:, 2]
+        path = part_dir / f"{row}.part"
+        with open(path, "wb") as out:
+            for chunk in iter_store_text(stores):
+                out.write(chunk)
+        parts[row] = (str(path), stores.shape[0],
+                      not (offsets % np.uint64(4)).any(), not (offsets % np.uint64(8)).any())
+    return events, parts
+
+def parse_segments(prefix: str | os.PathLike, follow: bool = False, delete: bool = False,
+                   workers: int | None = None, pack: bool = False) -> Path:
+    """Parses the segments <prefix>.00000, ... into <prefix>.parsed, with the
+    same buffers parse_log() writes for the unsegmented log. With `follow`,
+    segments are picked up as the tool closes them until <prefix>.end shows
+    up; with `delete`, each segment is removed once its parts are merged."""
+    from concurrent.futures import ProcessPoolExecutor
+    import shutil
+
+    prefix = str(prefix)
+    out_dir = Path(prefix + ".parsed")
+    out_dir.mkdir(exist_ok=True)
+    parts_root = out_dir / ".segments"
 
-        for file in parsed_dir.iterdir():
-            if not file.is_file():
+    live = LiveSet()
+    address_usage_count: Dict[int, int] = defaultdict(int)
+    file_cache = FileCache()
+    stores_pack = None
+    if pack:
+        for name in (STORES_PACK, COMPRESSION_PACK):
+            for path in (out_dir / name, out_dir / (name + ".idx")):
+                if path.exists():
+                    path.unlink()
+            _PACKS.pop(out_dir / name, None)
+        stores_pack = open_pack(out_dir, STORES_PACK, create=True)
+
+    stores_seen = 0
+    parse_start = time.time()
+
+    def _merge(events: list, parts: dict):
+        """Maps the blocks of a parsed segment onto the run's LiveAllocs,
+        appends their parts and closes the blocks freed in the segment."""
+        nonlocal stores_seen
+        allocs: Dict[int, LiveAlloc] = {}
+        freed = []
+        for event in events:
+            kind, start = event[0], event[1]
+            if kind == "FREE":
+                alloc = allocs.get(event[2])
+                if alloc is not None:
+                    live.remove(alloc)
+                    freed.append(alloc)
                 continue
-            
-            # Skip the analyzed and summary files themselves
-            if file == analyzed_file or file == summary_file:
+            alloc = live.newest(start) if kind == "LIVE" else None
+            if alloc is None:
+                # An ALLOC, or a LIVE whose ALLOC was in a segment not parsed here
+                address_usage_count[start] += 1
+                alloc = LiveAlloc(start, event[2], f"0x{start:x}_{event[2]}", out_dir,
+                                  address_usage_count[start])
+                live.add(alloc)
+            allocs[event[3]] = alloc
+        for row, (path, count, aligned32, aligned64) in parts.items():
+            alloc = allocs[row]
+            with open(path, "rb") as src, open(alloc.tmp_path, "ab") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.unlink(path)
+            alloc.store_count += count
+            alloc.aligned32 &= aligned32
+            alloc.aligned64 &= aligned64
+            stores_seen += count
+        for alloc in freed:
+            alloc.close_and_finalize(out_dir, file_cache, stores_pack)
+
+    num_workers = workers or max(1, cpu_count() - 1)
+    pending = {}
+    next_submit = next_merge = 0
+    total = segment_count(prefix)
+    with ProcessPoolExecutor(max_workers=num_workers) as pool, \
+         tqdm(desc="Parsing segments", unit="seg") as pbar:
+        while total is None or next_merge < total:
+            while (total is None or next_submit < total) and segment_path(prefix, next_submit).is_file():
+                DISK_BUDGET.wait(out_dir, "segments")
+                pending[next_submit] = pool.submit(_parse_segment, str(segment_path(prefix, next_submit)),
+                                                   str(parts_root / str(next_submit)))
+                next_submit += 1
+            if next_merge in pending:
+                _merge(*pending.pop(next_merge).result())
+                shutil.rmtree(parts_root / str(next_merge), ignore_errors=True)
+                if delete:
+                    segment_path(prefix, next_merge).unlink()
+                next_merge += 1
+                pbar.update(1)
+                METRICS.set_total("memlog_parse_stores_total", stores_seen)
+                METRICS.set("memlog_live_allocations", len(live))
+                METRICS.maybe_flush()
                 continue
-            
-            fname = file.name
-            # Skip if not a .stores file
-            if not fname.endswith('.stores'):
+            if total is None:
+                total = segment_count(prefix)
+                if total is None and not follow:
+                    # No end marker: the run was cut short, take what is there
+                    total = next_submit
+                elif total is None:
+                    time.sleep(SEGMENT_POLL)
+            elif next_submit < total:
+                raise FileNotFoundError(segment_path(prefix, next_submit))
+
+    for alloc in list(live.blocks):
+        alloc.close_and_finalize(out_dir, file_cache, stores_pack)
+        live.remove(alloc)
+    file_cache.close_all()
+    shutil.rmtree(parts_root, ignore_errors=True)
+
+    METRICS.set_total("memlog_parse_stores_total", stores_seen)
+    METRICS.add_phase("parse", time.time() - parse_start)
+    print(f"[segments] Parsed {next_merge} segments. Files are in: {out_dir}")
+    return out_dir
+
+# ---------------- Log index ----------------
+# One pass over a raw log records the byte offset of every ALLOC/FREE event
+# (and, for compact logs, the decoder state there) plus the live set at the
+# start of each LOG_INDEX_REGION. A single buffer is then rebuilt by reading
+# only the log between its ALLOC and its FREE, starting from the live set
+# parse_log() would have at that point, so stores are attributed the same way.
+LOG_INDEX_SUFFIX = ".index.npz"
+LOG_INDEX_REGION = 64 << 20
+LOG_EVENT_ALLOC = 0
+LOG_EVENT_FREE = 1
+LOG_EVENT_DTYPE = np.dtype([
+    ("offset", "<u8"),      # byte offset of the event in the log
+    ("kind", "u1"),         # LOG_EVENT_ALLOC / LOG_EVENT_FREE
+    ("start", "<u8"),
+    ("size", "<u8"),
+    ("usage", "<u4"),       # usage number of the start address (ALLOC only)
+    ("freed_at", "<u8"),    # offset of the FREE closing this ALLOC, or the log size
+    ("addr", "<u8"),        # compact decoder state before the event
+    ("value", "<u8"),
+])
+LOG_EVENT_RE = re.compile(rb"===(ALLOC|FREE|LIVE) START===\r?\nStart\s+0x([0-9a-fA-F]+),\s+size\s+(\d+)(?:,\s+ecu\s+(\d+))?", re.M)
+
+def _event_matches(data: bytes, end: int) -> Iterator[re.Match]:
+    """LOG_EVENT_RE matches at line starts in data[:end]. The pattern is not
+    anchored with ^ so the regex engine can search for its literal prefix."""
+    for m in LOG_EVENT_RE.finditer(data, 0, end):
+        if m.start() == 0 or data[m.start() - 1] == 0x0A:
+            yield m
+
+def iter_text_events(log_path: str | os.PathLike, chunk_size: int = 16 << 20) -> Iterator[tuple]:
+    """Yields (kind, start, size, offset) for the ALLOC/FREE/LIVE events of a
+    text log, and ("BYTES", n) after each chunk, without decoding stores."""
+    with open(log_path, "rb") as fh:
+        base = 0
+        carry = b""
+        while True:
+            chunk = fh.read(chunk_size)
+            data = carry + chunk
+            # Events span two lines: only accept those starting before the
+            # last complete line, the rest is scanned again with the next chunk
+            complete = data.rfind(b"\n") + 1 if chunk else len(data)
+            cut = data.rfind(b"\n", 0, max(complete - 1, 0)) + 1 if chunk else len(data)
+            for m in _event_matches(data, complete):
+                if m.start() >= cut:
+                    break
+                yield (m.group(1).decode(), int(m.group(2), 16), int(m.group(3)), base + m.start())
+            base += cut
+            carry = data[cut:]
+            yield ("BYTES", cut)
+            if not chunk:
+                break
+
+class LogBlock:
+    """A live block while replaying part of a log."""
+    __slots__ = ("start", "end", "row")
+
+    def __init__(self, start: int, size: int, row: int = -1):
+        self.start = start
+        self.end = start + size
+        self.row = row      # index of its ALLOC event
+
+class LogIndex:
+    """Random-access index over a raw memlog log (<log>.index.npz)."""
+    def __init__(self, log_path: str | os.PathLike, events: np.ndarray,
+                 region_live: np.ndarray, region_ptr: np.ndarray, compact: bool):
+        self.log_path = Path(log_path)
+        self.events = events
+        self.region_live = region_live    # event indices of live ALLOCs, region by region
+        self.region_ptr = region_ptr      # region r is region_live[region_ptr[r]:region_ptr[r + 1]]
+        self.compact = compact
+
+    @staticmethod
+    def index_path(log_path: str | os.PathLike) -> Path:
+        return Path(f"{log_path}{LOG_INDEX_SUFFIX}")
+
+    @classmethod
+    def build(cls, log_path: str | os.PathLike) -> "LogIndex":
+        """Scans the log once and writes <log>.index.npz."""
+        log_path = Path(log_path)
+        file_size = log_path.stat().st_size
+        compact = is_compact_log(log_path)
+        usage: Dict[int, int] = defaultdict(int)
+        live = LiveSet()
+        rows = []
+        index_start = time.time()
+
+        with tqdm(total=file_size, desc="Indexing log", unit="B", unit_scale=True) as pbar:
+            if compact:
+                pbar.update(len(COMPACT_MAGIC))
+                events = (e for e in iter_compact_log(log_path) if e[0] != "STORE")
+            else:
+                events = iter_text_events(log_path)
+            for event in events:
+                if event[0] == "BYTES":
+                    pbar.update(event[1])
+                    continue
+                kind, start, size = event[:3]
+                offset, state = (event[4], event[5]) if compact else (event[3], (0, 0))
+                if kind != "FREE":
+                    usage[start] += 1
+                    live.add(LogBlock(start, size, len(rows)))
+                    rows.append((offset, LOG_EVENT_ALLOC, start, size, usage[start], file_size) + state)
+                else:
+                    block = live.newest(start)
+                    if block is not None:
+                        live.remove(block)
+                        row = rows[block.row]
+                        rows[block.row] = row[:5] + (offset,) + row[6:]
+                    rows.append((offset, LOG_EVENT_FREE, start, size, 0, 0) + state)
+
+        events = np.array(rows, dtype=LOG_EVENT_DTYPE)
+        # Live set at each region start: ALLOCs before it that are freed after it
+        n_regions = file_size // LOG_INDEX_REGION + 1
+        allocs = np.flatnonzero(events["kind"] == LOG_EVENT_ALLOC)
+        region_live = []
+        region_ptr = [0]
+        for r in range(n_regions):
+            at = r * LOG_INDEX_REGION
+            alive = allocs[(events["offset"][allocs] < at) & (events["freed_at"][allocs] >= at)]
+            region_live.append(alive)
+            region_ptr.append(region_ptr[-1] + alive.size)
+        index = cls(log_path, events,
+                    np.concatenate(region_live).astype(np.uint64),
+                    np.array(region_ptr, dtype=np.uint64), compact)
+        np.savez(cls.index_path(log_path), events=events, region_live=index.region_live,
+                 region_ptr=index.region_ptr,
+                 meta=np.array([file_size, log_path.stat().st_mtime_ns, LOG_INDEX_REGION, compact], dtype=np.uint64))
+        METRICS.add_phase("index", time.time() - index_start)
+        print(f"[index] Indexed {events.size} events. Index written to: {cls.index_path(log_path)}")
+        return index
+
+    @classmethod
+    def load(cls, log_path: str | os.PathLike, build: bool = True) -> "LogIndex":
+        """Loads the index of `log_path`, (re)building it when missing or
+        older than the log if `build` is set."""
+        log_path = Path(log_path)
+        path = cls.index_path(log_path)
+        if path.exists():
+            with np.load(path) as data:
+                size, mtime_ns, region, compact = (int(x) for x in data["meta"])
+                stat = log_path.stat()
+                if (size, mtime_ns, region) == (stat.st_size, stat.st_mtime_ns, LOG_INDEX_REGION):
+                    return cls(log_path, data["events"], data["region_live"], data["region_ptr"], bool(compact))
+        if not build:
+            raise FileNotFoundError(f"No up-to-date index for {log_path}")
+        return cls.build(log_path)
+
+    def buffers(self) -> np.ndarray:
+        """ALLOC events (start, size, usage, offset, freed_at) in log order."""
+        return self.events[self.events["kind"] == LOG_EVENT_ALLOC]
+
+    def live_at(self, offset: int) -> np.ndarray:
+        """Event indices of the ALLOCs live just before byte `offset`, in
+        allocation order."""
+        r = offset // LOG_INDEX_REGION
+        lo, hi = int(self.region_ptr[r]), int(self.region_ptr[r + 1])
+        offsets = self.events["offset"]
+        first = np.searchsorted(offsets, r * LOG_INDEX_REGION)
+        last = np.searchsorted(offsets, offset)
+        recent = first + np.flatnonzero(self.events["kind"][first:last] == LOG_EVENT_ALLOC)
+        candidates = np.concatenate((self.region_live[lo:hi].astype(np.int64), recent))
+        return np.sort(candidates[self.events["freed_at"][candidates] >= offset])
+
+    def _find(self, start: int, usage_num: int) -> int:
+        ev = self.events
+        hits = np.flatnonzero((ev["kind"] == LOG_EVENT_ALLOC) & (ev["start"] == start) & (ev["usage"] == usage_num))
+        if hits.size == 0:
+            raise KeyError(f"No allocation 0x{start:x} with usage number {usage_num} in {self.log_path}")
+        return int(hits[0])
+
+    def stores(self, start_addr: int, usage_num: int = 1) -> np.ndarray:
+        """The (address, value, offset) uint64 rows parse_log() would write
+        for usage `usage_num` of the block at `start_addr`."""
+        idx = self._find(start_addr, usage_num)
+        alloc = self.events[idx]
+        begin, end = int(alloc["offset"]), int(alloc["freed_at"])
+        live = LiveSet()
+        for i in self.live_at(begin).tolist():
+            ev = self.events[i]
+            live.add(LogBlock(int(ev["start"]), int(ev["size"]), i))
+        target = None
+        rows: List[np.ndarray] = []
+
+        def _event(kind: str, start: int, size: int):
+            nonlocal target
+            if kind != "FREE":
+                block = LogBlock(start, size)
+                if target is None:
+                    # The scan starts at the target's own ALLOC
+                    target = block
+                live.add(block)
+            else:
+                block = live.newest(start)
+                if block is not None:
+                    live.remove(block)
+
+        def _stores(addrs: np.ndarray, values: np.ndarray):
+            if target is None:
+                return
+            mask = (addrs >= np.uint64(target.start)) & (addrs < np.uint64(target.end))
+            if not mask.any():
+                return
+            addrs, values = addrs[mask], values[mask]
+            if any(b is not target and b.start < target.end and target.start < b.end for b in live.blocks):
+                # Another live block overlaps the target: attribute one by one
+                mine = np.array([live.owner(a) is target for a in addrs.tolist()], dtype=bool)
+                addrs, values = addrs[mine], values[mine]
+            rows.append(np.stack((addrs, values, addrs - np.uint64(target.start)), axis=1))
+
+        if self.compact:
+            state = (int(alloc["addr"]), int(alloc["value"]))
+            for event in iter_compact_log(self.log_path, 1 << 20, begin, state):
+                if event[0] == "STORE":
+                    _stores(event[1], event[2])
+                elif event[0] in ("ALLOC", "FREE", "LIVE"):
+                    if event[4] >= end:
+                        break
+                    _event(event[0], event[1], event[2])
+        else:
+            with open(self.log_path, "rb") as fh:
+                fh.seek(begin)
+                pos = begin
+                addrs, values = [], []
+                pending = None
+                for line in fh:
+                    if pos >= end:
+                        break
+                    pos += len(line)
+                    m_store = STORE_RE.match(line.decode("utf-8", "ignore"))
+                    if m_store:
+                        addrs.append(int(m_store.group(1), 16))
+                        values.append(int(m_store.group(2), 16))
+                        continue
+                    m_event = re.match(rb"===(ALLOC|FREE|LIVE) START===", line)
+                    if m_event:
+                        pending = m_event.group(1).decode()
+                        continue
+                    if pending:
+                        m_header = ALLOC_HEADER_RE.match(line.decode("utf-8", "ignore"))
+                        if m_header:
+                            if addrs:
+                                _stores(np.array(addrs, dtype=np.uint64), np.array(values, dtype=np.uint64))
+                                addrs, values = [], []
+                            _event(pending, int(m_header.group(1), 16), int(m_header.group(2)))
+                            pending = None
+                if addrs:
+                    _stores(np.array(addrs, dtype=np.uint64), np.array(values, dtype=np.uint64))
+        if not rows:
+            return np.empty((0, 3), dtype=np.uint64)
+        return np.concatenate(rows)
+
+    def write_stores(self, start_addr: int, usage_num: int, out_dir: Path) -> Path | None:
+        """Writes the buffer as a .stores file named like parse_log() does.
+        Returns None when the buffer got no stores."""
+        rows = self.stores(start_addr, usage_num)
+        if rows.size == 0:
+            return None
+        offsets = rows[:, 2]
+        type_name = "object"
+        if not (offsets % np.uint64(4)).any():
+            type_name = "float" if (offsets % np.uint64(8)).any() else "double"
+        size = int(self.events[self._find(start_addr, usage_num)]["size"])
+        target = out_dir / f"0x{start_addr:x}_{size}_{type_name}_{usage_num}.stores"
+        with open(target, "wb") as out:
+            for chunk in iter_store_text(rows):
+                out.write(chunk)
+        return target
+
+# ---------------- Streaming API ----------------
+# Library access to a log without writing .stores files: text logs are
+# decoded chunk by chunk with NumPy like compact streams, and stores come out
+# attributed to their allocation in bounded-size batches.
+STORE_BATCH_DTYPE = np.dtype([
+    ("alloc_id", "<i8"),    # ordinal of the owning ALLOC in the log, -1 if none
+    ("offset", "<u8"),      # offset in the block (the raw address if alloc_id is -1)
+    ("value", "<u8"),
+    ("seq", "<u8"),         # ordinal of the store in the log
+])
+_HEX_DIGITS = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _HEX_DIGITS[_c] = _i
+    _HEX_DIGITS[ord(chr(_c).upper())] = _i
+
+def _hex_values(windows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple:
+    """Parses the hex tokens [starts[i], ends[i]) of a buffer at once, given
+    `windows`, the 16-byte sliding windows over its hex digit values (see
+    _text_stores). Returns (values, valid); invalid tokens (empty, longer
+    than 16 digits, non-hex) get 0."""
+    lens = ends - starts
+    valid = (lens >= 1) & (lens <= 16)
+    # Right-aligned digits of each token, pack nibble pairs into bytes and
+    # read each row as one big-endian uint64
+    digits = windows[ends]
+    digits[np.arange(16) < (16 - lens)[:, None]] = 0
+    valid &= (digits != 255).all(axis=1)
+    packed = (digits[:, 0::2] << 4) | digits[:, 1::2]
+    values = packed.view(">u8").ravel().astype(np.uint64)
+    return np.where(valid, values, np.uint64(0)), valid
+
+def _text_stores(data: bytes | memoryview) -> tuple:
+    """(line_offsets, addrs, values) of the store lines in `data` (whole
+    lines only). Fields after the value, like the offset column of .stores
+    lines, are ignored."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+    newlines = np.flatnonzero(buf == 0x0A)
+    if newlines.size == 0 or newlines[-1] != buf.size - 1:
+        newlines = np.append(newlines, buf.size)
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    ends = newlines
+    # Store lines are "0x<addr> 0x<value>"; everything else starts otherwise
+    is_store = (ends - starts >= 6) & (buf[starts] == ord("0")) & (buf[np.minimum(starts + 1, buf.size - 1)] == ord("x"))
+    starts, ends = starts[is_store], ends[is_store]
+    ends = np.where(buf[np.maximum(ends - 1, 0)] == 0x0D, ends - 1, ends)
+    # The first space of each line separates the two tokens (buf.size: none)
+    spaces = np.append(np.flatnonzero(buf == 0x20), buf.size)
+    sep = np.minimum(spaces[np.searchsorted(spaces, starts)], ends)
+    value_at = np.minimum(sep + 3, ends)
+    value_end = np.minimum(spaces[np.searchsorted(spaces, value_at)], ends)
+    # windows[i] holds the digit values of buf[i - 16:i]
+    windows = np.lib.stride_tricks.sliding_window_view(
+        np.concatenate((np.zeros(16, dtype=np.uint8), _HEX_DIGITS[buf])), 16)
+    addrs, ok_a = _hex_values(windows, starts + 2, sep)
+    values, ok_v = _hex_values(windows, value_at, value_end)
+    tail = buf[np.minimum(np.stack((sep + 1, sep + 2)), buf.size - 1)]
+    ok = ok_a & ok_v & (sep + 3 <= ends) & (tail[0] == ord("0")) & (tail[1] == ord("x"))
+    if not ok.all():
+        # Unusual spacing or trailing text: let the regex decide, like parse_log
+        for i in np.flatnonzero(~ok).tolist():
+            m_store = STORE_RE.match(bytes(buf[starts[i]:ends[i]]).decode("utf-8", "ignore"))
+            if m_store:
+                addrs[i], values[i] = int(m_store.group(1), 16), int(m_store.group(2), 16)
+                ok[i] = True
+    return starts[ok], addrs[ok], values[ok]
+
+def iter_text_log(log_path: str | os.PathLike, chunk_size: int = 4 << 20) -> Iterator[tuple]:
+    """Streams the events of a text memlog log in log order, in the same
+    shapes as iter_compact_log() (text events have no decoder state and yield
+    (0, 0); legacy logs without ECUs yield None)."""
+    with open(log_path, "rb") as fh:
+        base = 0
+        carry = b""
+        while True:
+            chunk = fh.read(chunk_size)
+            data = carry + chunk
+            # Same two-line carry as iter_text_events()
+            complete = data.rfind(b"\n") + 1 if chunk else len(data)
+            cut = data.rfind(b"\n", 0, max(complete - 1, 0)) + 1 if chunk else len(data)
+            # Decode every store line of the chunk at once, then split the
+            # arrays at the events (event lines never look like stores)
+            lines, addrs, values = _text_stores(memoryview(data)[:cut])
+            begin = 0
+            for m in _event_matches(data, complete):
+                if m.start() >= cut:
+                    break
+                split = int(np.searchsorted(lines, m.start()))
+                if split > begin:
+                    yield ("STORE", addrs[begin:split], values[begin:split])
+                ecu = int(m.group(4)) if m.group(4) else None
+                yield (m.group(1).decode(), int(m.group(2), 16), int(m.group(3)), ecu, base + m.start(), (0, 0))
+                begin = split
+            if addrs.size > begin:
+                yield ("STORE", addrs[begin:], values[begin:])
+            base += cut
+            carry = data[cut:]
+            yield ("BYTES", cut)
+            if not chunk:
+                break
+
+def iter_store_batches(log_path: str | os.PathLike, batch_size: int = 1 << 16) -> Iterator[tuple]:
+    """Streams a text or compact log as attributed store batches, in log order:
+      ("ALLOC", alloc_id, start, size, usage_num)
+      ("FREE", alloc_id, start, size)        alloc_id is -1 for unknown blocks
+      ("STORES", batch)                      STORE_BATCH_DTYPE array, at most batch_size rows
+    Stores are attributed like parse_log() does; those outside every live
+    block (which parse_log rejects) get alloc_id -1. Pending stores are
+    flushed before each ALLOC/FREE, so batches never straddle an event."""
+    source = iter_compact_log(log_path) if is_compact_log(log_path) else iter_text_log(log_path)
+    live = LiveSet()
+    usage: Dict[int, int] = defaultdict(int)
+    next_id = seq = 0
+    pending: List[np.ndarray] = []
+    pending_rows = 0
+    ids = block_starts = None
+
+    def _take(n: int) -> np.ndarray:
+        nonlocal pending, pending_rows
+        joined = np.concatenate(pending) if len(pending) > 1 else pending[0]
+        batch, rest = joined[:n], joined[n:]
+        pending = [rest] if rest.size else []
+        pending_rows = rest.size
+        return batch
+
+    for event in source:
+        kind = event[0]
+        if kind == "STORE":
+            addrs, values = event[1], event[2]
+            if ids is None:
+                # One lookup table per live-set change, -1 appended for misses
+                ids = np.array([b.row for b in live.blocks] + [-1], dtype=np.int64)
+                block_starts = np.array(live.starts + [0], dtype=np.uint64)
+            pos = live.owners(addrs)
+            batch = np.empty(addrs.size, dtype=STORE_BATCH_DTYPE)
+            batch["alloc_id"] = ids[pos]
+            batch["offset"] = addrs - block_starts[pos]
+            batch["value"] = values
+            batch["seq"] = np.arange(seq, seq + addrs.size, dtype=np.uint64)
+            seq += addrs.size
+            pending.append(batch)
+            pending_rows += addrs.size
+            while pending_rows >= batch_size:
+                yield ("STORES", _take(batch_size))
+        elif kind in ("ALLOC", "FREE", "LIVE"):
+            if pending_rows:
+                yield ("STORES", _take(pending_rows))
+            start, size = event[1], event[2]
+            ids = None
+            if kind != "FREE":
+                usage[start] += 1
+                live.add(LogBlock(start, size, next_id))
+                yield ("ALLOC", next_id, start, size, usage[start])
+                next_id += 1
+            else:
+                block = live.newest(start)
+                if block is not None:
+                    live.remove(block)
+                yield ("FREE", block.row if block is not None else -1, start, size)
+    if pending_rows:
+        yield ("STORES", _take(pending_rows))
+
+def read_contexts(log_path: str | os.PathLike) -> Dict[int, List[str]]:
+    """ECU -> stack trace lines of the ===CONTEXT START=== records of a
+    Valgrind log (the text log itself, or the log written next to a compact
+    stream). Frames lose their ==pid== prefix."""
+    contexts: Dict[int, List[str]] = {}
+    frames = None
+    with open(log_path, "r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            if line.startswith("===CONTEXT START==="):
+                frames = []
+            elif frames is None:
                 continue
+            elif line.startswith("===CONTEXT END==="):
+                frames = None
+            elif line.startswith("ECU "):
+                contexts[int(line.split()[1])] = frames
+            else:
+                frames.append(re.sub(r"^==\d+==\s*", "", line.rstrip("\n")))
+    return contexts
 
-            dist_path = file
-            comp_path = file.with_suffix(file.suffix + ".compression")
+def parse_compression_output(output: str | None) -> dict:
+    """The .analyzed fields of a compressor output (defaults when None)."""
+    fields = {
+        "ulr_miss_qty": "", "footer_write_qty": "", "footer_read_qty": "",
+        "size_reduced_percentage": "", "lossless": False,
+        "line_too_big_error": False, "footer_full_error": False,
+        "prescreen": "", "compress_seconds": "",
+    }
+    if output is None:
+        return fields
 
-            # Parse filename pattern: 0xaddress_size_type_N.stores
-            parts = fname.replace('.stores', '').split('_')
-            
-            # Extract buffer_size (should be the second element)
+    # Check for errors
+    if "LineTooBigError" in output or "Line too big" in output:
+        fields["line_too_big_error"] = True
+    if "FooterFullError" in output:
+        fields["footer_full_error"] = True
+
+    # Parse values
+    size_reduced_vals = []
+    for line in output.splitlines():
+        if line.startswith("Prescreen:"):
+            fields["prescreen"] = line.split(':')[1].strip()
+        if line.startswith("Compressor wall time:"):
+            fields["compress_seconds"] = line.split(':')[1].strip()
+        for key, label in (("ulr_miss_qty", "ULR miss qty:"), ("footer_write_qty", "Footer write qty:"),
+                           ("footer_read_qty", "Footer read qty:")):
+            if label in line:
+                try:
+                    fields[key] = int(line.split(':')[1].strip())
+                except ValueError:
+                    fields[key] = ""
+        if "Size reduced by" in line:
             try:
-                if len(parts) >= 4:  # We expect at least: address, size, type, N
-                    buffer_size = int(parts[1])
-                else:
-                    buffer_size = ""
+                size_reduced_vals.append(float(line.split()[3].replace('%', '')))
             except (IndexError, ValueError):
-                buffer_size = ""
-            
-            # Extract element type (should be the third element)
-            if len(parts) >= 4:
-                type_part = parts[2]  # Get the type part
-                if type_part in ["float", "double", "object"]:
-                    element_type = type_part
+                pass
+        if "Lossless:" in line and "True" in line:
+            fields["lossless"] = True
+
+    if len(size_reduced_vals) >= 2:
+        fields["size_reduced_percentage"] = size_reduced_vals[1]
+    elif size_reduced_vals:
+        fields["size_reduced_percentage"] = size_reduced_vals[0]
+    return fields
+
+def analyze_sweep(parsed_dir: Path, buffers: List[Path]) -> List[dict]:
+    """Writes <parsed>.sweep.analyzed (one row per buffer and configuration)
+    and the <parsed>.sweep comparison table (one row per configuration) for
+    the last sweep over `parsed_dir`. Returns the table rows."""
+    configs = load_sweep_configs(parsed_dir)
+    if not configs:
+        return []
+    table = []
+    with open(parsed_dir / (parsed_dir.name + ".sweep.analyzed"), "w") as outfile:
+        print("filename,config,line_too_big_error,footer_full_error,ulr_miss_qty,footer_write_qty,footer_read_qty,size_reduced_percentage,lossless,prescreen,compress_seconds", file=outfile)
+        for name, args in configs:
+            row = {"config": name, "args": " ".join(args), "buffers_processed": 0, "buffers_compressed": 0,
+                   "line_too_big_errors": 0, "footer_full_errors": 0, "total_compressible_size": 0,
+                   "total_compressed_size": 0.0, "compress_seconds": 0.0}
+            for file in buffers:
+                parts = file.name.replace('.stores', '').split('_')
+                if len(parts) < 4 or parts[2] not in ("float", "double"):
+                    continue
+                buffer_size = int(parts[1])
+                output = read_compression_output(file, name)
+                fields = parse_compression_output(output)
+                reduced = fields["size_reduced_percentage"]
+                if fields["prescreen"]:
+                    # Pre-screened and predicted buffers were not measured
+                    pass
+                elif fields["lossless"] and reduced != "":
+                    row["buffers_compressed"] += 1
+                    row["total_compressed_size"] += buffer_size * (1 - reduced / 100)
                 else:
-                    element_type = "unknown"
-            else:
-                element_type = "unknown"
-
-            # Verificar si todas las segundas columnas son 0x0
-            all_zeros = True
-            total_lines = 0
-            with open(dist_path, "r") as infile:
-                for line in infile:
-                    total_lines += 1
-                    parts = line.split()
-                    if len(parts) >= 2 and parts[1] != "0x0":
-                        all_zeros = False
-
-            ulr = ""
-            footer_write_qty = ""
-            footer_read_qty = ""
-            size_reduced_vals = []
-            lossless = False
-            line_too_big_error = False
-            footer_full_error = False
-            partially_compressed_lines = False
+                    row["total_compressed_size"] += buffer_size
+                if not fields["prescreen"]:
+                    row["total_compressible_size"] += buffer_size
+                    row["buffers_processed"] += output is not None
+                row["line_too_big_errors"] += fields["line_too_big_error"]
+                row["footer_full_errors"] += fields["footer_full_error"]
+                if fields["compress_seconds"]:
+                    row["compress_seconds"] += float(fields["compress_seconds"])
+                print(f"{file.name},{name},{fields['line_too_big_error']},{fields['footer_full_error']},{fields['ulr_miss_qty']},{fields['footer_write_qty']},{fields['footer_read_qty']},{reduced},{fields['lossless']},{fields['prescreen']},{fields['compress_seconds']}", file=outfile)
+            row["total_compressed_size"] = int(row["total_compressed_size"])
+            compressible = row["total_compressible_size"]
+            row["size_reduction_percentage"] = round((compressible - row["total_compressed_size"]) / compressible * 100, 2) if compressible else 0.0
+            table.append(row)
+
+    columns = ["config", "args", "buffers_processed", "buffers_compressed", "line_too_big_errors",
+               "footer_full_errors", "total_compressible_size", "total_compressed_size",
+               "size_reduction_percentage", "compress_seconds"]
+    with open(parsed_dir / (parsed_dir.name + ".sweep"), "w") as outfile:
+        print(",".join(columns), file=outfile)
+        for row in table:
+            values = [f'"{row[c]}"' if c == "args" else f"{row[c]:.3f}" if c == "compress_seconds" else str(row[c]) for c in columns]
+            print(",".join(values), file=outfile)
+    return table
+
+# ---------------- Baseline estimators ----------------
+# Sizes standard floating-point compression schemes would reach on a buffer,
+# to put the compressor's size_reduced_percentage in context. Each buffer is
+# rebuilt as its final memory image (the last value stored at each element,
+# 0 where nothing was stored; 4-byte elements for float buffers, 8-byte for
+# double) and sized under:
+#   zero_const  64-byte lines that are all zero cost a 2-bit tag, lines of
+#               one repeated element the tag plus that element, others raw
+#   gorilla     XOR with the previous element: 1 bit if equal, else the
+#               meaningful bits, with the leading/trailing-zero window of the
+#               previous non-zero XOR reused when it covers them
+#   fpc         FPC residuals: per element, the better of the last-value and
+#               last-stride predictions (FCM/DFCM with one-entry tables),
+#               1 selector bit + 3-bit leading-zero-byte count + the rest
+#   zlib        zlib (level 6) on the raw image bytes
+# Results are size reductions in percent of the image, like the compressor's.
+BASELINE_SCHEMES = ("zero_const", "gorilla", "fpc", "zlib")
+BASELINE_COLUMNS = tuple(f"{scheme}_reduced_percentage" for scheme in BASELINE_SCHEMES)
+BASELINE_LINE_BYTES = 64
+BASELINE_BATCH_BYTES = 64 << 20    # image bytes sized per baseline_estimates() call
+BASELINE_ZLIB_LEVEL = 6
+BASELINE_ESTIMATES = True          # --no-baselines leaves the columns empty
+
+def _bit_length_exact(x: np.ndarray) -> np.ndarray:
+    """Exact bit length of uint64 values (0 for 0)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1]).astype(np.int64)
+
+def iter_buffer_stores(file: Path) -> Iterator[np.ndarray]:
+    """A buffer's stores (file, pack or memory) in log order, as (n, 3)
+    uint64 arrays [addr, value, offset] of up to a few MB of text each."""
+    if file in IN_MEMORY_STORES:
+        stores = IN_MEMORY_STORES.array(file)
+        for i in range(0, len(stores), PRESCREEN_CHUNK_LINES):
+            yield stores[i:i + PRESCREEN_CHUNK_LINES]
+        return
+    try:
+        start = np.uint64(int(file.name.split('_', 1)[0], 16))
+    except ValueError:
+        start = np.uint64(0)    # offsets are the raw addresses
+    carry = b""
+    for chunk in iter_store_chunks(file):
+        data = carry + chunk
+        cut = data.rfind(b"\n") + 1
+        carry = data[cut:]
+        _, addrs, values = _text_stores(memoryview(data)[:cut])
+        if len(addrs):
+            yield np.stack((addrs, values, addrs - start), axis=1)
+    if carry.strip():
+        _, addrs, values = _text_stores(carry + b"\n")
+        if len(addrs):
+            yield np.stack((addrs, values, addrs - start), axis=1)
+
+def _image_width(file: Path) -> int | None:
+    """Element width of a float/double buffer's image, None for others."""
+    parts = file.name.replace('.stores', '').split('_')
+    if len(parts) < 4 or parts[2] not in ("float", "double"):
+        return None
+    return 8 if parts[2] == "double" else 4
+
+def _put_image(image: np.ndarray, width: int, stores: np.ndarray) -> None:
+    """Writes a batch of stores, in log order, into a uint64 image. Where
+    several land on one element the newest one wins."""
+    idx = stores[:, 2] // np.uint64(width)
+    values = stores[:, 1]
+    if width == 4:
+        # A wider store into a float buffer also covers the next element;
+        # its upper half takes the store's place in log order
+        wide = np.flatnonzero((values >> np.uint64(32)) != 0)
+        if wide.size:
+            order = np.argsort(np.concatenate((np.arange(len(values)), wide)), kind="stable")
+            idx = np.concatenate((idx, idx[wide] + np.uint64(1)))[order]
+            values = np.concatenate((values, values[wide] >> np.uint64(32)))[order]
+        values = values & np.uint64(0xFFFFFFFF)
+    inside = idx < image.size
+    idx, values = idx[inside][::-1], values[inside][::-1]
+    # Newest first: np.unique keeps the first occurrence of each element
+    elements, newest = np.unique(idx, return_index=True)
+    image[elements] = values[newest]
+
+def _new_image(file: Path, width: int) -> np.ndarray:
+    return np.zeros(int(file.name.split('_')[1]) // width, dtype=np.uint64)
+
+def _finish_image(image: np.ndarray, width: int) -> np.ndarray:
+    return image.astype(np.uint32) if width == 4 else image
+
+def buffer_image(file: Path) -> np.ndarray | None:
+    """Final memory image of a float/double buffer as uint32/uint64 elements,
+    or None for other buffers."""
+    width = _image_width(file)
+    if width is None:
+        return None
+    image = _new_image(file, width)
+    for stores in iter_buffer_stores(file):
+        _put_image(image, width, stores)
+    return _finish_image(image, width)
+
+def baseline_sizes(images: List[np.ndarray]) -> Dict[str, np.ndarray]:
+    """Compressed sizes in bits of each image (all uint32 or all uint64)
+    under every scheme of BASELINE_SCHEMES. The element-wise schemes run
+    once over the concatenated images, restarting at each image."""
+    import zlib
+
+    width = images[0].dtype.itemsize
+    bits = width * 8
+    counts = np.array([img.size for img in images], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    values = np.concatenate(images).astype(np.uint64)
+    first = np.zeros(values.size, dtype=bool)
+    first[starts[counts > 0]] = True
+    prev = np.concatenate(([np.uint64(0)], values[:-1]))
+    prev[first] = 0
+    prev2 = np.concatenate(([np.uint64(0)], prev[:-1]))
+    prev2[first] = 0
+    mask = np.uint64((1 << bits) - 1)
 
-            # Leer archivo .compression
+    def _per_image(cost: np.ndarray) -> np.ndarray:
+        totals = np.zeros(len(images), dtype=np.int64)
+        nonempty = counts > 0
+        totals[nonempty] = np.add.reduceat(cost, starts[nonempty])
+        return totals
+
+    # Zero / constant lines (each image padded to whole lines)
+    per_line = BASELINE_LINE_BYTES // width
+    zero_const = np.zeros(len(images), dtype=np.int64)
+    for i, img in enumerate(images):
+        if img.size == 0:
+            continue
+        lines = np.zeros(-(-img.size // per_line) * per_line, dtype=img.dtype)
+        lines[:img.size] = img
+        lines = lines.reshape(-1, per_line)
+        constant = (lines == lines[:, :1]).all(axis=1)
+        zero = constant & (lines[:, 0] == 0)
+        zero_const[i] = 2 * len(lines) + bits * int((constant & ~zero).sum()) + \
+            BASELINE_LINE_BYTES * 8 * int((~constant).sum())
+
+    # Gorilla: XOR with the previous element of the same image
+    xor = values ^ prev
+    lead = np.minimum(bits - _bit_length_exact(xor), 31)
+    trail = _bit_length_exact(xor & (~xor + np.uint64(1))) - 1
+    nonzero = np.flatnonzero((xor != 0) & ~first)
+    cost = np.where(first, bits, 1).astype(np.int64)
+    if nonzero.size:
+        lz, tz = lead[nonzero], trail[nonzero]
+        plz = np.concatenate(([-1], lz[:-1]))
+        ptz = np.concatenate(([-1], tz[:-1]))
+        # The window of the previous non-zero XOR, only within the same image
+        image_of = np.searchsorted(starts, nonzero, side="right")
+        same = np.concatenate(([False], image_of[1:] == image_of[:-1]))
+        reuse = same & (lz >= plz) & (tz >= ptz)
+        cost[nonzero] = np.where(reuse, 2 + bits - plz - ptz, 2 + 5 + 6 + bits - lz - tz)
+    gorilla = _per_image(cost)
+
+    # FPC: better of the last-value and last-stride predictions
+    lzb = np.zeros(values.size, dtype=np.int64)
+    for prediction in (prev, (prev + (prev - prev2)) & mask):
+        residual = values ^ prediction
+        lzb = np.maximum(lzb, (bits - _bit_length_exact(residual)) // 8)
+    if width == 8:
+        lzb = np.where(lzb == 4, 3, lzb)   # FPC's 3-bit count skips 4 leading bytes
+    fpc = _per_image(4 + (width - lzb) * 8)
+
+    zlib_bits = np.array([len(zlib.compress(img.tobytes(), BASELINE_ZLIB_LEVEL)) * 8 for img in images],
+                         dtype=np.int64)
+    return {"zero_const": zero_const, "gorilla": gorilla, "fpc": fpc, "zlib": zlib_bits}
+
+def baseline_estimates(files: Iterable) -> Dict[Path, Dict[str, str]]:
+    """BASELINE_COLUMNS of the .analyzed rows of float/double buffers, with
+    images sized in batches of about BASELINE_BATCH_BYTES per element width.
+    `files` holds buffers, or (buffer, image) pairs whose buffer_image() is
+    already known. Buffers that cannot be read or have no elements are left
+    out."""
+    estimates: Dict[Path, Dict[str, str]] = {}
+    pending: Dict[int, list] = defaultdict(list)
+    pending_bytes: Dict[int, int] = defaultdict(int)
+
+    def _flush(width: int):
+        pending_bytes.pop(width, None)
+        batch = pending.pop(width, [])
+        if not batch:
+            return
+        sizes = baseline_sizes([img for _, img in batch])
+        for i, (file, img) in enumerate(batch):
+            raw_bits = img.size * width * 8
+            estimates[file] = {
+                column: f"{100 * (1 - sizes[scheme][i] / raw_bits):.2f}"
+                for scheme, column in zip(BASELINE_SCHEMES, BASELINE_COLUMNS)
+            }
+
+    for file in files:
+        if isinstance(file, tuple):
+            file, image = file
+        else:
             try:
-                with open(comp_path, "r") as compfile:
-                    output = compfile.read()
-                    
-                    # Check for errors
-                    if "LineTooBigError" in output or "Line too big" in output:
-                        line_too_big_error = True
-                    if "FooterFullError" in output:
-                        footer_full_error = True
-                    
-                    # Parse values
-                    for line in output.splitlines():
-                        if "ULR miss qty:" in line:
-                            try:
-                                ulr = int(line.split(':')[1].strip())
-                            except:
-                                ulr = ""
-                        if "Footer write qty:" in line:
-                            try:
-                                footer_write_qty = int(line.split(':')[1].strip())
-                            except:
-                                footer_write_qty = ""
-                        if "Footer read qty:" in line:
-                            try:
-                                footer_read_qty = int(line.split(':')[1].strip())
-                            except:
-                                footer_read_qty = ""
-                        if "Size reduced by" in line:
-                            try:
-                                size = float(line.split()[3].replace('%', ''))
-                                size_reduced_vals.append(size)
-                            except:
-                                pass
-                        if "Lossless:" in line:
-                            if "True" in line:
-                                lossless = True
-                                buffers_compressed += 1
-            except:
-                # File doesn't exist or can't be read - leave defaults
-                pass
+                image = buffer_image(file)
+            except (OSError, ValueError, IndexError):
+                continue
+        if image is None or image.size == 0:
+            continue
+        width = image.dtype.itemsize
+        pending[width].append((file, image))
+        pending_bytes[width] += image.nbytes
+        if pending_bytes[width] >= BASELINE_BATCH_BYTES:
+            _flush(width)
+    for width in list(pending):
+        _flush(width)
+    return estimates
 
-            size_reduced_percentage = ""
-            if len(size_reduced_vals) >= 2:
-                size_reduced_percentage = size_reduced_vals[1]
-            elif size_reduced_vals:
-                size_reduced_percentage = size_reduced_vals[0]
+ANALYZED_COLUMNS = ("filename", "element_type", "buffer_size", "all_zeros", "line_too_big_error",
+                    "footer_full_error", "ulr_miss_qty", "footer_write_qty", "footer_read_qty",
+                    "size_reduced_percentage", "lossless", "file_size", "total_lines", "prescreen",
+                    "zero_fraction", "repeat_fraction", "xor_bits", "compress_seconds") + BASELINE_COLUMNS
 
-            file_size = os.path.getsize(dist_path)
+def analyze_buffer(file: Path, baselines: Dict[str, str] | None = None) -> dict:
+    """The .analyzed row of one buffer (ANALYZED_COLUMNS -> value).
+    `baselines` are its baseline_estimates(), computed here when None."""
+    row, image = _analyze_buffer(file, with_image=baselines is None)
+    if baselines is None and image is not None:
+        baselines = baseline_estimates([(file, image)]).get(file)
+    row.update(baselines or {})
+    return row
 
-            # Calculate sizes for summary
-            if isinstance(buffer_size, int):
-                if element_type != "object":
-                    # Only float and double types are compressible
-                    total_compressible_size += buffer_size
-                    # If compression was successful, use compressed size
-                    if lossless and isinstance(size_reduced_percentage, (int, float, str)) and str(size_reduced_percentage).replace('.', '', 1).isdigit():
-                        reduced = float(size_reduced_percentage)
-                        total_compressed_size += buffer_size * (1 - reduced / 100)
-                    else:
-                        # If not compressed but processed, use uncompressed size
-                        total_compressed_size += buffer_size
-                # object type files don't contribute to compressed size (sum 0)
+def _analyze_buffer(file: Path, with_image: bool = True) -> tuple:
+    """(.analyzed row with empty baseline columns, buffer_image() or None).
+    The buffer is read once; the image is only built `with_image` while
+    BASELINE_ESTIMATES is on."""
+    fname = file.name
+    dist_path = file
 
-            print(f"{fname},{element_type},{buffer_size},{all_zeros},{line_too_big_error},{footer_full_error},{ulr},{footer_write_qty},{footer_read_qty},{size_reduced_percentage},{lossless},{file_size},{total_lines}", file=outfile)
+    # Parse filename pattern: 0xaddress_size_type_N.stores
+    parts = fname.replace('.stores', '').split('_')
 
-    with open(summary_file, "w") as summary:
-        print("total_buffers,buffers_processed,buffers_compressed,total_compressible_size,total_compressed_size", file=summary)
-        print(f"{total_buffers},{buffers_processed},{buffers_compressed},{total_compressible_size},{int(total_compressed_size)}", file=summary)
+    # Extract buffer_size (should be the second element)
+    try:
+        if len(parts) >= 4:  # We expect at least: address, size, type, N
+            buffer_size = int(parts[1])
+        else:
+            buffer_size = ""
+    except (IndexError, ValueError):
+        buffer_size = ""
 
-    # Create human-readable report file
-    report_file = parsed_dir / (parsed_dir.name + ".report")
-    with open(report_file, "w") as report:
-        # Calculate key metrics
-        compression_rate = (buffers_compressed / buffers_processed * 100) if buffers_processed > 0 else 0
-        size_reduction = ((total_compressible_size - total_compressed_size) / total_compressible_size * 100) if total_compressible_size > 0 else 0
-        skipped_buffers = total_buffers - buffers_processed
-        
-        print("=" * 60, file=report)
-        print("MEMORY COMPRESSION ANALYSIS REPORT", file=report)
-        print("=" * 60, file=report)
+    # Extract element type (should be the third element)
+    if len(parts) >= 4:
+        type_part = parts[2]  # Get the type part
+        if type_part in ["float", "double", "object"]:
+            element_type = type_part
+        else:
+            element_type = "unknown"
+    else:
+        element_type = "unknown"
+
+    # One pass: store count, all-zero check, predictor head and memory image
+    all_zeros = True
+    total_lines = 0
+    head = []
+    head_rows = 0
+    width = _image_width(file) if with_image and BASELINE_ESTIMATES and buffer_size != "" else None
+    image = _new_image(file, width) if width else None
+    for stores in iter_buffer_stores(dist_path):
+        total_lines += len(stores)
+        if all_zeros and stores[:, 1].any():
+            all_zeros = False
+        if head_rows < PRESCREEN_CHUNK_LINES:
+            head.append(stores[:PRESCREEN_CHUNK_LINES - head_rows, 1])
+            head_rows += len(head[-1])
+        if image is not None:
+            _put_image(image, width, stores)
+
+    fields = parse_compression_output(read_compression_output(dist_path))
+    ulr = fields["ulr_miss_qty"]
+    footer_write_qty = fields["footer_write_qty"]
+    footer_read_qty = fields["footer_read_qty"]
+    size_reduced_percentage = fields["size_reduced_percentage"]
+    lossless = fields["lossless"]
+    line_too_big_error = fields["line_too_big_error"]
+    footer_full_error = fields["footer_full_error"]
+    prescreen = fields["prescreen"]
+    compress_seconds = fields["compress_seconds"]
+
+    file_size = buffer_text_size(dist_path)
+
+    # Value statistics for the compressibility predictor
+    zero_fraction = repeat_fraction = xor_bits = ""
+    if element_type in ("float", "double") and total_lines:
+        try:
+            features = buffer_features(dist_path, stores=total_lines, values=np.concatenate(head))
+            zero_fraction = f"{features['zero_fraction']:.4f}"
+            repeat_fraction = f"{features['repeat_fraction']:.4f}"
+            xor_bits = f"{features['xor_bits']:.4f}"
+        except (OSError, ValueError, IndexError):
+            pass
+
+
+    row = {"filename": fname, "element_type": element_type, "buffer_size": buffer_size,
+           "all_zeros": all_zeros, "line_too_big_error": line_too_big_error,
+           "footer_full_error": footer_full_error, "ulr_miss_qty": ulr,
+           "footer_write_qty": footer_write_qty, "footer_read_qty": footer_read_qty,
+           "size_reduced_percentage": size_reduced_percentage, "lossless": lossless,
+           "file_size": file_size, "total_lines": total_lines, "prescreen": prescreen,
+           "zero_fraction": zero_fraction, "repeat_fraction": repeat_fraction,
+           "xor_bits": xor_bits, "compress_seconds": compress_seconds,
+           **dict.fromkeys(BASELINE_COLUMNS, "")}
+    return row, (_finish_image(image, width) if image is not None else None)
+
+# Process parsed files
+def process_compression(parsed_dir: str | os.PathLike) -> Path:
+    parsed_dir = Path(parsed_dir)
+    if not parsed_dir.is_dir():
+        raise NotADirectoryError(parsed_dir)
+    analyze_start = time.time()
+
+    analyzed_file = parsed_dir / (parsed_dir.name + ".analyzed")
+    summary_file = parsed_dir / (parsed_dir.name + ".summary")
+
+    # Simple counting: total_buffers = qty of buffers, buffers_processed = qty of compressor outputs
+    buffers = list_buffers(parsed_dir)
+    total_buffers = len(buffers)
+    buffers_processed = sum(1 for f in parsed_dir.iterdir() if f.is_file() and f.name.endswith('.compression'))
+    compression_pack = open_pack(parsed_dir, COMPRESSION_PACK)
+    if compression_pack is not None:
+        buffers_processed += len(compression_pack.names())
+
+    buffers_compressed = 0  # Will count successful compressions
+    total_compressible_size = 0
+    total_compressed_size = 0
+    # Predicted results (--predict-below) are kept out of the measured totals
+    buffers_predicted = 0
+    predicted_compressible_size = 0
+    predicted_compressed_size = 0
+    # So are buffers the pre-screen decided without the compressor
+    buffers_prescreened = 0
+    prescreened_size = 0
+    prescreen_counts: Dict[str, int] = defaultdict(int)
+
+    # Buffers dropped by the retention policy keep the row recorded for them
+    on_disk = {f.name for f in buffers}
+    # One read per buffer: its image goes on to the batched baseline sizing
+    analyzed: Dict[Path, dict] = {}
+
+    def _scan():
+        for file in buffers:
+            analyzed[file], image = _analyze_buffer(file)
+            yield file, image
+
+    baselines = baseline_estimates(_scan())
+    rows = [{**analyzed[file], **baselines.get(file, {})} for file in buffers]
+    rows += [row for name, row in read_retired_rows(parsed_dir).items() if name not in on_disk]
+    total_buffers = len(rows)
+
+    with open(analyzed_file, "w") as outfile:
+        # Imprimir encabezado CSV - updated column names
+        print(",".join(ANALYZED_COLUMNS), file=outfile)
+
+        for row in rows:
+            element_type = row["element_type"]
+            size_reduced_percentage = str(row["size_reduced_percentage"])
+            lossless = str(row["lossless"]) == "True"
+            predicted = row.get("prescreen") == "predicted"
+            prescreened = bool(row.get("prescreen")) and not predicted
+            if predicted:
+                buffers_predicted += 1
+                buffers_processed -= 1
+            elif prescreened:
+                buffers_prescreened += 1
+                buffers_processed -= 1
+                prescreen_counts[row["prescreen"]] += 1
+            elif lossless:
+                buffers_compressed += 1
+
+            # Calculate sizes for summary
+            if str(row["buffer_size"]).isdigit():
+                buffer_size = int(row["buffer_size"])
+                if element_type != "object":
+                    # Only float and double types are compressible
+                    compressed_size = buffer_size
+                    # If compression was successful, use compressed size
+                    if lossless and size_reduced_percentage.replace('.', '', 1).isdigit():
+                        reduced = float(size_reduced_percentage)
+                        compressed_size = buffer_size * (1 - reduced / 100)
+                    if predicted:
+                        predicted_compressible_size += buffer_size
+                        predicted_compressed_size += compressed_size
+                    elif prescreened:
+                        prescreened_size += buffer_size
+                    else:
+                        total_compressible_size += buffer_size
+                        total_compressed_size += compressed_size
+                # object type files don't contribute to compressed size (sum 0)
+
+            # Rows retired before a column existed leave it empty
+            print(",".join("" if row.get(c) is None else str(row[c]) for c in ANALYZED_COLUMNS),
+                  file=outfile)
+
+    with open(summary_file, "w") as summary:
+        print("total_buffers,buffers_processed,buffers_compressed,total_compressible_size,total_compressed_size,"
+              "buffers_predicted,predicted_compressible_size,predicted_compressed_size,"
+              "buffers_prescreened,prescreened_size", file=summary)
+        print(f"{total_buffers},{buffers_processed},{buffers_compressed},{total_compressible_size},{int(total_compressed_size)},"
+              f"{buffers_predicted},{predicted_compressible_size},{int(predicted_compressed_size)},"
+              f"{buffers_prescreened},{prescreened_size}", file=summary)
+
+    sweep = analyze_sweep(parsed_dir, buffers)
+
+    # Create human-readable report file
+    report_file = parsed_dir / (parsed_dir.name + ".report")
+    with open(report_file, "w") as report:
+        # Calculate key metrics
+        compression_rate = (buffers_compressed / buffers_processed * 100) if buffers_processed > 0 else 0
+        size_reduction = ((total_compressible_size - total_compressed_size) / total_compressible_size * 100) if total_compressible_size > 0 else 0
+        skipped_buffers = total_buffers - buffers_processed - buffers_predicted - buffers_prescreened
+        
+        print("=" * 60, file=report)
+        print("MEMORY COMPRESSION ANALYSIS REPORT", file=report)
+        print("=" * 60, file=report)
         print(file=report)
         
         print("QUICK SUMMARY:", file=report)
@@ -472,6 +2321,37 @@ def process_compression(parsed_dir: str | os.PathLike) -> Path:
         print(f"Compressed size: {int(total_compressed_size):,} bytes", file=report)
         print(f"Space saved: {int(total_compressible_size - total_compressed_size):,} bytes ({size_reduction:.1f}%)", file=report)
         print(file=report)
+
+        if buffers_predicted:
+            predicted_saved = predicted_compressible_size - predicted_compressed_size
+            print("PREDICTED (NOT MEASURED):", file=report)
+            print("-" * 40, file=report)
+            print(f"{buffers_predicted} buffers were not compressed; their results come from the model", file=report)
+            print(f"Original size: {predicted_compressible_size:,} bytes", file=report)
+            print(f"Predicted compressed size: {int(predicted_compressed_size):,} bytes", file=report)
+            print(f"Predicted space saved: {int(predicted_saved):,} bytes "
+                  f"({predicted_saved / predicted_compressible_size * 100 if predicted_compressible_size else 0:.1f}%)", file=report)
+            print(file=report)
+
+        if buffers_prescreened:
+            print("PRE-SCREENED (NOT MEASURED):", file=report)
+            print("-" * 40, file=report)
+            print(f"{buffers_prescreened} buffers were not compressed; the pre-screen classified them", file=report)
+            for verdict, count in sorted(prescreen_counts.items()):
+                print(f"  {verdict}: {count}", file=report)
+            print(f"Original size: {prescreened_size:,} bytes", file=report)
+            print(file=report)
+
+        if sweep:
+            print("COMPRESSOR SETTINGS SWEEP:", file=report)
+            print("-" * 40, file=report)
+            width = max(len(row["config"]) for row in sweep)
+            print(f"{'config':<{width}}  {'lossless':>9}  {'saved':>7}  {'errors':>6}  {'seconds':>9}", file=report)
+            for row in sweep:
+                errors = row["line_too_big_errors"] + row["footer_full_errors"]
+                print(f"{row['config']:<{width}}  {row['buffers_compressed']:>4}/{row['buffers_processed']:<4}  "
+                      f"{row['size_reduction_percentage']:>6.1f}%  {errors:>6}  {row['compress_seconds']:>9.1f}", file=report)
+            print(file=report)
         
         print("WHAT THIS MEANS:", file=report)
         print("-" * 40, file=report)
@@ -497,6 +2377,9 @@ def process_compression(parsed_dir: str | os.PathLike) -> Path:
         print(f"• {analyzed_file.name} - Detailed per-buffer analysis", file=report)
         print(f"• {summary_file.name} - Summary statistics (CSV)", file=report)
         print(f"• {report_file.name} - This report", file=report)
+        if sweep:
+            print(f"• {parsed_dir.name}.sweep - Comparison of the sweep configurations (CSV)", file=report)
+            print(f"• {parsed_dir.name}.sweep.analyzed - Per-buffer results of each configuration", file=report)
         print(f"• *.stores files - Raw memory store data", file=report)
         print(f"• *.compression files - Compression results", file=report)
         print(file=report)
@@ -509,6 +2392,8 @@ def process_compression(parsed_dir: str | os.PathLike) -> Path:
         print("  • buffers_compressed: Successfully compressed (lossless)", file=report)
         print("  • total_compressible_size: Original size (float+double)", file=report)
         print("  • total_compressed_size: Size after compression", file=report)
+        print("  • buffers_predicted, predicted_*: Buffers reported from the model (--predict-below), not in the totals above", file=report)
+        print("  • buffers_prescreened, prescreened_size: Buffers classified by the pre-screen, not in the totals above", file=report)
         print(file=report)
         print("Analyzed columns:", file=report)
         print("  • filename: Buffer file name (address_size_type_N.stores)", file=report)
@@ -517,20 +2402,424 @@ def process_compression(parsed_dir: str | os.PathLike) -> Path:
         print("  • all_zeros: Whether all values are 0x0", file=report)
         print("  • lossless: Compression succeeded without data loss", file=report)
         print("  • size_reduced_percentage: Compression ratio achieved", file=report)
+        print("  • prescreen: Why the compressor was not run (all_zero/constant/high_entropy/predicted)", file=report)
+        print("  • zero_fraction, repeat_fraction, xor_bits: Value statistics of the first stores (predictor features)", file=report)
+        print("  • compress_seconds: Compressor wall time", file=report)
         print("=" * 60, file=report)
 
+    METRICS.add_phase("analyze", time.time() - analyze_start)
     return analyzed_file
         
 
 
-# Helper function for parallel compression
-def compress_file(file: Path) -> tuple:
-    """Compress a single file and return result tuple.
-    Returns (file, success, error_msg, is_unrecoverable)
+# ---------------- In-tool statistics (--memlog-format=stats) ----------------
+STATS_LZ_BUCKETS = 17
+STATS_HLL_REGS = 128
+
+def _hll_estimate(registers: List[int]) -> float:
+    """HyperLogLog cardinality estimate with the small-range correction."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    empty = registers.count(0)
+    if estimate <= 2.5 * m and empty:
+        estimate = m * math.log(m / empty)
+    return estimate
+
+def iter_stats_records(log_path: str | os.PathLike) -> Iterator[dict]:
+    """Yields one dict per ===STATS=== record of a log written in stats mode."""
+    record = None
+    with open(log_path, "r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            if line.startswith("===STATS START==="):
+                record = {}
+                continue
+            if record is None:
+                continue
+            if line.startswith("===STATS END==="):
+                yield record
+                record = None
+                continue
+
+            m_header = ALLOC_HEADER_RE.match(line)
+            if m_header:
+                record["start"] = int(m_header.group(1), 16)
+                record["size"] = int(m_header.group(2))
+                continue
+
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == "stores":
+                counters = dict(zip(fields[0::2], fields[1::2]))
+                record["stores"] = int(counters["stores"])
+                record["zeros"] = int(counters["zeros"])
+                record["aligned32"] = counters["aligned32"] == "1"
+                record["aligned64"] = counters["aligned64"] == "1"
+            elif fields[0] == "hll":
+                record["hll"] = list(bytes.fromhex(fields[1]))
+            else:
+                record[fields[0]] = [int(v) for v in fields[1:]]
+
+def process_stats(log_path: str | os.PathLike) -> Path:
+    """Turns the per-block summary records of a stats-mode log into a CSV
+    with one row per buffer, named like the .stores files of a full run."""
+    log_path = Path(log_path)
+    if not log_path.is_file():
+        raise FileNotFoundError(log_path)
+
+    stats_file = log_path.with_suffix(log_path.suffix + ".stats")
+    address_usage_count: Dict[int, int] = defaultdict(int)
+    buffers = 0
+    total_stores = 0
+
+    with open(stats_file, "w") as outfile:
+        print("filename,element_type,buffer_size,stores,all_zeros,zero_fraction,repeat_fraction,small_xor_fraction,exponent_buckets,distinct_estimate,distinct_ratio", file=outfile)
+
+        for rec in iter_stats_records(log_path):
+            address_usage_count[rec["start"]] += 1
+            stores = rec["stores"]
+            if stores == 0:
+                continue
+
+            element_type = "object"
+            if rec["aligned32"]:
+                element_type = "double" if rec["aligned64"] else "float"
+            exponents = rec["exp_double"] if element_type != "float" else rec["exp_float"]
+
+            xors = max(1, stores - 1)
+            xor_lz = rec["xor_lz"]
+            distinct = min(_hll_estimate(rec["hll"]), stores)
+
+            fname = f"0x{rec['start']:x}_{rec['size']}_{element_type}_{address_usage_count[rec['start']]}"
+            print(f"{fname},{element_type},{rec['size']},{stores},{rec['zeros'] == stores},"
+                  f"{rec['zeros'] / stores:.4f},{xor_lz[STATS_LZ_BUCKETS - 1] / xors:.4f},"
+                  f"{sum(xor_lz[8:]) / xors:.4f},{sum(1 for c in exponents if c)},"
+                  f"{distinct:.0f},{distinct / stores:.4f}", file=outfile)
+            buffers += 1
+            total_stores += stores
+
+    print(f"[stats] {buffers} buffers, {total_stores} stores. Results in: {stats_file}")
+    return stats_file
+
+# ---------------- Pre-screen ----------------
+# Buffers whose compressor outcome is decided by their values alone are not
+# sent to /usr/mmu_compressor; a synthetic .compression file records why.
+PRESCREEN_CHUNK_LINES = 1 << 16    # stores read per NumPy batch
+PRESCREEN_ENTROPY_MIN_STORES = 1024
+PRESCREEN_ENTROPY_BITS = 0.8       # mean significant XOR bits / mantissa width
+PRESCREEN_UNIQUE_FRACTION = 0.99
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Approximate bit length of uint64 values (exact below 2**53)."""
+    return np.where(x == 0, 0, np.frexp(x.astype(np.float64))[1])
+
+def iter_store_values(file: Path) -> Iterator[np.ndarray]:
+    """Yields the values of a .stores buffer (file, pack or memory)
+    as uint64 arrays of about PRESCREEN_CHUNK_LINES stores."""
+    if file in IN_MEMORY_STORES:
+        stores = IN_MEMORY_STORES.array(file)
+        for i in range(0, len(stores), PRESCREEN_CHUNK_LINES):
+            yield stores[i:i + PRESCREEN_CHUNK_LINES, 1]
+        return
+    for lines in iter_store_lines(file, PRESCREEN_CHUNK_LINES * 40):
+        yield np.fromiter((int(line.split(None, 2)[1], 16) for line in lines),
+                          dtype=np.uint64, count=len(lines))
+
+def prescreen_stores(file: Path) -> str | None:
+    """Classifies a float/double .stores file without running the compressor.
+
+    Returns "all_zero", "constant" or "high_entropy", or None when the
+    compressor has to decide. Values are read in batches and the scan
+    stops as soon as the buffer is known not to be constant.
     """
-    import subprocess
-    import sys
-    
+    mantissa_bits = 52 if "_double_" in file.name else 23
+    first = None
+    sample = None
+    count = 0
+    varying = False
+    for values in iter_store_values(file):
+        count += len(values)
+        if first is None:
+            first = values[0]
+            sample = values
+        varying = bool(np.any(values != first))
+        if varying:
+            break
+
+    if count == 0:
+        return None
+    if not varying:
+        return "all_zero" if first == 0 else "constant"
+
+    # Not constant: look for values with no exploitable structure. Most bits
+    # of the XOR with the previous value change, a stride predictor (second
+    # difference) leaves a residual as wide, and almost nothing repeats.
+    if len(sample) < PRESCREEN_ENTROPY_MIN_STORES:
+        return None
+    threshold = PRESCREEN_ENTROPY_BITS * mantissa_bits
+    xor = sample[1:] ^ sample[:-1]
+    lowest = xor & (~xor + np.uint64(1))
+    significant = _bit_length(xor) - np.where(xor == 0, 0, _bit_length(lowest) - 1)
+    if significant.mean() < threshold:
+        return None
+    signed = sample.view(np.int64)
+    stride = signed[2:] - 2 * signed[1:-1] + signed[:-2]
+    if _bit_length(np.abs(stride).view(np.uint64)).mean() < threshold:
+        return None
+    if len(np.unique(sample)) / len(sample) >= PRESCREEN_UNIQUE_FRACTION:
+        return "high_entropy"
+    return None
+
+def prescreen_files(files: List[Path]) -> tuple:
+    """Pre-screens float/double .stores files before dispatch.
+
+    Writes a synthetic .compression file holding only the verdict for each
+    decided buffer (no size or lossless result: nothing was measured) and
+    returns (results, remaining) where `results` holds (file, True, None)
+    tuples and `remaining` the files that still need the compressor.
+    """
+    results = []
+    remaining = []
+    for file in files:
+        parts = file.name.replace('.stores', '').split('_')
+        if not file.name.endswith('.stores') or len(parts) < 4 or parts[2] not in ('float', 'double'):
+            remaining.append(file)
+            continue
+        try:
+            verdict = prescreen_stores(file)
+        except (OSError, ValueError, IndexError):
+            verdict = None
+        if verdict is None:
+            remaining.append(file)
+            continue
+        write_compression_output(file, f"Prescreen: {verdict}\n")
+        METRICS.inc(f"memlog_prescreen_{verdict}_total")
+        results.append((file, True, None))
+
+    if results:
+        print(f"[prescreen] Decided {len(results)} buffers without the compressor, {len(remaining)} left")
+    return results, remaining
+
+# ---------------- Compressibility predictor ----------------
+# A small NumPy model trained on past .analyzed files. It predicts, from
+# cheap per-buffer features, whether the compressor will be lossless, the
+# size reduction and the compressor runtime. It is used to run the most
+# valuable jobs first and, optionally, to report predictions instead of
+# running the compressor for buffers that are not worth it.
+PREDICTOR_FEATURES = ("log_buffer_size", "is_double", "log_stores",
+                      "zero_fraction", "repeat_fraction", "xor_bits")
+
+def buffer_features(file: Path, buffer_size: int | None = None,
+                    stores: int | None = None, values: np.ndarray | None = None) -> Dict[str, float]:
+    """Features of a float/double .stores file from its first
+    PRESCREEN_CHUNK_LINES stores (`values`, when the caller has read them)."""
+    parts = file.name.replace('.stores', '').split('_')
+    if buffer_size is None:
+        buffer_size = int(parts[1])
+    is_double = parts[2] == "double"
+    mantissa_bits = 52 if is_double else 23
+    if values is None and file in IN_MEMORY_STORES:
+        values = IN_MEMORY_STORES.array(file)[:PRESCREEN_CHUNK_LINES, 1]
+        if stores is None:
+            stores = len(IN_MEMORY_STORES.array(file))
+    elif values is None:
+        head, head_rows = [], 0
+        for rows in iter_buffer_stores(file):
+            head.append(rows[:PRESCREEN_CHUNK_LINES - head_rows])
+            head_rows += len(head[-1])
+            if head_rows >= PRESCREEN_CHUNK_LINES:
+                break
+        rows = np.concatenate(head) if head else np.empty((0, 3), dtype=np.uint64)
+        values = rows[:, 1]
+        if stores is None:
+            stores = buffer_text_size(file) * len(rows) // store_text_size(rows) if len(rows) else 0
+    features = {
+        "log_buffer_size": math.log2(max(1, buffer_size)),
+        "is_double": float(is_double),
+        "log_stores": math.log2(max(1, stores)),
+        "zero_fraction": 0.0,
+        "repeat_fraction": 0.0,
+        "xor_bits": 0.0,
+    }
+    if len(values):
+        features["zero_fraction"] = float(np.mean(values == 0))
+    if len(values) > 1:
+        xor = values[1:] ^ values[:-1]
+        features["repeat_fraction"] = float(np.mean(xor == 0))
+        features["xor_bits"] = float(np.mean(_bit_length(xor))) / mantissa_bits
+    return features
+
+def _csv_float(row: dict, key: str) -> float:
+    try:
+        return float(row[key])
+    except (KeyError, TypeError, ValueError):
+        return math.nan
+
+def iter_training_rows(paths: List[str | os.PathLike]) -> Iterator[dict]:
+    """Yields compressor outcomes from .analyzed files (searched recursively
+    under directories). Object buffers and pre-screened/predicted rows are
+    skipped since they are not compressor results."""
+    import csv
+    for path in paths:
+        path = Path(path)
+        analyzed_files = sorted(path.rglob("*.analyzed")) if path.is_dir() else [path]
+        for analyzed in analyzed_files:
+            with open(analyzed, newline="") as fh:
+                for row in csv.DictReader(fh):
+                    if row.get("element_type") not in ("float", "double") or row.get("prescreen"):
+                        continue
+                    try:
+                        buffer_size = int(row["buffer_size"])
+                        stores = int(row["total_lines"])
+                    except (KeyError, ValueError):
+                        continue
+                    features = {
+                        "log_buffer_size": math.log2(max(1, buffer_size)),
+                        "is_double": float(row["element_type"] == "double"),
+                        "log_stores": math.log2(max(1, stores)),
+                    }
+                    # Value statistics exist only in newer .analyzed files
+                    for name in ("zero_fraction", "repeat_fraction", "xor_bits"):
+                        features[name] = _csv_float(row, name)
+                    yield {
+                        "features": features,
+                        "lossless": row.get("lossless") == "True",
+                        "reduction": _csv_float(row, "size_reduced_percentage"),
+                        "seconds": _csv_float(row, "compress_seconds"),
+                    }
+
+class CompressibilityModel:
+    """Logistic regression for `lossless` plus ridge regressions for the
+    size reduction (lossless rows) and log compressor runtime."""
+
+    def __init__(self, mean, scale, w_lossless, w_reduction, w_seconds):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.w_lossless = np.asarray(w_lossless, dtype=np.float64)
+        self.w_reduction = np.asarray(w_reduction, dtype=np.float64)
+        self.w_seconds = np.asarray(w_seconds, dtype=np.float64)
+
+    def _design(self, x: np.ndarray) -> np.ndarray:
+        # Missing features are imputed with the training mean (0 after scaling)
+        z = np.nan_to_num((x - self.mean) / self.scale, nan=0.0)
+        return np.hstack([np.ones((len(z), 1)), z])
+
+    @staticmethod
+    def _ridge(a: np.ndarray, y: np.ndarray, l2: float = 1e-2) -> np.ndarray:
+        if len(y) == 0:
+            return np.zeros(a.shape[1])
+        reg = l2 * np.eye(a.shape[1])
+        reg[0, 0] = 0.0
+        return np.linalg.solve(a.T @ a + reg, a.T @ y)
+
+    @classmethod
+    def fit(cls, rows: List[dict], iterations: int = 500, l2: float = 1e-2) -> "CompressibilityModel":
+        if not rows:
+            raise ValueError("no training rows")
+        x = np.array([[r["features"][f] for f in PREDICTOR_FEATURES] for r in rows], dtype=np.float64)
+        valid = ~np.isnan(x)
+        counts = np.maximum(valid.sum(axis=0), 1)
+        mean = np.where(valid, x, 0.0).sum(axis=0) / counts
+        scale = np.sqrt(np.where(valid, (x - mean) ** 2, 0.0).sum(axis=0) / counts)
+        scale[scale < 1e-9] = 1.0  # constant feature in the training set
+        model = cls(mean, scale, np.zeros(x.shape[1] + 1), np.zeros(x.shape[1] + 1), np.zeros(x.shape[1] + 1))
+        a = model._design(x)
+
+        # Logistic regression by gradient descent (the problem is tiny)
+        y = np.array([r["lossless"] for r in rows], dtype=np.float64)
+        w = np.zeros(a.shape[1])
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-(a @ w)))
+            w -= 0.5 * (a.T @ (p - y) / len(y) + l2 * np.r_[0.0, w[1:]])
+        model.w_lossless = w
+
+        reduction = np.array([r["reduction"] for r in rows], dtype=np.float64)
+        mask = (y == 1) & ~np.isnan(reduction)
+        model.w_reduction = cls._ridge(a[mask], reduction[mask], l2)
+
+        seconds = np.array([r["seconds"] for r in rows], dtype=np.float64)
+        mask = ~np.isnan(seconds) & (seconds > 0)
+        model.w_seconds = cls._ridge(a[mask], np.log(seconds[mask]), l2)
+        return model
+
+    def predict(self, features: List[Dict[str, float]]) -> tuple:
+        """Returns (p_lossless, reduction_percent, seconds) arrays."""
+        x = np.array([[f[name] for name in PREDICTOR_FEATURES] for f in features], dtype=np.float64)
+        a = self._design(x)
+        p_lossless = 1.0 / (1.0 + np.exp(-np.clip(a @ self.w_lossless, -30.0, 30.0)))
+        reduction = np.clip(a @ self.w_reduction, 0.0, 100.0)
+        seconds = np.exp(np.clip(a @ self.w_seconds, -20.0, 20.0)) if self.w_seconds.any() else np.ones(len(x))
+        return p_lossless, reduction, seconds
+
+    def save(self, path: str | os.PathLike) -> None:
+        import json
+        with open(path, "w") as fh:
+            json.dump({"features": list(PREDICTOR_FEATURES),
+                       "mean": self.mean.tolist(), "scale": self.scale.tolist(),
+                       "w_lossless": self.w_lossless.tolist(),
+                       "w_reduction": self.w_reduction.tolist(),
+                       "w_seconds": self.w_seconds.tolist()}, fh, indent=2)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "CompressibilityModel":
+        import json
+        with open(path) as fh:
+            data = json.load(fh)
+        if tuple(data["features"]) != PREDICTOR_FEATURES:
+            raise ValueError(f"{path}: model features {data['features']} do not match {PREDICTOR_FEATURES}")
+        return cls(data["mean"], data["scale"], data["w_lossless"], data["w_reduction"], data["w_seconds"])
+
+def plan_compression(files: List[Path], model: CompressibilityModel,
+                     predict_below: float = 0.0) -> tuple:
+    """Orders float/double .stores files by predicted bytes saved per compressor
+    second, highest first. Buffers predicted to save fewer than `predict_below`
+    bytes get a synthetic .compression file with the prediction instead.
+
+    Returns (results, ordered) like prescreen_files().
+    """
+    candidates, others = [], []
+    for file in files:
+        parts = file.name.replace('.stores', '').split('_')
+        if file.name.endswith('.stores') and len(parts) >= 4 and parts[2] in ('float', 'double'):
+            candidates.append(file)
+        else:
+            others.append(file)
+    if not candidates:
+        return [], files
+
+    features = []
+    for file in candidates:
+        try:
+            features.append(buffer_features(file))
+        except (OSError, ValueError, IndexError):
+            features.append({name: math.nan for name in PREDICTOR_FEATURES})
+    p_lossless, reduction, seconds = model.predict(features)
+    sizes = np.array([2.0 ** f["log_buffer_size"] if not math.isnan(f["log_buffer_size"]) else 0.0
+                      for f in features])
+    saved = p_lossless * reduction / 100.0 * sizes
+    order = np.argsort(-(saved / np.maximum(seconds, 1e-3)), kind="stable")
+
+    results, ordered = [], []
+    for i in order.tolist():
+        file = candidates[i]
+        if saved[i] < predict_below:
+            write_compression_output(file, "Prescreen: predicted\n"
+                                           f"Size reduced by {reduction[i]:.2f}%\n"
+                                           f"Lossless: {bool(p_lossless[i] >= 0.5)}\n")
+            METRICS.inc("memlog_prescreen_predicted_total")
+            results.append((file, True, None))
+        else:
+            ordered.append(file)
+    if results:
+        print(f"[predict] Reported predictions for {len(results)} low-value buffers, {len(ordered)} left")
+    return results, ordered + others
+
+COMPRESSOR = "/usr/mmu_compressor"
+
+def _compress_target(file: Path) -> tuple:
+    """Returns (skip_result, output_file): a final result for files the
+    compressor does not take, else None and the .compression path."""
     filename = file.name
     # Parse filename to determine type: 0xaddress_size_type_N.stores
     if filename.endswith('.stores'):
@@ -538,57 +2827,626 @@ def compress_file(file: Path) -> tuple:
         if len(parts) >= 4:
             type_part = parts[2]  # Extract the type
             if type_part == 'object':
-                return (file, False, f"Buffers containing objects are not compressible", False)
+                return (file, False, f"Buffers containing objects are not compressible", False), None
             elif type_part in ['float', 'double']:
-                compression_output_file = f"{file}.compression"
+                return None, f"{file}.compression"
+    return (file, False, "Not a compressible file type", False), None
+
+def _compression_result(file: Path, returncode: int, compression_output_file: str, job: dict) -> tuple:
+    """Interprets a finished compressor run (see compress_file)."""
+    # Check return code
+    # 0 = success, 1 = recoverable error, 2 = unrecoverable error
+    if returncode == 2:
+        error_msg = "Unrecoverable error"
+        return (file, False, error_msg, True, job)  # Mark as unrecoverable
+    elif returncode == 1:
+        # Recoverable error
+        error_msg = f"Process exited with code {returncode} (recoverable)"
+        return (file, False, error_msg, False, job)  # Recoverable, can retry
+    elif returncode != 0:
+        # Other non-zero exit codes
+        error_msg = f"Process exited with code {returncode}"
+        return (file, False, error_msg, False, job)  # Treat as recoverable
+
+    # Check if output file was actually created and has content
+    if not Path(compression_output_file).exists():
+        return (file, False, f"Output file not created: {compression_output_file}", False, job)
+    elif Path(compression_output_file).stat().st_size == 0:
+        # If empty, there might be an issue
+        error_msg = "Output file is empty"
+        return (file, False, error_msg, False, job)
+
+    with open(compression_output_file, "a") as out:
+        out.write(f"Compressor wall time: {job['wall_s']:.3f}\n")
+    return (file, True, None, False, job)
+
+# Helper function for sequential compression
+def compress_file(file: Path) -> tuple:
+    """Compress a single file and return result tuple.
+    Returns (file, success, error_msg, is_unrecoverable[, job]) where `job`
+    holds the compressor's wall time and peak RSS when it was run.
+    """
+    import subprocess
+
+    skip, compression_output_file = _compress_target(file)
+    if skip:
+        return skip
+    piped = file in IN_MEMORY_STORES or _packed(file) is not None
+    try:
+        # Run subprocess with output file argument. Reap it with
+        # wait4() so the job's own peak RSS is reported. Buffers in
+        # memory or a pack are piped to the compressor as /dev/stdin.
+        job_start = time.time()
+        proc = subprocess.Popen(
+            [COMPRESSOR, "/dev/stdin" if piped else str(file), "--output-file", compression_output_file],
+            stdin=subprocess.PIPE if piped else None,
+        )
+        if piped:
+            try:
+                for chunk in iter_store_chunks(file):
+                    proc.stdin.write(chunk)
+            except BrokenPipeError:
+                pass  # the compressor exited early; its return code tells why
+            finally:
                 try:
-                    # Run subprocess with output file argument
-                    result = subprocess.run(
-                        ["/usr/mmu_compressor", str(file), "--output-file", compression_output_file],
-                        capture_output=False, # Don't capture output since mmu_compressor writes directly to file
-                        text=True,
-                        check=False  # Don't raise on non-zero exit, we'll handle it manually
-                    )
-                    
-                    # Check return code
-                    # 0 = success, 1 = recoverable error, 2 = unrecoverable error
-                    if result.returncode == 2:
-                        error_msg = "Unrecoverable error"
-                        return (file, False, error_msg, True)  # Mark as unrecoverable
-                    elif result.returncode == 1:
-                        # Recoverable error
-                        error_msg = f"Process exited with code {result.returncode} (recoverable)"
-                        return (file, False, error_msg, False)  # Recoverable, can retry
-                    elif result.returncode != 0:
-                        # Other non-zero exit codes
-                        error_msg = f"Process exited with code {result.returncode}"
-                        return (file, False, error_msg, False)  # Treat as recoverable
-                    
-                    # Check if output file was actually created and has content
-                    if not Path(compression_output_file).exists():
-                        return (file, False, f"Output file not created: {compression_output_file}", False)
-                    elif Path(compression_output_file).stat().st_size == 0:
-                        # If empty, there might be an issue
-                        error_msg = "Output file is empty"
-                        return (file, False, error_msg, False)
-                    
-                    return (file, True, None, False)
-                except Exception as e:
-                    return (file, False, str(e), False)
-    
-    return (file, False, "Not a compressible file type", False)
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        job = {"wall_s": time.time() - job_start, "max_rss_kb": rusage.ru_maxrss}
+        result = _compression_result(file, proc.returncode, compression_output_file, job)
+        _pack_compression_output(file)
+        return result
+    except Exception as e:
+        return (file, False, str(e), False)
+
+def _peak_rss_kb(pid: int) -> int:
+    """VmHWM (peak resident set) of a running process, 0 once it is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+async def compress_file_async(file: Path, timeout: float | None = None,
+                              output_file: Path | None = None, extra_args: List[str] = (),
+                              data: bytes | None = None) -> tuple:
+    """asyncio version of compress_file(). The compressor is killed when it
+    exceeds `timeout` seconds (reported as unrecoverable) or when the task
+    is cancelled. Peak RSS is sampled from /proc while the job runs.
+    `output_file` replaces the default <file>.compression; the caller then
+    publishes it. `extra_args` are appended to the compressor command line,
+    and `data`, when given, is piped to it instead of reading the buffer."""
+    import asyncio
+
+    skip, compression_output_file = _compress_target(file)
+    if skip:
+        return skip
+    if output_file is not None:
+        compression_output_file = str(output_file)
+    piped = data is not None or file in IN_MEMORY_STORES or _packed(file) is not None
+    job_start = time.time()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            COMPRESSOR, "/dev/stdin" if piped else str(file), "--output-file", compression_output_file,
+            *extra_args, stdin=asyncio.subprocess.PIPE if piped else None)
+    except OSError as e:
+        return (file, False, str(e), False)
+
+    async def _feed():
+        # Buffers in memory or a pack are piped to the compressor
+        try:
+            for chunk in ([data] if data is not None else iter_store_chunks(file)):
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the compressor exited early; its return code tells why
+        finally:
+            proc.stdin.close()
+
+    max_rss_kb = 0
+    feeder = asyncio.ensure_future(_feed()) if piped else None
+    wait = asyncio.ensure_future(proc.wait())
+    try:
+        while True:
+            max_rss_kb = max(max_rss_kb, _peak_rss_kb(proc.pid))
+            done, _ = await asyncio.wait({wait}, timeout=1.0)
+            if done:
+                break
+            if timeout is not None and time.time() - job_start > timeout:
+                proc.kill()
+                await wait
+                job = {"wall_s": time.time() - job_start, "max_rss_kb": max_rss_kb}
+                return (file, False, f"Timed out after {timeout:g}s", True, job)
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+        await asyncio.shield(wait)
+        raise
+    finally:
+        if feeder is not None:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+
+    job = {"wall_s": time.time() - job_start, "max_rss_kb": max_rss_kb}
+    result = _compression_result(file, proc.returncode, compression_output_file, job)
+    if output_file is None:
+        _pack_compression_output(file)
+    return result
+
+# ---------------- Page sharding ----------------
+# A big buffer is split into shards of whole 4 KB pages (by the offset
+# column) so several compressors work on it at once. The compressor models
+# an MMU page by page; per-shard counters are summed and size reductions
+# are averaged weighted by the pages each shard touches.
+SHARD_PAGE_SIZE = 4096
+SHARD_COUNTERS = ("ULR miss qty", "Footer write qty", "Footer read qty")
+
+def shard_stores_file(file: Path, shards: int, shard_dir: Path | None = None) -> List[tuple]:
+    """Splits `file` into at most `shards` .stores files covering contiguous
+    page ranges with about the same number of stores each. Shards are written
+    under `shard_dir` (default <parsed dir>/.shards).
+    Returns [(shard_path, pages_touched)]."""
+    page_counts = defaultdict(int)
+    for lines in iter_store_lines(file):
+        for line in lines:
+            page_counts[int(line.rsplit(None, 1)[1]) // SHARD_PAGE_SIZE] += 1
+    pages = sorted(page_counts)
+    if len(pages) < 2 or shards < 2:
+        return []
+
+    # Cut the page list where the cumulative store count crosses k/shards
+    cumulative = np.cumsum([page_counts[p] for p in pages])
+    cuts = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, shards) / shards, side="right")
+    bounds = sorted(set([0] + cuts.tolist() + [len(pages)]))
+    ranges = [(pages[a], pages[b - 1]) for a, b in zip(bounds, bounds[1:]) if b > a]
+    if len(ranges) < 2:
+        return []
+    first_pages = [lo for lo, _ in ranges]
+
+    shard_dir = shard_dir or file.parent / ".shards"
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    stem = file.name[:-len(".stores")]
+    paths = [shard_dir / f"{stem}.shard{k}.stores" for k in range(len(ranges))]
+    outs = [open(path, "w") for path in paths]
+    try:
+        for lines in iter_store_lines(file):
+            for line in lines:
+                page = int(line.rsplit(None, 1)[1]) // SHARD_PAGE_SIZE
+                outs[bisect.bisect_right(first_pages, page) - 1].write(line)
+    finally:
+        for out in outs:
+            out.close()
+    touched = [sum(1 for p in pages if lo <= p <= hi) for lo, hi in ranges]
+    return list(zip(paths, touched))
+
+def merge_shard_results(file: Path, shards: List[tuple], output_file: Path | None = None) -> None:
+    """Writes file's compressor output (or `output_file`) from the
+    .compression files of its shards."""
+    counters: Dict[str, int] = {}
+    reductions: Dict[int, List[tuple]] = defaultdict(list)  # k-th "Size reduced by" line
+    lossless = True
+    errors = []
+    seconds = 0.0
+    for path, pages in shards:
+        output = Path(f"{path}.compression").read_text()
+        if "LineTooBigError" in output or "Line too big" in output or "FooterFullError" in output:
+            errors.extend(line for line in output.splitlines() if "Error" in line or "Line too big" in line)
+        if not any("Lossless:" in l and "True" in l for l in output.splitlines()):
+            lossless = False
+        k = 0
+        for line in output.splitlines():
+            for name in SHARD_COUNTERS:
+                if f"{name}:" in line:
+                    try:
+                        counters[name] = counters.get(name, 0) + int(line.split(':')[1].strip())
+                    except ValueError:
+                        pass
+            if "Size reduced by" in line:
+                try:
+                    reductions[k].append((float(line.split()[3].replace('%', '')), pages))
+                except (IndexError, ValueError):
+                    pass
+                k += 1
+            if line.startswith("Compressor wall time:"):
+                seconds = max(seconds, float(line.split(':')[1]))
+
+    merged = [f"Sharded: {len(shards)} shards of {SHARD_PAGE_SIZE}-byte pages"]
+    merged += errors
+    merged += [f"{name}: {counters[name]}" for name in SHARD_COUNTERS if name in counters]
+    for k in sorted(reductions):
+        total_pages = sum(p for _, p in reductions[k]) or 1
+        value = sum(r * p for r, p in reductions[k]) / total_pages
+        merged.append(f"Size reduced by {value:.2f}%")
+    merged.append(f"Lossless: {lossless}")
+    merged.append(f"Compressor wall time: {seconds:.3f}")
+    if output_file is not None:
+        output_file.write_text("\n".join(merged) + "\n")
+    else:
+        write_compression_output(file, "\n".join(merged) + "\n")
+
+def _remove_shards(shards: List[tuple]) -> None:
+    for path, _ in shards:
+        for p in (path, Path(f"{path}.compression")):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+    if shards:
+        try:
+            shards[0][0].parent.rmdir()  # only succeeds once the last shard is gone
+        except OSError:
+            pass
 
-def robust_parallel_compress(files_to_compress, num_workers=None):
+# ---------------- Work claims ----------------
+# Several compress processes, on one or many hosts, can share a .parsed
+# directory on a shared filesystem (--claims). Before compressing a buffer a
+# process creates <parsed>/.claims/<buffer>.claim.<gen> with O_EXCL and keeps
+# touching it while it works (heartbeat). A claim whose mtime is older than
+# the lease belongs to a dead worker; anyone may then take the buffer over by
+# creating generation gen+1, and the old holder drops its result when it
+# notices. Results are published by the current holder only, followed by a
+# <buffer>.done marker holding the outcome; the holder's claim stays behind
+# as a tombstone. No claim is taken on a buffer that has a .done marker,
+# checked both before and after creating the claim, so a worker that races
+# with the publication backs off instead of compressing the buffer again.
+# Hosts need synchronized clocks.
+CLAIMS_DIR = ".claims"
+CLAIMS_ANALYSIS = "analysis"
+
+class ClaimBoard:
+    """Lease-based claims on the buffer jobs of one parsed directory."""
+    def __init__(self, parsed_dir: Path, lease: float = 120.0):
+        import socket
+        import uuid
+        self.dir = Path(parsed_dir) / CLAIMS_DIR
+        self.dir.mkdir(exist_ok=True)
+        self.lease = lease
+        self.poll = min(lease / 4, 15.0)
+        self.token = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.held: Dict[str, int] = {}
+        self._gen: Dict[str, int] = {}
+
+    def _claim_path(self, name: str, gen: int) -> Path:
+        return self.dir / f"{name}.claim.{gen}"
+
+    def _done_path(self, name: str) -> Path:
+        return self.dir / f"{name}.done"
+
+    def _top_gen(self, name: str) -> int:
+        """Highest claim generation of `name` (-1 if never claimed)."""
+        gen = self._gen.get(name, -1)
+        while self._claim_path(name, gen + 1).exists():
+            gen += 1
+        self._gen[name] = gen
+        return gen
+
+    def outcome(self, name: str) -> str | None:
+        """"ok" or the error message once some worker finished `name`."""
+        try:
+            return self._done_path(name).read_text()
+        except OSError:
+            return None
+
+    def try_claim(self, name: str) -> bool:
+        if self._done_path(name).exists():
+            return False
+        gen = self._top_gen(name)
+        if gen >= 0:
+            try:
+                age = time.time() - self._claim_path(name, gen).stat().st_mtime
+            except FileNotFoundError:
+                return False  # released meanwhile
+            if age < self.lease:
+                return False
+        claim = self._claim_path(name, gen + 1)
+        try:
+            fd = os.open(claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as fh:
+            fh.write(self.token + "\n")
+        if self._done_path(name).exists():
+            # Published between the first check and the claim
+            claim.unlink(missing_ok=True)
+            return False
+        if gen >= 0:
+            METRICS.inc("memlog_claims_reclaimed_total")
+        self.held[name] = self._gen[name] = gen + 1
+        METRICS.inc("memlog_claims_total")
+        return True
+
+    def holds(self, name: str) -> bool:
+        """Whether this process still holds the newest claim on `name`."""
+        return name in self.held and self._top_gen(name) == self.held[name]
+
+    def heartbeat(self) -> None:
+        for name, gen in list(self.held.items()):
+            if self._top_gen(name) != gen:
+                del self.held[name]  # taken over; holds() is now False
+                METRICS.inc("memlog_claims_lost_total")
+                continue
+            try:
+                os.utime(self._claim_path(name, gen))
+            except OSError:
+                pass
+
+    def output_path(self, file: Path) -> Path:
+        """Private compressor output path until the result is published."""
+        return Path(f"{file}.compression.{self.token}.tmp")
+
+    def finish(self, file: Path, outcome: str) -> bool:
+        """Publishes the result for `file` if the claim is still ours."""
+        name = file.name
+        tmp = self.output_path(file)
+        if not self.holds(name):
+            tmp.unlink(missing_ok=True)
+            self.held.pop(name, None)
+            return False
+        if tmp.exists():
+            os.replace(tmp, f"{file}.compression")
+        # Outputs left behind by workers that died holding this buffer
+        for stale in file.parent.glob(f"{name}.compression.*.tmp"):
+            stale.unlink(missing_ok=True)
+        done_tmp = self.dir / f"{name}.done.{self.token}"
+        done_tmp.write_text(outcome)
+        os.replace(done_tmp, self._done_path(name))
+        # The newest claim stays as a tombstone, older generations go
+        for gen in range(self.held.pop(name)):
+            self._claim_path(name, gen).unlink(missing_ok=True)
+        return True
+
+# ---------------- Parameter sweeps ----------------
+# A sweep (--sweep) runs the compressor under several configurations (extra
+# command-line arguments) in one pass. Each buffer is read once and piped to
+# every configuration inside the same worker slot; the outputs go to
+# sweep/<config>/ (loose .compression files or a compression.pack) and
+# sweep/configs.json keeps the configurations in the order given.
+SWEEP_DIR = "sweep"
+SWEEP_CONFIGS = "configs.json"
+SWEEP_BUFFER_BYTES = 256 << 20   # larger buffers are re-read for each configuration
+
+def parse_sweep_configs(specs: List[str]) -> List[tuple]:
+    """[(name, args)] from "NAME=ARGS" strings (or bare "ARGS", named after
+    them), e.g. "mw4=--max-writes 4"."""
+    import shlex
+
+    configs = []
+    for spec in specs:
+        name, sep, args = spec.partition("=")
+        if not sep or name.startswith("-"):
+            name, args = "", spec
+        name = name or re.sub(r"[^A-Za-z0-9.+-]+", "_", args).strip("_-") or "default"
+        if any(name == other for other, _ in configs):
+            raise ValueError(f"Duplicate sweep configuration name: {name}")
+        configs.append((name, shlex.split(args)))
+    return configs
+
+def save_sweep_configs(parsed_dir: Path, configs: List[tuple]) -> None:
+    import json
+
+    sweep_dir = Path(parsed_dir) / SWEEP_DIR
+    sweep_dir.mkdir(exist_ok=True)
+    with open(sweep_dir / SWEEP_CONFIGS, "w") as fh:
+        json.dump([{"name": name, "args": args} for name, args in configs], fh, indent=1)
+
+def load_sweep_configs(parsed_dir: Path) -> List[tuple]:
+    """The configurations of the last sweep over `parsed_dir` ([] if none)."""
+    import json
+
+    try:
+        with open(Path(parsed_dir) / SWEEP_DIR / SWEEP_CONFIGS) as fh:
+            return [(c["name"], c["args"]) for c in json.load(fh)]
+    except (OSError, ValueError, KeyError):
+        return []
+
+def record_compress_job(result: tuple) -> None:
+    """Feed the job statistics of a compress_file() result into METRICS."""
+    if len(result) > 4:
+        METRICS.observe_job(result[0], result[4]["wall_s"], result[4]["max_rss_kb"], result[1])
+    METRICS.maybe_flush()
+
+async def _compress_all(files: List[Path], num_workers: int, max_retries: int,
+                        timeout: float | None, status_log: Path,
+                        shard_above: int = 0, board: ClaimBoard | None = None,
+                        configs: List[tuple] | None = None) -> list:
+    """Runs every file through compress_file_async() with at most
+    `num_workers` compressors alive. Each file retries on its own, so
+    retries overlap with first attempts of other files. Files larger than
+    `shard_above` bytes (0: never) are compressed as page shards. With a
+    ClaimBoard, only buffers claimed by this process are compressed; the
+    others wait for the outcome published by their holder. With sweep
+    `configs`, each file is run under every configuration instead (no
+    sharding or claims)."""
+    import asyncio
+
+    slots = asyncio.Semaphore(num_workers)
+    claim_slots = asyncio.Semaphore(num_workers)
+    in_flight = 0
+
+    async def _memory_check(file: Path) -> None:
+        # Check memory before launching another compressor
+        mem_percent = get_memory_percent()
+        if mem_percent > 85:
+            print(f"[compress] Memory at {mem_percent:.1f}%, waiting before launching {file.name}...")
+            with open(status_log, "a") as log:
+                log.write(f"[compress] Memory at {mem_percent:.1f}%, waiting before launching {file.name}...\n")
+            await asyncio.sleep(5)
+
+    async def _run(file: Path, output_file: Path | None, extra_args: List[str] = (),
+                   data: bytes | None = None) -> tuple:
+        nonlocal in_flight
+        in_flight += 1
+        METRICS.set("memlog_compress_in_flight", in_flight)
+        try:
+            result = await compress_file_async(file, timeout, output_file, extra_args, data)
+        finally:
+            in_flight -= 1
+            METRICS.set("memlog_compress_in_flight", in_flight)
+        record_compress_job(result)
+        return result
+
+    async def _job(file: Path, output_file: Path | None = None) -> tuple:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                METRICS.inc("memlog_compress_retries_total")
+            async with slots:
+                await _memory_check(file)
+                result = await _run(file, output_file)
+
+            if result[1]:
+                if attempt:
+                    print(f"[compress] Successfully compressed {file} on retry {attempt}")
+                    with open(status_log, "a") as log:
+                        log.write(f"[compress] Successfully compressed {file} on retry {attempt}\n")
+                return result[:3]
+            if result[3]:
+                # Don't retry unrecoverable errors
+                print(f"[compress] Unrecoverable error for {file}: {result[2]}")
+                with open(status_log, "a") as log:
+                    log.write(f"[compress] Unrecoverable error for {file}: {result[2]}\n")
+                return result[:3]
+            with open(status_log, "a") as log:
+                log.write(f"[compress] Attempt {attempt + 1} failed for {file}: {result[2]}\n")
+        return (file, False, f"Failed after {max_retries} retries")
+
+    async def _sharded_job(file: Path, output_file: Path | None = None) -> tuple:
+        # Claimed buffers shard into a private directory: after a takeover
+        # the old holder may still be writing its own shards.
+        shard_dir = file.parent / ".shards" / board.token if board else None
+        shards = await asyncio.to_thread(shard_stores_file, file, num_workers, shard_dir)
+        if not shards:
+            return await _job(file, output_file)
+        METRICS.inc("memlog_compress_sharded_buffers_total")
+        print(f"[compress] Compressing {file.name} as {len(shards)} page shards")
+        try:
+            shard_results = await asyncio.gather(*(_job(path) for path, _ in shards))
+            if all(r[1] for r in shard_results):
+                merge_shard_results(file, shards, output_file)
+                return (file, True, None)
+        finally:
+            _remove_shards(shards)
+        # A shard failed: fall back to compressing the whole buffer
+        with open(status_log, "a") as log:
+            log.write(f"[compress] Sharded compression of {file} failed, retrying unsharded\n")
+        return await _job(file, output_file)
+
+    async def _sweep_job(file: Path) -> tuple:
+        failures = []
+        async with slots:
+            data = None
+            if buffer_text_size(file) <= SWEEP_BUFFER_BYTES:
+                data = await asyncio.to_thread(lambda: b"".join(iter_store_chunks(file)))
+            for name, args in configs:
+                output_file = _output_dir(file, name) / f"{file.name}.compression.{os.getpid()}.tmp"
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                for attempt in range(max_retries + 1):
+                    if attempt:
+                        METRICS.inc("memlog_compress_retries_total")
+                    await _memory_check(file)
+                    result = await _run(file, output_file, args, data)
+                    if result[1] or result[3]:
+                        break
+                    with open(status_log, "a") as log:
+                        log.write(f"[compress] Attempt {attempt + 1} failed for {file} ({name}): {result[2]}\n")
+                if result[1]:
+                    write_compression_output(file, output_file.read_text(), name)
+                else:
+                    failures.append(f"{name}: {result[2]}")
+                output_file.unlink(missing_ok=True)
+        return (file, not failures, "; ".join(failures) or None)
+
+    async def _claimed_job(file: Path, run) -> tuple:
+        while True:
+            outcome = board.outcome(file.name)
+            if outcome is not None:
+                return (file, outcome == "ok", None if outcome == "ok" else outcome)
+            # Claim only when a local slot is free, so a claim never sits
+            # idle behind this process's own queue while its lease runs.
+            async with claim_slots:
+                if board.try_claim(file.name):
+                    result = await run(file, board.output_path(file))
+                    if board.finish(file, "ok" if result[1] else result[2]):
+                        return result
+                    with open(status_log, "a") as log:
+                        log.write(f"[compress] Lost claim on {file} to another worker, dropping result\n")
+            if board.outcome(file.name) is None:
+                await asyncio.sleep(board.poll)
+
+    async def _heartbeat() -> None:
+        while True:
+            await asyncio.to_thread(board.heartbeat)
+            await asyncio.sleep(board.lease / 3)
+
+    def _start(file: Path):
+        if configs:
+            return asyncio.ensure_future(_sweep_job(file))
+        run = _job
+        if shard_above and file.name.endswith('.stores') and buffer_text_size(file) > shard_above:
+            run = _sharded_job
+        if board is not None:
+            return asyncio.ensure_future(_claimed_job(file, run))
+        return asyncio.ensure_future(run(file))
+
+    results = []
+    start_time = last_log_time = time.time()
+    tasks = [_start(file) for file in files]
+    heartbeat = asyncio.ensure_future(_heartbeat()) if board is not None else None
+    METRICS.set("memlog_compress_queue_depth", len(tasks))
+    try:
+        for done in asyncio.as_completed(tasks):
+            results.append(await done)
+            if DISK_BUDGET.retention == "drop-analyzed":
+                await asyncio.to_thread(retire_buffer, results[-1][0])
+            METRICS.set("memlog_compress_queue_depth", len(tasks) - len(results))
+            METRICS.maybe_flush()
+
+            # Log progress every 5 minutes
+            current_time = time.time()
+            if current_time - last_log_time > 300:
+                mem_percent = get_memory_percent()
+                elapsed_hours = (current_time - start_time) / 3600
+                success_count = sum(1 for r in results if r[1])
+                with open(status_log, "a") as log:
+                    log.write(f"[compress] Progress: {len(results)}/{len(tasks)} completed, "
+                              f"Success: {success_count}, Failures: {len(results) - success_count}, "
+                              f"Elapsed: {elapsed_hours:.1f}h, Memory: {mem_percent:.1f}%\n")
+                last_log_time = current_time
+    finally:
+        # On cancellation (e.g. Ctrl-C) kill every compressor still running
+        for task in tasks + ([heartbeat] if heartbeat else []):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+def robust_parallel_compress(files_to_compress, num_workers=None, prescreen=True,
+                             model=None, predict_below=0.0, timeout=None, shard_above=0,
+                             claims=False, lease=120.0, configs=None):
     """
     Robustly compress files in parallel with retry logic and memory management.
+    Compressors are launched directly from an asyncio loop (no worker pool);
+    `timeout` caps the seconds a single compressor run may take. .stores
+    files bigger than `shard_above` bytes are split into page shards.
+    With `claims`, other processes (on this or other hosts) may work on the
+    same parsed directory: buffers are shared out through a ClaimBoard with
+    `lease` seconds before a silent worker's buffers are taken over.
+    With sweep `configs` ([(name, args)], see parse_sweep_configs()) every
+    buffer is compressed under each configuration into sweep/<name>/.
+    With `prescreen`, buffers decided by prescreen_files() are not dispatched.
+    With a CompressibilityModel `model`, jobs are ordered by plan_compression().
     Returns list of (file, success, error_msg) tuples.
     """
+    import asyncio
+
     if num_workers is None:
         num_workers = max(1, cpu_count() - 1)   # Leave one core free for system tasks
         num_workers = min(num_workers, 5)       # Cap at 5 workers to avoid excessive disk use
     
     results = []
-    failed_files = []  # List of (file, retry_count, is_unrecoverable) tuples
     skipped_files = []
     max_retries = 3
     
@@ -602,21 +3460,39 @@ def robust_parallel_compress(files_to_compress, num_workers=None):
                 skipped_files.append(file)
                 results.append((file, False, "Buffers containing objects are not compressible"))
             else:
-                # Check if a .compression file already exists with unrecoverable errors
-                compression_file = Path(str(file) + ".compression")
-                if compression_file.exists():
-                    with open(compression_file, 'r') as f:
-                        content = f.read()
-                        # Check for unrecoverable errors
-                        if "FooterFullError" in content or "LineTooBigError" in content or "Line too big" in content:
-                            # Skip this file - it has unrecoverable errors
-                            error_msg = "Skipping - existing compression has unrecoverable error"
-                            print(f"[compress] Skipping {file.name} - unrecoverable error already detected")
-                            results.append((file, False, error_msg))
-                            continue
+                # Check if a .compression output already exists with unrecoverable errors
+                # (a sweep runs other settings, which may not hit them)
+                content = read_compression_output(file) if not configs else None
+                if content is not None:
+                    # Check for unrecoverable errors
+                    if "FooterFullError" in content or "LineTooBigError" in content or "Line too big" in content:
+                        # Skip this file - it has unrecoverable errors
+                        error_msg = "Skipping - existing compression has unrecoverable error"
+                        print(f"[compress] Skipping {file.name} - unrecoverable error already detected")
+                        results.append((file, False, error_msg))
+                        continue
                 files_to_actually_compress.append(file)
         else:
             files_to_actually_compress.append(file)
+
+    if prescreen:
+        prescreened, files_to_actually_compress = prescreen_files(files_to_actually_compress)
+        results.extend(prescreened)
+    if model is not None:
+        predicted, files_to_actually_compress = plan_compression(files_to_actually_compress, model, predict_below)
+        results.extend(predicted)
+    if DISK_BUDGET.retention == "drop-analyzed":
+        # Buffers decided without a compressor run are done with their .stores
+        for file, *_ in results:
+            retire_buffer(file)
+    if configs:
+        save_sweep_configs(files_to_compress[0].parent, configs)
+        # Decided buffers get the same synthetic output under every configuration
+        for file, *_ in results:
+            output = read_compression_output(file)
+            if output is not None and output.startswith("Prescreen:"):
+                for name, _args in configs:
+                    write_compression_output(file, output, name)
     
     # Report skipped files immediately
     if skipped_files:
@@ -626,7 +3502,7 @@ def robust_parallel_compress(files_to_compress, num_workers=None):
     if not files_to_actually_compress:
         return results
     
-    # First attempt with multiprocessing pool
+    compress_start = time.time()
     print(f"[compress] Processing {len(files_to_actually_compress)} files using {num_workers} workers")
     
     # Also log to external file
@@ -635,197 +3511,295 @@ def robust_parallel_compress(files_to_compress, num_workers=None):
         log.write(f"[compress] Starting compression of {len(files_to_actually_compress)} files with {num_workers} workers\n")
         log.write(f"[compress] Skipped {len(skipped_files)} object type .stores files\n")
         log.write(f"[compress] Initial memory usage: {get_memory_percent():.1f}%\n")
-    
-    processed_count = 0
-    expected_count = len(files_to_actually_compress)
-    
-    try:
-        # Use spawn context for better memory isolation
-        ctx = get_context('spawn')
-        
-        # Process in smaller chunks to avoid overwhelming memory
-        chunk_size = max(1, len(files_to_actually_compress) // (num_workers * 4))
-        
-        with ctx.Pool(processes=num_workers, maxtasksperchild=10) as pool:
-            # Use apply_async with timeout for better control
-            async_results = []
-            for file in files_to_actually_compress:
-                async_results.append((file, pool.apply_async(compress_file, (file,))))
-            
-            # Monitor results without blocking timeout
-            pool.close()  # Stop accepting new tasks
-            
-            # Monitor completion with periodic checks
-            completed = []
-            start_time = time.time()
-            last_log_time = start_time
-            
-            while len(completed) < len(async_results):
-                time.sleep(30)  # Check every 30 seconds
-                current_time = time.time()
-                
-                # Check which tasks are done
-                newly_completed = []
-                for idx, (file, async_result) in enumerate(async_results):
-                    if idx not in completed:
-                        if async_result.ready():
-                            try:
-                                result = async_result.get(timeout=1)  # Should be immediate since it's ready
-                                # result is now (file, success, error_msg, is_unrecoverable)
-                                if result[1]:  # Success
-                                    results.append(result[:3])  # Only keep first 3 elements for results
-                                else:
-                                    # Check if it's unrecoverable
-                                    is_unrecoverable = result[3] if len(result) > 3 else False
-                                    if is_unrecoverable:
-                                        # Don't add to failed_files for retry, add directly to results
-                                        results.append(result[:3])
-                                        print(f"[compress] Unrecoverable error for {file}: {result[2]}")
-                                        with open(status_log, "a") as log:
-                                            log.write(f"[compress] Unrecoverable error for {file}: {result[2]}\n")
-                                    else:
-                                        failed_files.append((result[0], 0, False))
-                                newly_completed.append(idx)
-                                processed_count += 1
-                            except Exception as e:
-                                # Worker was killed
-                                error_msg = f"Worker killed: {str(e)}"
-                                print(f"[compress] {error_msg} for {file}")
-                                with open(status_log, "a") as log:
-                                    log.write(f"[compress] WORKER KILLED: {file} - {error_msg}\n")
-                                failed_files.append((file, 0, False))  # Not unrecoverable, can retry
-                                newly_completed.append(idx)
-                                processed_count += 1
-                
-                completed.extend(newly_completed)
-                
-                # Log progress every 5 minutes
-                if current_time - last_log_time > 300:
-                    mem_percent = get_memory_percent()
-                    elapsed_hours = (current_time - start_time) / 3600
-                    success_count = len(results)
-                    failure_count = len(failed_files)
-                    with open(status_log, "a") as log:
-                        log.write(f"[compress] Progress: {len(completed)}/{expected_count} completed, "
-                                f"Success: {success_count}, Failures: {failure_count}, "
-                                f"Elapsed: {elapsed_hours:.1f}h, Memory: {mem_percent:.1f}%\n")
-                        if newly_completed:
-                            log.write(f"[compress] Recently completed: {len(newly_completed)} files\n")
-                    last_log_time = current_time
-                    
-                    # Check for high memory
-                    if mem_percent > 95:
-                        print(f"[compress] CRITICAL: Memory at {mem_percent:.1f}%!")
-                        with open(status_log, "a") as log:
-                            log.write(f"[compress] CRITICAL MEMORY: {mem_percent:.1f}%\n")
-            
-            pool.join()  # Wait for all workers to finish
-    
-    except Exception as e:
-        error_msg = f"Pool processing failed: {e}"
-        print(f"[compress] {error_msg}. Falling back to sequential processing.")
-        with open(status_log, "a") as log:
-            log.write(f"[compress] POOL FAILURE: {error_msg}\n")
-            log.write(f"[compress] Processed {processed_count} out of {expected_count} files before failure\n")
-        
-        # Add all unprocessed files to failed list (excluding already skipped object type .stores files)
-        processed_files = {r[0] for r in results}
-        processed_files.update({f for f, _, _ in failed_files})
-        for f in files_to_actually_compress:
-            if f not in processed_files:
-                failed_files.append((f, 0, False))  # Not unrecoverable, can retry
-    
-    # Retry failed files with reduced parallelism or sequentially
-    while failed_files and any(retry_count < max_retries and not is_unrec for _, retry_count, is_unrec in failed_files):
-        print(f"[compress] Retrying {len(failed_files)} failed files...")
+
+    board = ClaimBoard(files_to_actually_compress[0].parent, lease) if claims else None
+    results.extend(asyncio.run(_compress_all(files_to_actually_compress, num_workers,
+                                             max_retries, timeout, status_log, shard_above, board,
+                                             configs)))
+
+    METRICS.set("memlog_compress_queue_depth", 0)
+    METRICS.add_phase("compress", time.time() - compress_start)
+    return results
+
+# ---------------- Batch driver ----------------
+# --batch runs many programs under the memlog tool at once, one Valgrind per
+# CPU slot (pinned with sched_setaffinity, since Valgrind runs the guest on a
+# single thread), each logging into its own <batch>/<NNN>-<name>/ directory.
+# A job is only started when the memory and disk it may still need fit: each
+# running job reserves mem_per_job / disk_per_job minus what its process and
+# logs already use. Finished logs are handed to memlog_parser.py pipelines
+# (parse + compress) while the remaining programs still run. Targets are
+# executables (with arguments), "spec:<benchmark>" for SPEC CPU2017 through
+# runcpu, or "@file" listing one target per line.
+BATCH_VALGRIND = "/opt/valgrind/inst/bin/valgrind"
+BATCH_VALGRIND_OPTS = ["--tool=memcheck", "--leak-check=no", "--track-origins=no",
+                       "--undef-value-errors=no", "--time-stamp=yes"]
+BATCH_SPEC_DIR = "/usr/cpu2017"
+BATCH_SPEC_CONFIG = "memlog-monitor.cfg"
+BATCH_SUMMARY = "batch.tsv"
+BATCH_POLL = 2.0   # seconds between admission checks while jobs are waiting
+BATCH_SPAWN_FAILED = 127   # exit code recorded when a job or pipeline cannot be started
+
+def expand_batch_targets(items: List[str]) -> List[str]:
+    """Batch targets with "@file" items replaced by the lines of the file
+    (blank lines and # comments skipped)."""
+    targets = []
+    for item in items:
+        if item.startswith("@"):
+            with open(item[1:], "r") as fh:
+                for line in fh:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        targets.append(line)
+        else:
+            targets.append(item)
+    return targets
+
+class BatchJob:
+    """One program of a batch: its Valgrind (or runcpu) run, then one
+    pipeline per log it produced."""
+
+    def __init__(self, index: int, target: str, batch_dir: Path):
+        import shlex
+
+        self.target = target
+        self.spec = target.startswith("spec:")
+        self.argv = [target[len("spec:"):]] if self.spec else shlex.split(target)
+        name = re.sub(r"[^A-Za-z0-9.+-]+", "_", Path(self.argv[0]).name).strip("_-") or "job"
+        self.dir = Path(batch_dir) / f"{index:03d}-{name}"
+        self.log_path = self.dir / "memlog.log"
+        self.cpus: List[int] = []
+        self.pid = None
+        self.started = None
+        self.run_seconds = None
+        self.returncode = None
+        self.error = None                   # why the run could not be started
+        self.pipelines: List[tuple] = []    # (input, returncode, seconds)
+
+    def command(self, valgrind: str, memlog_opts: List[str], spec_size: str) -> List[str]:
+        if self.spec:
+            import shlex
+
+            # The config's monitor_wrapper runs Valgrind; memlog_dir gives the
+            # run its own log directory and memlog_no_parse leaves the logs to us
+            runcpu = ["runcpu", "--action=run", f"--config={BATCH_SPEC_CONFIG}", f"--size={spec_size}",
+                      "--define", f"memlog_dir={self.dir}", "--define", "memlog_no_parse=1"]
+            if memlog_opts:
+                runcpu += ["--define", f"memlog_opts={' '.join(memlog_opts)}"]
+            runcpu.append(self.argv[0])
+            return ["bash", "-c", f"cd {BATCH_SPEC_DIR} && . ./shrc && {shlex.join(runcpu)}"]
+        return [valgrind, *BATCH_VALGRIND_OPTS, f"--log-file={self.log_path}", *memlog_opts, "--", *self.argv]
+
+    def logs(self) -> List[Path]:
+        """The Valgrind logs the run produced (one per benchmark command
+        for SPEC targets)."""
+        if self.spec:
+            return sorted(self.dir.glob("*/memlog.log"))
+        return [self.log_path] if self.log_path.is_file() else []
+
+    def disk_used(self) -> int:
+        total = 0
+        for path in self.dir.rglob("*"):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+def _batch_memlog_opts(memlog_format: str, job: BatchJob) -> tuple:
+    """(extra Valgrind options, parse input, parser options) for a job, the
+    same MEMLOG_FORMAT handling as analyze.sh."""
+    import shlex
+
+    opts = shlex.split(os.environ.get("MEMLOG_OPTS", ""))
+    if memlog_format == "compact" and not job.spec:
+        stream = job.dir / "memlog.mlc"
+        return opts + ["--memlog-format=compact", f"--memlog-compact-file={stream}"], stream, []
+    if memlog_format == "stats":
+        return opts + ["--memlog-format=stats"], None, ["--stats"]
+    return opts, None, []
+
+async def _run_batch(jobs: List[BatchJob], batch_dir: Path, *, slots: int, cpus_per_job: int,
+                     mem_per_job: int, disk_per_job: int, pipelines: int,
+                     pipeline_args: List[str], valgrind: str, spec_size: str,
+                     memlog_format: str, status_log: Path) -> None:
+    import asyncio, shutil, sys
+
+    # Programs running on each CPU; only above one per CPU when --jobs asks for it
+    cpu_load = {cpu: 0 for cpu in sorted(os.sched_getaffinity(0))}
+    running: List[BatchJob] = []
+    pipeline_slots = asyncio.Semaphore(pipelines)
+    pipeline_tasks = []
+    changed = asyncio.Event()
+
+    def _log(message: str) -> None:
+        print(message)
         with open(status_log, "a") as log:
-            log.write(f"[compress] Retrying {len(failed_files)} failed files...\n")
-        new_failed = []
-        
-        for file, retry_count, is_unrecoverable in failed_files:
-            # Skip object type .stores files - they should never be in failed_files but double check
-            if file.name.endswith('.stores'):
-                parts = file.name.replace('.stores', '').split('_')
-                if len(parts) >= 4 and parts[2] == 'object':
-                    results.append((file, False, "Buffers containing objects are not compressible"))
-                    continue
-            
-            # Skip unrecoverable errors
-            if is_unrecoverable:
-                results.append((file, False, f"Unrecoverable error - no retry attempted"))
-                continue
-                
-            if retry_count >= max_retries:
-                # Max retries reached, mark as permanently failed
-                results.append((file, False, f"Failed after {max_retries} retries"))
-                continue
-            
-            # Check memory before attempting
-            mem_percent = get_memory_percent()
-            if mem_percent > 85:
-                print(f"[compress] Memory at {mem_percent:.1f}%, waiting before retry...")
-                with open(status_log, "a") as log:
-                    log.write(f"[compress] Memory at {mem_percent:.1f}%, waiting before retry...\n")
-                time.sleep(5)
-            
-            # Try sequential processing for retries
+            log.write(message + "\n")
+
+    def _publish() -> None:
+        METRICS.set("memlog_batch_running", len(running))
+        METRICS.set("memlog_batch_pipelines_running", sum(not t.done() for t in pipeline_tasks))
+        METRICS.maybe_flush()
+
+    def _admit() -> tuple:
+        """(ok, reason) for starting one more job now."""
+        if len(running) >= slots:
+            return False, "slots"
+        pending_mem = sum(max(0, mem_per_job - get_process_rss(job.pid)) for job in running)
+        available = get_memory_available()
+        if available and available - pending_mem < mem_per_job:
+            return False, f"memory ({available >> 20} MB available, {pending_mem >> 20} MB reserved)"
+        pending_disk = sum(max(0, disk_per_job - job.disk_used()) for job in running)
+        free_disk = shutil.disk_usage(batch_dir).free
+        if free_disk - pending_disk < disk_per_job:
+            return False, f"disk ({free_disk >> 20} MB free, {pending_disk >> 20} MB reserved)"
+        return True, ""
+
+    async def _pipeline(job: BatchJob, source: Path, parser_opts: List[str]) -> None:
+        async with pipeline_slots:
+            _publish()
+            start = time.time()
+            error = None
             try:
-                result = compress_file(file)
-                # result is now (file, success, error_msg, is_unrecoverable)
-                if result[1]:  # Success
-                    results.append(result[:3])  # Only keep first 3 elements
-                    print(f"[compress] Successfully compressed {file} on retry {retry_count + 1}")
-                    with open(status_log, "a") as log:
-                        log.write(f"[compress] Successfully compressed {file} on retry {retry_count + 1}\n")
-                else:
-                    # Check if the new failure is unrecoverable
-                    is_unrecoverable_now = result[3] if len(result) > 3 else False
-                    if is_unrecoverable_now:
-                        # Don't retry unrecoverable errors
-                        results.append(result[:3])
-                        print(f"[compress] Unrecoverable error encountered on retry for {file}: {result[2]}")
-                        with open(status_log, "a") as log:
-                            log.write(f"[compress] Unrecoverable error encountered on retry for {file}: {result[2]}\n")
-                    else:
-                        # Check if it's an object type file
-                        is_object = False
-                        if file.name.endswith('.stores'):
-                            parts = file.name.replace('.stores', '').split('_')
-                            if len(parts) >= 4 and parts[2] == 'object':
-                                is_object = True
-                        if not is_object:
-                            new_failed.append((file, retry_count + 1, False))
-                        else:
-                            results.append((file, False, "Buffers containing objects are not compressible"))
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, os.path.abspath(__file__), str(source), *parser_opts,
+                    "--metrics-dir", str(source.parent), *pipeline_args,
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+                returncode = await proc.wait()
             except Exception as e:
-                print(f"[compress] Retry failed for {file}: {e}")
-                with open(status_log, "a") as log:
-                    log.write(f"[compress] Retry failed for {file}: {e}\n")
-                # Don't retry object type .stores files
-                is_object = False
-                if file.name.endswith('.stores'):
-                    parts = file.name.replace('.stores', '').split('_')
-                    if len(parts) >= 4 and parts[2] == 'object':
-                        is_object = True
-                if not is_object:
-                    new_failed.append((file, retry_count + 1, False))
-                else:
-                    results.append((file, False, "Buffers containing objects are not compressible"))
-        
-        failed_files = new_failed
-    
-    # Final report of permanently failed files
-    for file, _, is_unrecoverable in failed_files:
-        if is_unrecoverable:
-            results.append((file, False, "Unrecoverable error - no retry attempted"))
+                returncode, error = BATCH_SPAWN_FAILED, f"{type(e).__name__}: {e}"
+        job.pipelines.append((source, returncode, time.time() - start))
+        METRICS.inc("memlog_batch_pipelines_total")
+        if error:
+            _log(f"[batch] {job.dir.name}: pipeline for {source.name} could not start: {error}")
         else:
-            results.append((file, False, "Permanent failure after all retries"))
-    
-    return results
+            _log(f"[batch] {job.dir.name}: pipeline for {source.name} finished (exit {returncode}) in {time.time() - start:.1f}s")
+        _publish()
+
+    async def _job(job: BatchJob) -> None:
+        cpus = job.cpus
+        parse_input = parser_opts = None
+        try:
+            memlog_opts, parse_input, parser_opts = _batch_memlog_opts(memlog_format, job)
+            proc = await asyncio.create_subprocess_exec(
+                *job.command(valgrind, memlog_opts, spec_size),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+                preexec_fn=lambda: os.sched_setaffinity(0, cpus))
+            job.pid = proc.pid
+            job.returncode = await proc.wait()
+        except Exception as e:
+            # Missing Valgrind or target, failed affinity...: the job fails, not the batch
+            job.returncode = BATCH_SPAWN_FAILED
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            # Always give the slot and CPUs back, or the admission loop waits forever
+            job.run_seconds = time.time() - job.started
+            running.remove(job)
+            for cpu in job.cpus:
+                cpu_load[cpu] -= 1
+            changed.set()
+
+        METRICS.inc("memlog_batch_jobs_total")
+        if job.returncode != 0:
+            METRICS.inc("memlog_batch_failures_total")
+        if job.error is not None:
+            _log(f"[batch] {job.dir.name}: could not start: {job.error}")
+            _publish()
+            return
+        logs = job.logs()
+        _log(f"[batch] {job.dir.name}: exit {job.returncode} after {job.run_seconds:.1f}s, {len(logs)} log(s)")
+        if job.returncode == 0 or job.spec:
+            # runcpu also fails when one benchmark does, its other logs are fine
+            for source in ([parse_input] if parse_input is not None else logs):
+                if source.is_file():
+                    pipeline_tasks.append(asyncio.ensure_future(_pipeline(job, source, parser_opts)))
+        changed.set()
+        _publish()
+
+    job_tasks = []
+    queue = list(jobs)
+    waiting_reason = None
+    while queue:
+        ok, reason = _admit()
+        if not ok and (running or any(not t.done() for t in pipeline_tasks)):
+            if reason != waiting_reason and reason != "slots":
+                _log(f"[batch] Holding {queue[0].dir.name}: waiting for {reason}")
+            waiting_reason = reason
+            changed.clear()
+            try:
+                await asyncio.wait_for(changed.wait(), BATCH_POLL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        if not ok:
+            # Nothing left to wait for: run it anyway rather than stall the batch
+            _log(f"[batch] Starting {queue[0].dir.name} despite {reason}: no other job is running")
+        waiting_reason = None
+        job = queue.pop(0)
+        job.dir.mkdir(parents=True, exist_ok=True)
+        job.cpus = sorted(sorted(cpu_load, key=lambda cpu: (cpu_load[cpu], cpu))[:cpus_per_job])
+        for cpu in job.cpus:
+            cpu_load[cpu] += 1
+        job.started = time.time()
+        running.append(job)
+        _log(f"[batch] Starting {job.dir.name} on CPU {','.join(map(str, job.cpus))}: {job.target}")
+        job_tasks.append(asyncio.ensure_future(_job(job)))
+        _publish()
+
+    # Pipelines are queued by the jobs themselves, so all exist by now
+    await asyncio.gather(*job_tasks)
+    await asyncio.gather(*pipeline_tasks)
+    _publish()
+
+def run_batch(targets: List[str], batch_dir: str | os.PathLike | None = None, *,
+              jobs: int | None = None, cpus_per_job: int = 1,
+              mem_per_job: int = 4 << 30, disk_per_job: int = 16 << 30,
+              pipelines: int = 1, pipeline_args: List[str] = (),
+              valgrind: str = BATCH_VALGRIND, spec_size: str = "test") -> List[BatchJob]:
+    """Runs every target under the memlog tool, `jobs` at a time (default:
+    one per `cpus_per_job` usable CPUs), and pipes each finished log through
+    memlog_parser.py with `pipeline_args`. Writes <batch_dir>/batch.tsv and
+    returns the jobs. MEMLOG_FORMAT / MEMLOG_OPTS are honoured like in
+    analyze.sh."""
+    import asyncio
+
+    if batch_dir is None:
+        batch_dir = Path("/tmp") / f"memlog-batch-{time.strftime('%Y%m%d_%H%M%S')}"
+    batch_dir = Path(batch_dir)
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    usable = len(os.sched_getaffinity(0))
+    cpus_per_job = max(1, min(cpus_per_job, usable))
+    slots = jobs if jobs else max(1, usable // cpus_per_job)
+    batch_jobs = [BatchJob(i, target, batch_dir) for i, target in enumerate(targets)]
+    status_log = Path("/tmp/memlog_parser_status.log")
+
+    print(f"[batch] {len(batch_jobs)} programs, {slots} at a time ({cpus_per_job} CPU each). Logs in: {batch_dir}")
+    batch_start = time.time()
+    asyncio.run(_run_batch(batch_jobs, batch_dir, slots=slots, cpus_per_job=cpus_per_job,
+                           mem_per_job=mem_per_job, disk_per_job=disk_per_job,
+                           pipelines=max(1, pipelines), pipeline_args=list(pipeline_args),
+                           valgrind=valgrind, spec_size=spec_size,
+                           memlog_format=os.environ.get("MEMLOG_FORMAT", "text"),
+                           status_log=status_log))
+    METRICS.add_phase("batch", time.time() - batch_start)
+
+    with open(batch_dir / BATCH_SUMMARY, "w") as fh:
+        fh.write("job\ttarget\tcpus\texit\trun_seconds\tlogs\tpipeline_exits\tpipeline_seconds\terror\n")
+        for job in batch_jobs:
+            error = (job.error or "").replace("\t", " ").replace("\n", " ")
+            fh.write(f"{job.dir.name}\t{job.target}\t{','.join(map(str, job.cpus))}\t{job.returncode}\t"
+                     f"{job.run_seconds or 0:.1f}\t{len(job.logs())}\t"
+                     f"{','.join(str(rc) for _, rc, _ in job.pipelines)}\t"
+                     f"{sum(sec for _, _, sec in job.pipelines):.1f}\t{error}\n")
+    failed = sum(job.returncode != 0 for job in batch_jobs)
+    print(f"[batch] Finished {len(batch_jobs)} programs ({failed} failed) in {time.time() - batch_start:.1f}s. "
+          f"Summary: {batch_dir / BATCH_SUMMARY}")
+    return batch_jobs
 
 # -------------------------------------------------------
 if __name__ == "__main__":
-    import argparse, subprocess, sys
+    import argparse, atexit, subprocess, sys
 
     parser = argparse.ArgumentParser(description="Parse Valgrind logs; ignore ALLOCs without STOREs.")
     parser.add_argument("logfile", nargs='?', help="Ruta al fichero .log a procesar")
@@ -833,7 +3807,161 @@ if __name__ == "__main__":
     parser.add_argument("--parsed-dir", default=None, help="Path to an existing parsed directory to process (skips parsing)")
     parser.add_argument("--workers", type=int, default=None, help="Number of parallel workers (default: auto)")
     parser.add_argument("--sequential", action='store_true', help="Force sequential processing (no parallelism)")
+    parser.add_argument("--pack", action='store_true', help="Write buffers and compressor outputs into stores.pack/compression.pack instead of one file per allocation")
+    parser.add_argument("--extract", nargs='+', metavar="BUFFER", default=None, help="With --parsed-dir, write the named packed buffers (or 'all') out as .stores files and exit")
+    parser.add_argument("--memory-budget", type=int, default=0, help="Keep parsed buffers in memory up to this many bytes instead of writing .stores files, for this run only; larger buffers spill to disk (default: 0, off)")
+    parser.add_argument("--shm-budget", type=int, default=None, help=argparse.SUPPRESS)  # deprecated alias of --memory-budget
+    parser.add_argument("--shard-above", type=int, default=0, help="Split .stores files bigger than this many bytes into 4 KB-page shards compressed in parallel (default: 0, off)")
+    parser.add_argument("--claims", action='store_true', help="Share compression of the parsed directory with other memlog_parser processes (any host) through lease files in <parsed>/.claims; join a run with --parsed-dir")
+    parser.add_argument("--lease", type=float, default=120.0, help="With --claims, seconds without a heartbeat after which a worker's buffers are taken over (default: 120)")
+    parser.add_argument("--sweep", nargs='+', metavar="NAME=ARGS", default=None, help="Compress every buffer under each compressor configuration (extra arguments, e.g. 'mw4=--max-writes 4') into sweep/<NAME>/ and compare them in <parsed>.sweep; with --parsed-dir, sweeps an existing directory")
+    parser.add_argument("--job-timeout", type=float, default=None, help="Kill a compressor run after this many seconds and record it as unrecoverable (default: no limit)")
+    parser.add_argument("--no-baselines", action='store_true', help="Leave the zero/constant, Gorilla, FPC and zlib baseline columns of .analyzed empty (skips rebuilding buffer images)")
+    parser.add_argument("--no-prescreen", action='store_true', help="Send every float/double buffer to the compressor (no NumPy pre-screen)")
+    parser.add_argument("--train-predictor", nargs='+', metavar="PATH", default=None, help="Train a compressibility model from .analyzed files (or directories searched recursively) and write it to --model")
+    parser.add_argument("--model", default=None, help="Compressibility model JSON; when compressing, jobs are ordered by predicted bytes saved per second")
+    parser.add_argument("--predict-below", type=float, default=0.0, help="With --model, report predicted results instead of compressing buffers predicted to save fewer bytes than this (default: 0, off)")
+    parser.add_argument("--index", action='store_true', help="Build <logfile>.index.npz (ALLOC/FREE offsets and region live sets) and exit")
+    parser.add_argument("--buffer", nargs=2, metavar=("START", "USAGE"), default=None, help="Rebuild one buffer (start address, usage number) from the raw log through its index and write it into <logfile>.parsed, without parsing the whole log")
+    parser.add_argument("--min-free-disk", type=int, default=0, help="Pause parsing while the disk holding the parsed directory has fewer than this many bytes free (default: 0, off)")
+    parser.add_argument("--retention", choices=RETENTION_POLICIES, default="keep", help="Which .stores files to delete once their .analyzed row is recorded in <parsed>/<name>.retired: keep (default), drop-objects (object buffers, right after parsing) or drop-analyzed (also float/double buffers once compressed)")
+    parser.add_argument("--segments", default=None, metavar="PREFIX", help="Parse the log segments <PREFIX>.00000, ... written with --memlog-segment-mb/--memlog-segment-events in parallel into <PREFIX>.parsed instead of a logfile")
+    parser.add_argument("--follow", action='store_true', help="With --segments, parse segments as the tool closes them until <PREFIX>.end is written")
+    parser.add_argument("--delete-segments", action='store_true', help="With --segments, delete each segment once it is parsed")
+    parser.add_argument("--stats", action='store_true', help="Summarize a log written with --memlog-format=stats (no parsing or compression)")
+    parser.add_argument("--batch", nargs='+', metavar="TARGET", default=None, help="Run several programs under the memlog tool in parallel and parse/compress each log as it finishes; a TARGET is an executable with its arguments (quoted), spec:<benchmark>, or @file listing targets one per line. The other options are passed on to the per-log pipelines")
+    parser.add_argument("--batch-dir", default=None, help="With --batch, directory for the per-program logs and batch.tsv (default: /tmp/memlog-batch-<timestamp>)")
+    parser.add_argument("--jobs", type=int, default=None, help="With --batch, programs run at the same time (default: usable CPUs / --cpus-per-job)")
+    parser.add_argument("--cpus-per-job", type=int, default=1, help="With --batch, CPUs each Valgrind is pinned to (default: 1)")
+    parser.add_argument("--mem-per-job", type=int, default=4 << 30, help="With --batch, bytes of memory a program may need; it is only started when that much is available besides what running programs may still grow into (default: 4 GiB)")
+    parser.add_argument("--disk-per-job", type=int, default=16 << 30, help="With --batch, bytes of log a program may write, checked like --mem-per-job against free disk space (default: 16 GiB)")
+    parser.add_argument("--pipelines", type=int, default=1, help="With --batch, logs parsed and compressed at the same time (default: 1)")
+    parser.add_argument("--valgrind", default=BATCH_VALGRIND, help=f"With --batch, the Valgrind launcher (default: {BATCH_VALGRIND})")
+    parser.add_argument("--spec-size", default="test", help="With --batch, runcpu workload size for spec: targets (default: test)")
+    parser.add_argument("--metrics-dir", default="/tmp", help="Directory for memlog_parser.prom and memlog_parser.metrics.json (default: /tmp)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="Seconds between Prometheus file rewrites (default: 10)")
+    parser.add_argument("--profile", action='store_true', help="Capture cProfile (memlog_parser.pstats) and tracemalloc top allocations into the metrics dir")
     args = parser.parse_args()
+
+    # atexit runs handlers last-in first-out: the profile is captured
+    # before the final metrics flush, so tracemalloc data lands in the JSON.
+    METRICS.configure(args.metrics_dir, args.metrics_interval)
+    atexit.register(METRICS.flush)
+    # Buffers held in this process's memory are invisible to other
+    # workers, so a shared (--claims) run keeps every buffer on disk.
+    if args.shm_budget is not None:
+        print("[memory] --shm-budget is deprecated (buffers are not in shared memory), use --memory-budget")
+        args.memory_budget = args.memory_budget or args.shm_budget
+    IN_MEMORY_STORES.configure(0 if args.claims else args.memory_budget)
+    atexit.register(IN_MEMORY_STORES.close)
+    if args.claims:
+        PACK_COMPRESSION_OUTPUTS = False
+    DISK_BUDGET.configure(args.min_free_disk, args.retention)
+    if args.no_baselines:
+        BASELINE_ESTIMATES = False
+    if args.profile:
+        import cProfile, tracemalloc
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+
+        def _dump_profile():
+            profiler.disable()
+            profiler.dump_stats(str(Path(args.metrics_dir) / "memlog_parser.pstats"))
+            snapshot = tracemalloc.take_snapshot()
+            METRICS.extra["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            METRICS.extra["tracemalloc_top"] = [
+                {"where": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:20]
+            ]
+
+        atexit.register(_dump_profile)
+        profiler.enable()
+
+    sweep_configs = None
+    if args.sweep:
+        try:
+            sweep_configs = parse_sweep_configs(args.sweep)
+        except ValueError as e:
+            print(f"[sweep] {e}")
+            sys.exit(1)
+        if args.claims:
+            print("[sweep] --sweep cannot be combined with --claims")
+            sys.exit(1)
+    if args.retention == "drop-analyzed" and (args.sweep or args.claims):
+        # Both read the .stores files again after a compressor output exists
+        print("[retention] --retention drop-analyzed cannot be combined with --sweep or --claims")
+        sys.exit(1)
+
+    if args.train_predictor:
+        if not args.model:
+            print("[predict] Error: --train-predictor needs --model to write the model to")
+            sys.exit(1)
+        rows = list(iter_training_rows(args.train_predictor))
+        if not rows:
+            print("[predict] No compressor results found in the given .analyzed files")
+            sys.exit(1)
+        CompressibilityModel.fit(rows).save(args.model)
+        print(f"[predict] Trained on {len(rows)} buffers. Model written to: {args.model}")
+        sys.exit(0)
+    model = CompressibilityModel.load(args.model) if args.model else None
+
+    if args.batch:
+        try:
+            targets = expand_batch_targets(args.batch)
+        except OSError as e:
+            print(f"[batch] {e}")
+            sys.exit(1)
+        # Pipeline options are forwarded to every per-log memlog_parser.py
+        pipeline_args = []
+        for flag, value in (("--workers", args.workers), ("--memory-budget", args.memory_budget or None),
+                            ("--shard-above", args.shard_above or None), ("--job-timeout", args.job_timeout),
+                            ("--model", args.model), ("--predict-below", args.predict_below or None),
+                            ("--metrics-interval", args.metrics_interval),
+                            ("--min-free-disk", args.min_free_disk or None),
+                            ("--retention", args.retention if args.retention != "keep" else None)):
+            if value is not None:
+                pipeline_args += [flag, str(value)]
+        for flag, value in (("--sequential", args.sequential), ("--pack", args.pack),
+                            ("--no-prescreen", args.no_prescreen), ("--no-baselines", args.no_baselines)):
+            if value:
+                pipeline_args.append(flag)
+        if sweep_configs:
+            pipeline_args += ["--sweep", *args.sweep]
+        jobs = run_batch(targets, args.batch_dir, jobs=args.jobs, cpus_per_job=args.cpus_per_job,
+                         mem_per_job=args.mem_per_job, disk_per_job=args.disk_per_job,
+                         pipelines=args.pipelines, pipeline_args=pipeline_args,
+                         valgrind=args.valgrind, spec_size=args.spec_size)
+        sys.exit(1 if any(job.returncode != 0 for job in jobs) else 0)
+
+    if args.stats:
+        if not args.logfile or not Path(args.logfile).is_file():
+            print(f"[stats] File not found: {args.logfile}")
+            sys.exit(1)
+        process_stats(args.logfile)
+        sys.exit(0)
+
+    if args.index or args.buffer:
+        if not args.logfile or not Path(args.logfile).is_file():
+            print(f"[index] File not found: {args.logfile}")
+            sys.exit(1)
+        if args.index:
+            LogIndex.build(args.logfile)
+        if args.buffer:
+            start_addr, usage_num = int(args.buffer[0], 16), int(args.buffer[1])
+            query_start = time.time()
+            index = LogIndex.load(args.logfile)
+            out_dir = Path(args.logfile).with_suffix(Path(args.logfile).suffix + ".parsed")
+            out_dir.mkdir(exist_ok=True)
+            try:
+                target = index.write_stores(start_addr, usage_num, out_dir)
+            except KeyError as e:
+                print(f"[index] {e.args[0]}")
+                sys.exit(1)
+            if target is None:
+                print(f"[index] 0x{start_addr:x} usage {usage_num} has no stores")
+            else:
+                print(f"[index] Wrote {target} in {time.time() - query_start:.2f}s")
+        sys.exit(0)
     
     if args.parsed_dir:
         # Use existing parsed directory
@@ -841,6 +3969,21 @@ if __name__ == "__main__":
         if not out_dir.is_dir():
             print(f"[parse_log] Parsed directory not found: {out_dir}")
             sys.exit(1)
+        if args.extract:
+            names = None if args.extract == ["all"] else args.extract
+            try:
+                written = extract_stores(out_dir, names)
+            except (FileNotFoundError, KeyError) as e:
+                print(f"[pack] {e}")
+                sys.exit(1)
+            print(f"[pack] Extracted {len(written)} buffers into {out_dir}")
+            sys.exit(0)
+    elif args.segments:
+        if segment_count(args.segments) is None and not args.follow and not segment_path(args.segments, 0).is_file():
+            print(f"[segments] No segments found for {args.segments}")
+            sys.exit(1)
+        out_dir = parse_segments(args.segments, follow=args.follow, delete=args.delete_segments,
+                                 workers=1 if args.sequential else args.workers, pack=args.pack)
     else:
         # Parse log file
         if not args.logfile:
@@ -851,66 +3994,110 @@ if __name__ == "__main__":
             print(f"[parse_log] File not found: {log_path}, skipping compression")
             sys.exit(0)
 
-        out_dir = parse_log(args.logfile)
-        # Compress each parsed file in parallel
-        if args.compress:
-            # Collect all files to process
-            files_to_compress = [f for f in out_dir.iterdir() if f.is_file()]
+        out_dir = parse_log(args.logfile, pack=args.pack)
+
+    # Compress each parsed file in parallel. An existing parsed directory is
+    # only compressed when joining a shared run (--claims) or for a sweep.
+    if args.compress and (not args.parsed_dir or args.claims or sweep_configs):
+        # Collect all files to process
+        files_to_compress = list_buffers(out_dir)
+        
+        if files_to_compress:
+            # Check if sequential processing is requested. A --claims run takes
+            # the robust path with one worker, which goes through the ClaimBoard
+            if args.sequential and not sweep_configs and not args.claims:
+                print(f"[compress] Sequential processing of {len(files_to_compress)} files")
+                status_log = Path("/tmp/memlog_parser_status.log")
+                with open(status_log, "a") as log:
+                    log.write(f"[compress] Sequential processing of {len(files_to_compress)} files\n")
+                compress_start = time.time()
+                results = []
+                if not args.no_prescreen:
+                    results, files_to_compress = prescreen_files(files_to_compress)
+                if model is not None:
+                    predicted, files_to_compress = plan_compression(files_to_compress, model, args.predict_below)
+                    results.extend(predicted)
+                if DISK_BUDGET.retention == "drop-analyzed":
+                    for file, *_ in results:
+                        retire_buffer(file)
+                for idx, file in enumerate(files_to_compress):
+                    if (idx + 1) % 10 == 0:
+                        print(f"[compress] Progress: {idx + 1}/{len(files_to_compress)}")
+                    try:
+                        result = compress_file(file)
+                        record_compress_job(result)
+                        if DISK_BUDGET.retention == "drop-analyzed":
+                            retire_buffer(file)
+                        # result is now (file, success, error_msg, is_unrecoverable)
+                        results.append(result[:3])  # Only keep first 3 elements for compatibility
+                    except Exception as e:
+                        results.append((file, False, str(e)))
+                METRICS.add_phase("compress", time.time() - compress_start)
+            else:
+                # Use robust compression with automatic retry and memory management
+                num_workers = 1 if args.sequential else args.workers if args.workers else None
+                results = robust_parallel_compress(files_to_compress, num_workers=num_workers,
+                                                   prescreen=not args.no_prescreen,
+                                                   model=model, predict_below=args.predict_below,
+                                                   timeout=args.job_timeout,
+                                                   shard_above=args.shard_above,
+                                                   claims=args.claims, lease=args.lease,
+                                                   configs=sweep_configs)
             
-            if files_to_compress:
-                # Check if sequential processing is requested
-                if args.sequential:
-                    print(f"[compress] Sequential processing of {len(files_to_compress)} files")
-                    status_log = Path("/tmp/memlog_parser_status.log")
-                    with open(status_log, "a") as log:
-                        log.write(f"[compress] Sequential processing of {len(files_to_compress)} files\n")
-                    results = []
-                    for idx, file in enumerate(files_to_compress):
-                        if (idx + 1) % 10 == 0:
-                            print(f"[compress] Progress: {idx + 1}/{len(files_to_compress)}")
-                        try:
-                            result = compress_file(file)
-                            # result is now (file, success, error_msg, is_unrecoverable)
-                            results.append(result[:3])  # Only keep first 3 elements for compatibility
-                        except Exception as e:
-                            results.append((file, False, str(e)))
-                else:
-                    # Use robust compression with automatic retry and memory management
-                    num_workers = args.workers if args.workers else None
-                    results = robust_parallel_compress(files_to_compress, num_workers=num_workers)
+            # Report results
+            critical_failures = []
+            for file, success, error_msg in results:
+                if not success:
+                    is_object = False
+                    if file.name.endswith('.stores'):
+                        parts = file.name.replace('.stores', '').split('_')
+                        if len(parts) >= 4 and parts[2] == 'object':
+                            is_object = True
+                    if is_object:
+                        print(f"[compress_skip] {file}: {error_msg}", file=sys.stderr)
+                    elif error_msg and error_msg != "Not a compressible file type":
+                        print(f"[compress_error] {file}: {error_msg}", file=sys.stderr)
+                        if "Permanent failure" in error_msg or "Failed after" in error_msg:
+                            critical_failures.append(file)
+            
+            # Report critical failures summary
+            if critical_failures:
+                print(f"\n[CRITICAL] {len(critical_failures)} files failed compression after all retries:", file=sys.stderr)
                 
-                # Report results
-                critical_failures = []
-                for file, success, error_msg in results:
-                    if not success:
-                        is_object = False
-                        if file.name.endswith('.stores'):
-                            parts = file.name.replace('.stores', '').split('_')
-                            if len(parts) >= 4 and parts[2] == 'object':
-                                is_object = True
-                        if is_object:
-                            print(f"[compress_skip] {file}: {error_msg}", file=sys.stderr)
-                        elif error_msg and error_msg != "Not a compressible file type":
-                            print(f"[compress_error] {file}: {error_msg}", file=sys.stderr)
-                            if "Permanent failure" in error_msg or "Failed after" in error_msg:
-                                critical_failures.append(file)
+                # Also write to external log file
+                status_log = Path("/tmp/memlog_parser_status.log")
+                with open(status_log, "a") as log:
+                    log.write(f"\n[CRITICAL] {len(critical_failures)} files failed after all retries:\n")
+                    for f in critical_failures:
+                        log.write(f"  - {f}\n")
                 
-                # Report critical failures summary
-                if critical_failures:
-                    print(f"\n[CRITICAL] {len(critical_failures)} files failed compression after all retries:", file=sys.stderr)
-                    
-                    # Also write to external log file
-                    status_log = Path("/tmp/memlog_parser_status.log")
-                    with open(status_log, "a") as log:
-                        log.write(f"\n[CRITICAL] {len(critical_failures)} files failed after all retries:\n")
-                        for f in critical_failures:
-                            log.write(f"  - {f}\n")
-                    
-                    for f in critical_failures[:10]:  # Show first 10
-                        print(f"  - {f}", file=sys.stderr)
-                    if len(critical_failures) > 10:
-                        print(f"  ... and {len(critical_failures) - 10} more", file=sys.stderr)
-                    print("\nThese files MUST be processed manually or the analysis will be incomplete!", file=sys.stderr)
+                for f in critical_failures[:10]:  # Show first 10
+                    print(f"  - {f}", file=sys.stderr)
+                if len(critical_failures) > 10:
+                    print(f"  ... and {len(critical_failures) - 10} more", file=sys.stderr)
+                print("\nThese files MUST be processed manually or the analysis will be incomplete!", file=sys.stderr)
     # Process compression after all subprocesses complete
+    if args.claims:
+        # Every worker ends with all buffers done; one of them writes the analysis
+        board = ClaimBoard(out_dir, args.lease)
+        if not board.try_claim(CLAIMS_ANALYSIS):
+            if board.outcome(CLAIMS_ANALYSIS) is not None:
+                print("[claims] Analysis already written by another worker")
+            else:
+                print("[claims] Analysis is being written by another worker")
+            sys.exit(0)
+        # Keep the claim alive while the analysis runs, it may outlast the lease
+        import threading
+        stop = threading.Event()
+
+        def _heartbeat():
+            while not stop.wait(board.lease / 3):
+                board.heartbeat()
+
+        threading.Thread(target=_heartbeat, daemon=True).start()
+        process_compression(out_dir)
+        stop.set()
+        board.finish(out_dir / CLAIMS_ANALYSIS, "ok")
+        sys.exit(0)
     process_compression(out_dir)
     sys.exit(0)
@@ -17,8 +17,9 @@ while true; do
     echo "2. Compress SPEC fprate"
     echo "3. Compress SPEC app"
     echo "4. Compress generic app (absolute path must start with /usr)"
-    echo "5. Run bash"
-    echo "6. Exit"
+    echo "5. Compress several apps in parallel (executables or spec:<benchmark>)"
+    echo "6. Run bash"
+    echo "7. Exit"
 
     read -p "Enter your choice: " choice
 
@@ -54,10 +55,26 @@ while true; do
             /bin/bash
             ;;
         5)
+            # One target per line, so a program keeps its arguments; the list
+            # goes to --batch as an @file
+            echo "Enter one target per line (executable with arguments or spec:<benchmark>), empty line to finish:"
+            targets_file=$(mktemp /tmp/memlog-batch.XXXXXX)
+            while IFS= read -r -p "> " target && [ -n "$target" ]; do
+                printf '%s\n' "$target" >> "$targets_file"
+            done
+            if [ -s "$targets_file" ]; then
+                python3 /usr/memlog_parser.py --batch "@$targets_file"
+            else
+                echo "No targets provided."
+            fi
+            rm -f "$targets_file"
+            /bin/bash
+            ;;
+        6)
             bash
             exit 0
             ;;
-        6)
+        7)
             echo "Exiting..."
             exit 0
             ;;
@@ -6278,6 +6278,8 @@ static Bool mc_process_cmd_line_options(const HChar* arg)
    else if VG_STR_CLO (arg, "--xtree-leak-file",
                        MC_(clo_xtree_leak_file)) {}
 
+   else if (memlog_process_cmd_line_option(arg)) {}
+
    else
       return VG_(replacement_malloc_process_cmd_line_option)(arg);
 
@@ -6331,6 +6333,7 @@ static void mc_print_usage(void)
 "    --show-mismatched-frees=no|yes   show frees that don't match the allocator? [yes]\n"
 "    --show-realloc-size-zero=no|yes  show reallocs with a size of zero? [yes]\n"
    );
+   memlog_print_usage();
 }
 
 static void mc_print_debug_usage(void)
@@ -8331,6 +8334,7 @@ static void mc_post_clo_init ( void )
       VG_(XTMemory_Full_init)(VG_(XT_filter_1top_and_maybe_below_main));
    }
 
+   memlog_post_clo_init();
 }
 
 static void print_SM_info(const HChar* type, Int n_SMs)
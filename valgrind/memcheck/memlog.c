@@ -2,166 +2,872 @@
 #include "pub_tool_aspacemgr.h"
 #include "pub_tool_poolalloc.h"
 #include "pub_tool_hashtable.h"
+#include "pub_tool_libcassert.h"
 #include "pub_tool_libcbase.h"
+#include "pub_tool_libcfile.h"
 #include "pub_tool_libcprint.h"
 #include "pub_tool_mallocfree.h"
+#include "pub_tool_options.h"
 #include "pub_tool_tooliface.h"
 #include "pub_tool_threadstate.h"
 #include "pub_tool_machine.h"  // For VG_(fnptr_to_fnentry)
 #include "mc_include.h"
 #include "memcheck.h"
 #include "memlog.h"
-#include "rbtree.h"
 
 #define INLINE    inline __attribute__((always_inline))
-#define MAX_LOG_ENTRIES 3000000
+#define DEFAULT_BUFFER_STORES (1 << 22)
+#define MAX_BLOCK_EVENTS      (1 << 16)
 #define PAGE_SIZE 4096
+#define PAGE_SHIFT 12
 #define MIN_BLOCK_SIZE 1*PAGE_SIZE // TODO: this should be a tool's parameter
 
+/* Two-level page table mapping every page of the (48-bit) address space to
+   the tracked blocks overlapping it. Tracked blocks are at least one page
+   long, so a page is shared by at most two of them: the tail of one block
+   and the head of the next. */
+#define PT_ADDR_BITS 48
+#define PT_L2_BITS   16
+#define PT_L1_BITS   (PT_ADDR_BITS - PAGE_SHIFT - PT_L2_BITS)
+#define PT_L1_SIZE   (1UL << PT_L1_BITS)
+#define PT_L2_SIZE   (1UL << PT_L2_BITS)
+#define PT_SLOTS     2
+
+/* Compact stream format (--memlog-format=compact). After an 8-byte magic the
+   stream is a sequence of records made of exactly three LEB128 varints: a
+   tag followed by two operands. Tags below COMPACT_TAG_SYNC are stores whose
+   address is a zigzag delta from the previous store and whose value is
+   (value ^ previous value) >> tag, the tag being the number of trailing zero
+   bits of the XOR. Every COMPACT_SYNC_INTERVAL stores a sync record carries
+   the absolute address and value instead. ALLOC/FREE records carry start and
+   size and are followed by an extra record holding the ExeContext ECU, whose
+   stack trace goes to the Valgrind log as a ===CONTEXT START=== record. LIVE
+   records (start, size, then an extra record) only open log segments. */
+#define COMPACT_MAGIC          "\x89MLC\r\n\x1a\n"
+#define COMPACT_MAGIC_LEN      8
+#define COMPACT_TAG_SYNC       64
+#define COMPACT_TAG_ALLOC      65
+#define COMPACT_TAG_FREE       66
+#define COMPACT_TAG_EXTRA      67
+#define COMPACT_TAG_LIVE       68
+#define COMPACT_SYNC_INTERVAL  4096
+#define COMPACT_MAX_RECORD     (3 * 10)
+
+/* Output buffer of the log files the tool writes itself (the compact stream
+   and log segments); OUT_MAX_LINE bounds one formatted text line. */
+#define OUT_BUF_SIZE           (1 << 20)
+#define OUT_MAX_LINE           128
+
+/* Segmented output (--memlog-segment-mb / --memlog-segment-events). The log
+   is rolled into <prefix>.00000, <prefix>.00001, ... each written as
+   <name>.tmp and renamed once closed, so a segment that exists is complete.
+   Every segment opens with one LIVE record per tracked block live at that
+   point of the log, so it can be parsed on its own. <prefix>.end is written
+   when the run is over. */
+#define SEGMENT_NAME_EXTRA     16
+
+/* Per-block statistics for --memlog-format=stats. XORs with the previous
+   value stored to the block are bucketed by leading zeros in steps of 4 (the
+   last bucket counts repeated values), exponents in 16 equal ranges of both
+   the double field and the float field of the low 32 bits, since the element
+   type is only known once all stores were seen. Distinct values are
+   estimated with a HyperLogLog sketch of STATS_HLL_REGS registers. */
+#define STATS_LZ_BUCKETS   17
+#define STATS_EXP_BUCKETS  16
+#define STATS_HLL_BITS     7
+#define STATS_HLL_REGS     (1 << STATS_HLL_BITS)
+
 typedef enum {
-   LOG_STORE,
    LOG_ALLOC,
    LOG_FREE
 } LogEventType;
 
+/* Events are buffered in two parts until the next flush: the stores as two
+   dense arrays of addresses and values (16 bytes per store), and the rare
+   ALLOC/FREE events on the side, each remembering how many stores were
+   buffered before it so the flush restores the original order. */
 typedef struct {
    LogEventType  type;
+   UInt          stores_before;
    Addr          addr;
-   HWord         value;      // For LOG_STORE
-   SizeT         size;       // For LOG_ALLOC, LOG_FREE
-   ExeContext*   where;      // For LOG_ALLOC, LOG_FREE
-} LogEntry;
+   SizeT         size;
+   ExeContext*   where;
+} BlockEvent;
+
+typedef struct {
+   ULong         stores;
+   ULong         zeros;
+   HWord         prev_value;
+   Bool          aligned32;
+   Bool          aligned64;
+   UInt          xor_lz[STATS_LZ_BUCKETS];
+   UInt          exp_double[STATS_EXP_BUCKETS];
+   UInt          exp_float[STATS_EXP_BUCKETS];
+   UChar         hll[STATS_HLL_REGS];
+} BlockStats;
+
+typedef struct _TrackedBlock {
+   Addr          start;
+   Addr          end;
+   MC_Chunk*     mc;
+   ULong         stores_seen;
+   ULong         bytes_logged;
+   ULong         sample_countdown;
+   Bool          exhausted;  // Quota used up, further stores are dropped
+   BlockStats*   stats;      // Only with --memlog-format=stats
+   struct _TrackedBlock* prev;
+   struct _TrackedBlock* next;
+} TrackedBlock;
+
+/* Blocks live at the current position of the written log, keyed by start
+   (only with segments: the tool's own live list runs ahead of the buffer). */
+typedef struct _LoggedBlock {
+   struct _LoggedBlock* next;
+   UWord                start;
+   SizeT                size;
+   UInt                 ecu;
+} LoggedBlock;
+
+/* ExeContexts already written to the log, keyed by ECU. */
+typedef struct _ContextNode {
+   struct _ContextNode* next;
+   UWord                ecu;
+} ContextNode;
+
+typedef struct {
+   TrackedBlock* slot[PT_L2_SIZE][PT_SLOTS];
+   UWord         used;       // Number of non-empty slots in this leaf
+} PageLeaf;
+
+static Addr*      store_addrs  = NULL;
+static HWord*     store_values = NULL;
+static UInt       store_count  = 0;
+static BlockEvent block_events[MAX_BLOCK_EVENTS];
+static UInt       block_event_count = 0;
+static PageLeaf* page_dir[PT_L1_SIZE];
+static PoolAlloc* block_pool = NULL;
+static PoolAlloc* stats_pool = NULL;
+static TrackedBlock* live_blocks = NULL;
+static ULong skipped_blocks = 0;   // Blocks left untracked, see insert_block_pt
+static VgHashTable* seen_contexts = NULL;
+static VgHashTable* logged_blocks = NULL;
+
+/* Hull of the tracked blocks, [tracked_start, tracked_end). The instrumented
+   code loads both bounds and skips the log_store call for stores outside
+   them, so untracked stores never leave the translated code. The empty hull
+   has tracked_start > tracked_end and rejects every address. */
+static Addr tracked_start = ~(Addr)0;
+static Addr tracked_end   = 0;
+
+/* Freeing a block on the edge of the hull leaves the hull loose: it still
+   covers every tracked block, and stores to the freed range just fail the
+   page-table lookup. The blocks now on the real edge no longer match the
+   bounds, so once the hull is loose every free counts. The hull is
+   recomputed from the live list when the frees counted since it became
+   loose reach the number of live blocks (and at least HULL_RECOMPUTE_FREES),
+   so each free costs O(1) amortized. */
+#define HULL_RECOMPUTE_FREES 64
+static UWord live_block_count = 0;
+static Bool  hull_loose       = False;
+static UWord hull_loose_frees = 0;
 
-static LogEntry log_buffer[MAX_LOG_ENTRIES];
-static Int log_count = 0;
-static rb_root_t tracked_blocks = RB_ROOT;
+/* Per-block logging quota. A value of 0 disables the corresponding limit. */
+static Long clo_first_stores = 0;  // Stores logged unconditionally per block
+static Long clo_sample_every = 0;  // Then log one of every k stores (0: stop)
+static Long clo_max_bytes    = 0;  // Cap on logged store bytes per block
+
+static Long clo_buffer_stores = DEFAULT_BUFFER_STORES;  // Stores per flush
+
+typedef enum {
+   FORMAT_TEXT,
+   FORMAT_COMPACT,
+   FORMAT_STATS
+} LogFormat;
+
+static LogFormat    clo_format       = FORMAT_TEXT;
+static const HChar* clo_compact_file = "memlog.%p.mlc";
+
+static Long         clo_segment_mb     = 0;  // Roll the log after this many MB...
+static Long         clo_segment_events = 0;  // ... or this many events (0: no limit)
+static const HChar* clo_segment_file   = "memlog.%p.seg";
+
+static HChar* segment_prefix  = NULL;   // Expanded --memlog-segment-file, NULL: no segments
+static HChar* segment_name    = NULL;
+static UInt   segment_index   = 0;
+static ULong  segment_written = 0;      // Bytes of the open segment already on disk
+static ULong  segment_events  = 0;
+
+static Int   out_fd = -1;
+static UChar out_buf[OUT_BUF_SIZE];
+static Int   out_len = 0;
+static Addr  compact_prev_addr = 0;
+static HWord compact_prev_value = 0;
+static UInt  compact_since_sync = 0;
 
 INLINE void memlog_init(void) 
 {
 }
 
-static INLINE void flush_log_buffer(void)
+Bool memlog_process_cmd_line_option(const HChar* arg)
 {
-   for (Int i = 0; i < log_count; i++) {
-      LogEntry* entry = &log_buffer[i];
-      
-      switch (entry->type) {
-      case LOG_STORE:
-         VG_(printf)("0x%lx 0x%lx\n", entry->addr, entry->value);
-         break;
-      
-      case LOG_ALLOC:
-         VG_(printf)("===ALLOC START===\n");
-         VG_(printf)("Start 0x%lx, size %lu\n", entry->addr, entry->size);
-         
-         if (entry->where) {
-            VG_(pp_ExeContext)(entry->where);
-         } else {
-            VG_(printf)("(No allocation stack trace available)\n");
-         }
-         
-         VG_(printf)("===ALLOC END===\n");
-         break;
-      
-      case LOG_FREE:
-         VG_(printf)("===FREE START===\n");
-         VG_(printf)("Start 0x%lx, size %lu\n", entry->addr, entry->size);
-         
-         if (entry->where) {
-            VG_(pp_ExeContext)(entry->where);
-         } else {
-            VG_(printf)("(No free stack trace available)\n");
-         }
-         
-         VG_(printf)("===FREE END===\n");
+   if      VG_BINT_CLO(arg, "--memlog-first-stores", clo_first_stores, 0, 1LL << 62) {}
+   else if VG_BINT_CLO(arg, "--memlog-sample-every", clo_sample_every, 0, 1LL << 62) {}
+   else if VG_BINT_CLO(arg, "--memlog-max-bytes",    clo_max_bytes,    0, 1LL << 62) {}
+   else if VG_BINT_CLO(arg, "--memlog-buffer-stores", clo_buffer_stores, 1, 1LL << 30) {}
+   else if VG_XACT_CLO(arg, "--memlog-format=text",    clo_format, FORMAT_TEXT) {}
+   else if VG_XACT_CLO(arg, "--memlog-format=compact", clo_format, FORMAT_COMPACT) {}
+   else if VG_XACT_CLO(arg, "--memlog-format=stats",   clo_format, FORMAT_STATS) {}
+   else if VG_STR_CLO (arg, "--memlog-compact-file",   clo_compact_file) {}
+   else if VG_BINT_CLO(arg, "--memlog-segment-mb",     clo_segment_mb,     0, 1LL << 40) {}
+   else if VG_BINT_CLO(arg, "--memlog-segment-events", clo_segment_events, 0, 1LL << 62) {}
+   else if VG_STR_CLO (arg, "--memlog-segment-file",   clo_segment_file) {}
+   else
+      return False;
+
+   return True;
+}
+
+void memlog_print_usage(void)
+{
+   VG_(printf)(
+"    --memlog-first-stores=<number>   stores logged per block before sampling\n"
+"                                     [0=all, or none with --memlog-sample-every]\n"
+"    --memlog-sample-every=<number>   then log one of every <number> stores [0=none]\n"
+"    --memlog-max-bytes=<number>      stop logging a block after this many bytes\n"
+"                                     of stored values (8 per store) [0=unlimited]\n"
+"    --memlog-format=text|compact|stats  text in the Valgrind log, a binary\n"
+"                                     delta/varint stream in a separate file, or\n"
+"                                     only per-block statistics at free/exit [text]\n"
+"    --memlog-compact-file=<file>     compact stream file [memlog.%%p.mlc]\n"
+"    --memlog-buffer-stores=<number>  stores buffered between two writes of the\n"
+"                                     log, 16 bytes each [4194304]\n"
+"    --memlog-segment-mb=<number>     roll text or compact output into numbered\n"
+"                                     segment files of about this many MB [0=off]\n"
+"    --memlog-segment-events=<number> ... or of this many events [0=off]\n"
+"    --memlog-segment-file=<prefix>   segment files <prefix>.00000, ... [memlog.%%p.seg]\n"
+   );
+}
+
+static void open_segment(void);
+
+void memlog_post_clo_init(void)
+{
+   if (clo_format != FORMAT_STATS) {
+      store_addrs  = VG_(malloc)("memlog.store_addrs",  clo_buffer_stores * sizeof(Addr));
+      store_values = VG_(malloc)("memlog.store_values", clo_buffer_stores * sizeof(HWord));
+   }
+
+   if (clo_segment_mb || clo_segment_events) {
+      if (clo_format == FORMAT_STATS) {
+         VG_(fmsg_bad_option)("--memlog-segment-mb/--memlog-segment-events",
+                              "segments need --memlog-format=text or compact\n");
+         VG_(exit)(1);   // Not fatal by itself once options are parsed
+      }
+      segment_prefix = VG_(expand_file_name)("--memlog-segment-file", clo_segment_file);
+      segment_name   = VG_(malloc)("memlog.segment_name",
+                                   VG_(strlen)(segment_prefix) + SEGMENT_NAME_EXTRA);
+      logged_blocks  = VG_(HT_construct)("memlog.logged_blocks");
+      open_segment();
+   } else if (clo_format == FORMAT_COMPACT) {
+      HChar* name = VG_(expand_file_name)("--memlog-compact-file", clo_compact_file);
+      SysRes sres = VG_(open)(name, VKI_O_CREAT|VKI_O_WRONLY|VKI_O_TRUNC,
+                              VKI_S_IRUSR|VKI_S_IWUSR|VKI_S_IRGRP|VKI_S_IROTH);
+      if (sr_isError(sres)) {
+         VG_(fmsg_bad_option)("--memlog-compact-file",
+                              "cannot create compact log file %s\n", name);
+      }
+      out_fd = sr_Res(sres);
+      VG_(free)(name);
+
+      VG_(memcpy)(out_buf, COMPACT_MAGIC, COMPACT_MAGIC_LEN);
+      out_len = COMPACT_MAGIC_LEN;
+   }
+}
+
+static void out_write_out(void)
+{
+   Int off = 0;
+   while (off < out_len) {
+      Int n = VG_(write)(out_fd, out_buf + off, out_len - off);
+      if (n <= 0) {
+         VG_(umsg)("memlog: error writing log, output truncated\n");
          break;
       }
+      off += n;
    }
-   log_count = 0;
+   segment_written += out_len;
+   out_len = 0;
 }
 
-static INLINE void add_to_buffer(LogEventType type, Addr addr, HWord value, SizeT size, ExeContext* where)
+static INLINE UInt stats_clz(ULong x)
 {
-   log_buffer[log_count].type = type;
-   log_buffer[log_count].addr = addr;
-   if (type == LOG_STORE) {
-      log_buffer[log_count].value = value;
+   return x ? __builtin_clzll(x) : 64;
+}
+
+static INLINE void stats_update(BlockStats* st, Addr addr, HWord value)
+{
+   if (st->stores > 0) {
+      st->xor_lz[stats_clz(value ^ st->prev_value) >> 2]++;
+   }
+   st->prev_value = value;
+   st->stores++;
+
+   if (value == 0) {
+      st->zeros++;
+   }
+   if (addr & 7) {
+      st->aligned64 = False;
+      if (addr & 3) st->aligned32 = False;
+   }
+   st->exp_double[((value >> 52) & 0x7FF) >> 7]++;
+   st->exp_float[((value >> 23) & 0xFF) >> 4]++;
+
+   /* splitmix64 finalizer as the sketch hash */
+   ULong h = value + 0x9E3779B97F4A7C15ULL;
+   h = (h ^ (h >> 30)) * 0xBF58476D1CE4E5B9ULL;
+   h = (h ^ (h >> 27)) * 0x94D049BB133111EBULL;
+   h ^= h >> 31;
+   UInt  reg  = h >> (64 - STATS_HLL_BITS);
+   UChar rank = stats_clz((h << STATS_HLL_BITS) | (1ULL << (STATS_HLL_BITS - 1))) + 1;
+   if (rank > st->hll[reg]) {
+      st->hll[reg] = rank;
+   }
+}
+
+static void print_block_stats(const TrackedBlock* tb)
+{
+   const BlockStats* st = tb->stats;
+
+   VG_(printf)("===STATS START===\n");
+   VG_(printf)("Start 0x%lx, size %lu\n", tb->start, tb->end - tb->start);
+   VG_(printf)("stores %llu zeros %llu aligned32 %d aligned64 %d\n",
+               st->stores, st->zeros, (Int)st->aligned32, (Int)st->aligned64);
+   VG_(printf)("xor_lz");
+   for (Int i = 0; i < STATS_LZ_BUCKETS; i++)
+      VG_(printf)(" %u", st->xor_lz[i]);
+   VG_(printf)("\nexp_double");
+   for (Int i = 0; i < STATS_EXP_BUCKETS; i++)
+      VG_(printf)(" %u", st->exp_double[i]);
+   VG_(printf)("\nexp_float");
+   for (Int i = 0; i < STATS_EXP_BUCKETS; i++)
+      VG_(printf)(" %u", st->exp_float[i]);
+   VG_(printf)("\nhll ");
+   for (Int i = 0; i < STATS_HLL_REGS; i++)
+      VG_(printf)("%02x", (UInt)st->hll[i]);
+   VG_(printf)("\n===STATS END===\n");
+}
+
+static INLINE void compact_put_varint(ULong v)
+{
+   while (v >= 0x80) {
+      out_buf[out_len++] = (UChar)(v | 0x80);
+      v >>= 7;
+   }
+   out_buf[out_len++] = (UChar)v;
+}
+
+static INLINE void compact_put_record(ULong tag, ULong a, ULong b)
+{
+   if (out_len + COMPACT_MAX_RECORD > OUT_BUF_SIZE) {
+      out_write_out();
+   }
+   compact_put_varint(tag);
+   compact_put_varint(a);
+   compact_put_varint(b);
+}
+
+static INLINE void compact_put_store(Addr addr, HWord value)
+{
+   if (compact_since_sync == 0) {
+      compact_put_record(COMPACT_TAG_SYNC, addr, value);
+   } else {
+      Long  delta = (Long)(addr - compact_prev_addr);
+      ULong zz    = ((ULong)delta << 1) ^ (ULong)(delta >> 63);
+      ULong x     = value ^ compact_prev_value;
+      UInt  tz    = x ? __builtin_ctzll(x) : 0;
+      compact_put_record(tz, zz, x >> tz);
+   }
+
+   compact_prev_addr  = addr;
+   compact_prev_value = value;
+   if (++compact_since_sync == COMPACT_SYNC_INTERVAL) {
+      compact_since_sync = 0;
+   }
+}
+
+/* Writes the stack trace of `where` to the Valgrind log the first time its
+   ECU shows up, as a ===CONTEXT START=== record, and returns the ECU that
+   ALLOC/FREE records carry instead of the trace (0: no trace). */
+static UInt emit_context(ExeContext* where)
+{
+   if (!where) return 0;
+
+   UInt ecu = VG_(get_ECU_from_ExeContext)(where);
+   if (!seen_contexts) {
+      seen_contexts = VG_(HT_construct)("memlog.contexts");
+   }
+   if (!VG_(HT_lookup)(seen_contexts, ecu)) {
+      ContextNode* node = VG_(malloc)("memlog.context", sizeof(ContextNode));
+      node->ecu = ecu;
+      VG_(HT_add_node)(seen_contexts, node);
+
+      VG_(printf)("===CONTEXT START===\n");
+      VG_(printf)("ECU %u\n", ecu);
+      VG_(pp_ExeContext)(where);
+      VG_(printf)("===CONTEXT END===\n");
+   }
+   return ecu;
+}
+
+/* Formats a text line into the open log segment, or to the Valgrind log when
+   there is none. */
+static void out_printf(const HChar* format, ...)
+{
+   va_list vargs;
+   va_start(vargs, format);
+   if (out_fd >= 0) {
+      if (out_len + OUT_MAX_LINE > OUT_BUF_SIZE) {
+         out_write_out();
+      }
+      out_len += VG_(vsnprintf)((HChar*)out_buf + out_len, OUT_MAX_LINE, format, vargs);
    } else {
-      log_buffer[log_count].size = size;
-      log_buffer[log_count].where = where;
+      VG_(vprintf)(format, vargs);
    }
-   
-   log_count++;
-   if (log_count >= MAX_LOG_ENTRIES) {
+   va_end(vargs);
+}
+
+static void put_block_event(ULong tag, const HChar* kind, Addr addr, SizeT size, UInt ecu)
+{
+   if (clo_format == FORMAT_COMPACT) {
+      compact_put_record(tag, addr, size);
+      compact_put_record(COMPACT_TAG_EXTRA, ecu, 0);
+   } else {
+      out_printf("===%s START===\n", kind);
+      out_printf("Start 0x%lx, size %lu, ecu %u\n", addr, size, ecu);
+      out_printf("===%s END===\n", kind);
+   }
+}
+
+// ---------------- Log segments ----------------
+
+static void open_segment(void)
+{
+   VG_(sprintf)(segment_name, "%s.%05u.tmp", segment_prefix, segment_index);
+   SysRes sres = VG_(open)(segment_name, VKI_O_CREAT|VKI_O_WRONLY|VKI_O_TRUNC,
+                           VKI_S_IRUSR|VKI_S_IWUSR|VKI_S_IRGRP|VKI_S_IROTH);
+   if (sr_isError(sres)) {
+      VG_(fmsg_bad_option)("--memlog-segment-file",
+                           "cannot create log segment %s\n", segment_name);
+      VG_(exit)(1);
+   }
+   out_fd = sr_Res(sres);
+   out_len = 0;
+   segment_written = 0;
+   segment_events = 0;
+
+   if (clo_format == FORMAT_COMPACT) {
+      VG_(memcpy)(out_buf, COMPACT_MAGIC, COMPACT_MAGIC_LEN);
+      out_len = COMPACT_MAGIC_LEN;
+      compact_since_sync = 0;
+   }
+
+   VG_(HT_ResetIter)(logged_blocks);
+   LoggedBlock* lb;
+   while ((lb = VG_(HT_Next)(logged_blocks))) {
+      put_block_event(COMPACT_TAG_LIVE, "LIVE", lb->start, lb->size, lb->ecu);
+   }
+}
+
+static void close_segment(void)
+{
+   out_write_out();
+   VG_(close)(out_fd);
+   out_fd = -1;
+
+   HChar* tmp  = segment_name;
+   HChar* name = VG_(malloc)("memlog.segment_name", VG_(strlen)(tmp) + 1);
+   VG_(sprintf)(name, "%s.%05u", segment_prefix, segment_index);
+   if (VG_(rename)(tmp, name) != 0) {
+      VG_(umsg)("memlog: cannot rename log segment %s\n", tmp);
+   }
+   VG_(free)(name);
+   segment_index++;
+}
+
+/* Writes <prefix>.end holding the number of segments, once the last one is
+   closed. */
+static void finish_segments(void)
+{
+   close_segment();
+
+   VG_(sprintf)(segment_name, "%s.end", segment_prefix);
+   SysRes sres = VG_(open)(segment_name, VKI_O_CREAT|VKI_O_WRONLY|VKI_O_TRUNC,
+                           VKI_S_IRUSR|VKI_S_IWUSR|VKI_S_IRGRP|VKI_S_IROTH);
+   if (!sr_isError(sres)) {
+      HChar count[16];
+      Int len = VG_(sprintf)(count, "%u\n", segment_index);
+      VG_(write)(sr_Res(sres), count, len);
+      VG_(close)(sr_Res(sres));
+   } else {
+      VG_(umsg)("memlog: cannot create %s\n", segment_name);
+   }
+}
+
+static void track_logged_block(const BlockEvent* ev, UInt ecu)
+{
+   LoggedBlock* lb = VG_(HT_remove)(logged_blocks, ev->addr);
+   if (ev->type == LOG_ALLOC) {
+      if (!lb) lb = VG_(malloc)("memlog.logged_block", sizeof(LoggedBlock));
+      lb->start = ev->addr;
+      lb->size  = ev->size;
+      lb->ecu   = ecu;
+      VG_(HT_add_node)(logged_blocks, lb);
+   } else if (lb) {
+      VG_(free)(lb);
+   }
+}
+
+/* Counts one written store or block event and rolls over to the next
+   segment once the open one is full. */
+static INLINE void segment_account(void)
+{
+   if ((clo_segment_events && ++segment_events >= (ULong)clo_segment_events) ||
+       (clo_segment_mb && segment_written + out_len >= ((ULong)clo_segment_mb << 20))) {
+      close_segment();
+      open_segment();
+   }
+}
+
+static void flush_log_buffer(void)
+{
+   Bool compact = clo_format == FORMAT_COMPACT;
+   Bool segments = segment_prefix != NULL;
+   UInt s = 0;
+
+   for (UInt e = 0; e <= block_event_count; e++) {
+      UInt until = e < block_event_count ? block_events[e].stores_before : store_count;
+      if (segments) {
+         for (; s < until; s++) {
+            if (compact)
+               compact_put_store(store_addrs[s], store_values[s]);
+            else
+               out_printf("0x%lx 0x%lx\n", store_addrs[s], store_values[s]);
+            segment_account();
+         }
+      } else if (compact) {
+         for (; s < until; s++)
+            compact_put_store(store_addrs[s], store_values[s]);
+      } else {
+         for (; s < until; s++)
+            VG_(printf)("0x%lx 0x%lx\n", store_addrs[s], store_values[s]);
+      }
+      if (e == block_event_count)
+         break;
+
+      const BlockEvent* ev = &block_events[e];
+      UInt ecu = emit_context(ev->where);
+      if (ev->type == LOG_ALLOC)
+         put_block_event(COMPACT_TAG_ALLOC, "ALLOC", ev->addr, ev->size, ecu);
+      else
+         put_block_event(COMPACT_TAG_FREE, "FREE", ev->addr, ev->size, ecu);
+      if (segments) {
+         track_logged_block(ev, ecu);
+         segment_account();
+      }
+   }
+   if (out_fd >= 0) {
+      out_write_out();
+   }
+   store_count = 0;
+   block_event_count = 0;
+}
+
+static void add_block_event(LogEventType type, Addr addr, SizeT size, ExeContext* where)
+{
+   block_events[block_event_count] = (BlockEvent){
+      .type = type, .stores_before = store_count,
+      .addr = addr, .size = size, .where = where
+   };
+   if (++block_event_count == MAX_BLOCK_EVENTS) {
       flush_log_buffer();
    }
 }
 
 static INLINE void print(Addr addr, HWord value)
 {
-   add_to_buffer(LOG_STORE, addr, value, 0, NULL);
+   store_addrs[store_count]  = addr;
+   store_values[store_count] = value;
+   if (++store_count == (UInt)clo_buffer_stores) {
+      flush_log_buffer();
+   }
 }
 
-static INLINE void insert_block_rb(MC_Chunk* mc) {
-   rb_node_t **link  = &tracked_blocks.root;
-   rb_node_t  *parent = NULL;
+static INLINE TrackedBlock** page_slots(Addr page) {
+   PageLeaf* leaf = page_dir[page >> PT_L2_BITS];
+   return leaf ? leaf->slot[page & (PT_L2_SIZE - 1)] : NULL;
+}
+
+static void insert_block_pt(MC_Chunk* mc) {
+   if (!block_pool) {
+      block_pool = VG_(newPA)(sizeof(TrackedBlock), 1000, VG_(malloc),
+                              "memlog.blocks", VG_(free));
+   }
+
+   Addr end = mc->data + mc->szB;
+   if ((end - 1) >> PT_ADDR_BITS) return; // Outside the mapped address space
 
-   while (*link) {
-      parent = *link;
-      if (mc->data < parent->key)
-         link = &parent->left;
-      else if (mc->data > parent->key)
-         link = &parent->right;
-      else {
-         /* same start address already present – nothing to do   */
+   /* A page holds at most PT_SLOTS blocks. A block that would need a third
+      slot (overlapping mempool chunks) or that repeats a tracked start is
+      left untracked, as the rb-tree ignored duplicate starts. */
+   for (Addr page = mc->data >> PAGE_SHIFT; page <= (end - 1) >> PAGE_SHIFT; page++) {
+      TrackedBlock** slots = page_slots(page);
+      if (!slots) continue;
+      Bool clash = slots[PT_SLOTS - 1] != NULL;
+      for (Int s = 0; s < PT_SLOTS && slots[s]; s++) {
+         if (slots[s]->start == mc->data) clash = True;
+      }
+      if (clash) {
+         if (skipped_blocks++ == 0) {
+            VG_(umsg)("memlog: block 0x%lx (%lu bytes) overlaps tracked blocks, "
+                      "its stores are not logged\n", mc->data, (SizeT)mc->szB);
+         }
          return;
       }
    }
 
-   rb_node_t *n = VG_(malloc)("blocks.rbnode", sizeof(*n));
-   *n = (rb_node_t){
-      .parent = NULL, .left = NULL, .right = NULL,
-      .color  = RED,
-      .key    = mc->data,
-      .data   = mc
+   TrackedBlock* tb = VG_(allocEltPA)(block_pool);
+   *tb = (TrackedBlock){
+      .start = mc->data, .end = end, .mc = mc,
+      .sample_countdown = clo_sample_every,
+      .next = live_blocks
    };
+   if (live_blocks) live_blocks->prev = tb;
+   live_blocks = tb;
+   live_block_count++;
 
-   rb_link_node(n, parent, link);
-   rb_insert_color(n, &tracked_blocks);
+   if (tb->start < tracked_start) tracked_start = tb->start;
+   if (tb->end   > tracked_end)   tracked_end   = tb->end;
+
+   if (clo_format == FORMAT_STATS) {
+      if (!stats_pool) {
+         stats_pool = VG_(newPA)(sizeof(BlockStats), 1000, VG_(malloc),
+                                 "memlog.stats", VG_(free));
+      }
+      tb->stats = VG_(allocEltPA)(stats_pool);
+      VG_(memset)(tb->stats, 0, sizeof(BlockStats));
+      tb->stats->aligned32 = tb->stats->aligned64 = True;
+   }
+
+   for (Addr page = tb->start >> PAGE_SHIFT; page <= (end - 1) >> PAGE_SHIFT; page++) {
+      PageLeaf** leafp = &page_dir[page >> PT_L2_BITS];
+      if (!*leafp) {
+         *leafp = VG_(calloc)("memlog.pageleaf", 1, sizeof(PageLeaf));
+      }
+
+      TrackedBlock** slots = (*leafp)->slot[page & (PT_L2_SIZE - 1)];
+      slots[slots[0] ? 1 : 0] = tb;
+      (*leafp)->used++;
+   }
 }
 
-static INLINE Bool is_tracked(Addr addr) {
-   rb_node_t *n = rb_search_leq(&tracked_blocks, (unsigned long)addr);
-   if (!n) return False;
+/* Unmaps the block from the page table and returns its record, which stays
+   on the live list until release_block. */
+static TrackedBlock* remove_block_pt(MC_Chunk* mc) {
+   Addr end = mc->data + mc->szB;
+   if ((end - 1) >> PT_ADDR_BITS) return NULL;
+
+   TrackedBlock* tb = NULL;
+   for (Addr page = mc->data >> PAGE_SHIFT; page <= (end - 1) >> PAGE_SHIFT; page++) {
+      PageLeaf** leafp = &page_dir[page >> PT_L2_BITS];
+      if (!*leafp) continue;
 
-   MC_Chunk *cand = (MC_Chunk*)n->data;
-   return addr <= (cand->data + cand->szB);
+      TrackedBlock** slots = (*leafp)->slot[page & (PT_L2_SIZE - 1)];
+      for (Int s = 0; s < PT_SLOTS; s++) {
+         if (slots[s] && slots[s]->mc == mc) {
+            tb = slots[s];
+            slots[s] = NULL;
+            (*leafp)->used--;
+         }
+      }
+      // Keep the occupied slot first so lookups check it before the empty one
+      if (!slots[0] && slots[1]) {
+         slots[0] = slots[1];
+         slots[1] = NULL;
+      }
+
+      if ((*leafp)->used == 0) {
+         VG_(free)(*leafp);
+         *leafp = NULL;
+      }
+   }
+
+   return tb;
+}
+
+static void release_block(TrackedBlock* tb) {
+   if (tb->prev) tb->prev->next = tb->next;
+   else          live_blocks    = tb->next;
+   if (tb->next) tb->next->prev = tb->prev;
+   live_block_count--;
+
+   // Only a block on the edge of the hull can loosen it
+   if (tb->start == tracked_start || tb->end == tracked_end)
+      hull_loose = True;
+   if (!live_blocks) {
+      tracked_start = ~(Addr)0;
+      tracked_end   = 0;
+      hull_loose = False;
+      hull_loose_frees = 0;
+   } else if (hull_loose
+              && ++hull_loose_frees >= live_block_count
+              && hull_loose_frees >= HULL_RECOMPUTE_FREES) {
+      tracked_start = ~(Addr)0;
+      tracked_end   = 0;
+      for (TrackedBlock* b = live_blocks; b; b = b->next) {
+         if (b->start < tracked_start) tracked_start = b->start;
+         if (b->end   > tracked_end)   tracked_end   = b->end;
+      }
+      hull_loose = False;
+      hull_loose_frees = 0;
+   }
+
+   if (tb->stats) {
+      VG_(freeEltPA)(stats_pool, tb->stats);
+   }
+   VG_(freeEltPA)(block_pool, tb);
+}
+
+static INLINE TrackedBlock* lookup_block(Addr addr) {
+   if (addr >> PT_ADDR_BITS) return NULL;
+
+   TrackedBlock** slots = page_slots(addr >> PAGE_SHIFT);
+   if (!slots) return NULL;
+
+   for (Int s = 0; s < PT_SLOTS && slots[s]; s++) {
+      if (slots[s]->start <= addr && addr < slots[s]->end)
+         return slots[s];
+   }
+   return NULL;
+}
+
+/* Decides whether the next store to tb fits in its quota: the first
+   clo_first_stores stores, then every clo_sample_every-th one, as long as
+   clo_max_bytes is not exceeded. With clo_sample_every alone, sampling
+   starts at the first store. Once nothing more can be logged the block
+   is marked exhausted so later stores are dropped with a single test. */
+static INLINE Bool within_quota(TrackedBlock* tb) {
+   Bool keep = True;
+
+   if ((clo_first_stores || clo_sample_every) && tb->stores_seen >= (ULong)clo_first_stores) {
+      if (!clo_sample_every) {
+         tb->exhausted = True;
+         return False;
+      }
+      keep = --tb->sample_countdown == 0;
+      if (keep)
+         tb->sample_countdown = clo_sample_every;
+   }
+   tb->stores_seen++;
+
+   if (keep && clo_max_bytes) {
+      if (tb->bytes_logged + sizeof(HWord) > (ULong)clo_max_bytes) {
+         tb->exhausted = True;
+         return False;
+      }
+      tb->bytes_logged += sizeof(HWord);
+   }
+   return keep;
+}
+
+static INLINE void log_block_store(TrackedBlock* tb, Addr addr, HWord value) {
+   if (tb->stats) {
+      stats_update(tb->stats, addr, value);
+   } else if (!tb->exhausted && within_quota(tb)) {
+      print(addr, value);
+   }
 }
 
 static INLINE void log_store(Addr addr, HWord value) {
-    if (is_tracked(addr)) {
-        print(addr, value);
-    }
+   TrackedBlock* tb = lookup_block(addr);
+   if (tb) log_block_store(tb, addr, value);
 }
 
-static void free_rb_tree_recursive(rb_node_t *node) {
-   if (!node)
-       return;
-   
-   free_rb_tree_recursive(node->left);
-   free_rb_tree_recursive(node->right);
+/* Logs words[i] as stored at addr + i * stride, looking the block up again
+   only when a word falls past the end of the previous one. */
+static INLINE void log_store_run(Addr addr, UWord stride, const HWord* words, UInt n) {
+   TrackedBlock* tb = NULL;
+   for (UInt i = 0; i < n; i++, addr += stride) {
+      if (!tb || addr >= tb->end)
+         tb = lookup_block(addr);
+      if (tb) log_block_store(tb, addr, words[i]);
+   }
+}
+
+static void log_store2(Addr addr, UWord stride, HWord w0, HWord w1) {
+   HWord words[2] = { w0, w1 };
+   log_store_run(addr, stride, words, 2);
+}
 
-   VG_(free)(node);
+static void log_store3(Addr addr, UWord stride, HWord w0, HWord w1, HWord w2) {
+   HWord words[3] = { w0, w1, w2 };
+   log_store_run(addr, stride, words, 3);
 }
 
-static void free_rb_tree(rb_root_t *root) {
-   free_rb_tree_recursive(root->root);
-   root->root = NULL;
+static void log_store4(Addr addr, UWord stride, HWord w0, HWord w1, HWord w2, HWord w3) {
+   HWord words[4] = { w0, w1, w2, w3 };
+   log_store_run(addr, stride, words, 4);
 }
 
 INLINE void memlog_fini(void) {
    flush_log_buffer();
-   free_rb_tree(&tracked_blocks);
+   for (TrackedBlock* tb = live_blocks; tb; tb = tb->next) {
+      if (tb->stats) print_block_stats(tb);
+   }
+   if (segment_prefix) {
+      finish_segments();
+      VG_(HT_destruct)(logged_blocks, VG_(free));
+      VG_(free)(segment_name);
+      VG_(free)(segment_prefix);
+      logged_blocks = NULL;
+      segment_name = segment_prefix = NULL;
+      segment_index = 0;
+   } else if (out_fd >= 0) {
+      VG_(close)(out_fd);
+      out_fd = -1;
+   }
+   for (UWord i = 0; i < PT_L1_SIZE; i++) {
+      if (page_dir[i]) {
+         VG_(free)(page_dir[i]);
+         page_dir[i] = NULL;
+      }
+   }
+   if (block_pool) {
+      VG_(deletePA)(block_pool);
+      block_pool = NULL;
+      live_blocks = NULL;
+   }
+   live_block_count = hull_loose_frees = 0;
+   hull_loose = False;
+   tracked_start = ~(Addr)0;
+   tracked_end   = 0;
+   if (skipped_blocks) {
+      VG_(umsg)("memlog: %llu blocks overlapping tracked blocks were not logged\n",
+                skipped_blocks);
+      skipped_blocks = 0;
+   }
+   if (store_addrs) {
+      VG_(free)(store_addrs);
+      VG_(free)(store_values);
+      store_addrs = store_values = NULL;
+   }
+   if (seen_contexts) {
+      VG_(HT_destruct)(seen_contexts, VG_(free));
+      seen_contexts = NULL;
+   }
+   if (stats_pool) {
+      VG_(deletePA)(stats_pool);
+      stats_pool = NULL;
+   }
 }
 
 static INLINE Bool is_app_code(const VexGuestExtents* vge)
@@ -179,103 +885,240 @@ static INLINE Bool is_app_code(const VexGuestExtents* vge)
    return vge_has_app_code;
 }
 
-static INLINE void wire_log_store(IRSB* bb_out,
-   IRTemp  addr_tmp,
-   IRExpr* addr,
-   IRTemp  data_tmp,
-   IRExpr* data_widen)
+/* Emits t = e into a fresh temp of type ty and returns it as an atom. */
+static INLINE IRExpr* assign_new_tmp(IRSB* bb_out, IRType ty, IRExpr* e)
+{
+   IRTemp t = newIRTemp(bb_out->tyenv, ty);
+   addStmtToIRSB(bb_out, IRStmt_WrTmp(t, e));
+   return IRExpr_RdTmp(t);
+}
+
+/* Guard of a logging call for stores at first..last (word start addresses):
+   tracked_start <= last && first < tracked_end, with both bounds loaded at
+   run time since blocks come and go after the translation was made. */
+static INLINE IRExpr* tracked_range_guard(IRSB* bb_out, IRExpr* first, IRExpr* last)
+{
+   IRExpr* lo = assign_new_tmp(bb_out, Ity_I64,
+      IRExpr_Load(Iend_LE, Ity_I64, mkIRExpr_HWord((HWord)&tracked_start)));
+   IRExpr* hi = assign_new_tmp(bb_out, Ity_I64,
+      IRExpr_Load(Iend_LE, Ity_I64, mkIRExpr_HWord((HWord)&tracked_end)));
+   IRExpr* above = assign_new_tmp(bb_out, Ity_I1, IRExpr_Binop(Iop_CmpLE64U, lo, last));
+   IRExpr* below = assign_new_tmp(bb_out, Ity_I1, IRExpr_Binop(Iop_CmpLT64U, first, hi));
+   return assign_new_tmp(bb_out, Ity_I1, IRExpr_Binop(Iop_And1, above, below));
+}
+
+#define MAX_RUN_WORDS 4
+
+/* Stores to consecutive addresses waiting for their logging call. A run is
+   either one wide store split into 64-bit words, or up to MAX_RUN_WORDS
+   scalar stores of the same width, each at the end of the previous one
+   (same base temp, increasing constant offsets). */
+typedef struct {
+   IRExpr* addr;       // Address atom of the first word
+   IRTemp  base;       // Addresses as base temp + offset, for adjacency
+   Long    offset;
+   UInt    stride;     // Bytes between two words
+   UInt    n;
+   Bool    scalar;     // More scalar stores may join the run
+   IRExpr* words[MAX_RUN_WORDS];
+} StoreRun;
+
+static void flush_store_run(IRSB* bb_out, StoreRun* run)
 {
-   addStmtToIRSB(bb_out, IRStmt_WrTmp(addr_tmp, addr));
-   addStmtToIRSB(bb_out, IRStmt_WrTmp(data_tmp, data_widen));
-   IRDirty* dirty = unsafeIRDirty_0_N(
-      0, 
-      "log_store", 
-      (void*)VG_(fnptr_to_fnentry)(log_store),
-      mkIRExprVec_2(IRExpr_RdTmp(addr_tmp), IRExpr_RdTmp(data_tmp)));
+   if (run->n == 0) return;
+
+   IRExpr* last = run->addr;
+   if (run->n > 1) {
+      last = assign_new_tmp(bb_out, Ity_I64, IRExpr_Binop(Iop_Add64, run->addr,
+                            IRExpr_Const(IRConst_U64((run->n - 1) * run->stride))));
+   }
+   IRExpr* stride = mkIRExpr_HWord(run->stride);
+   IRDirty* dirty;
+   switch (run->n) {
+   case 1:
+      dirty = unsafeIRDirty_0_N(0, "log_store", (void*)VG_(fnptr_to_fnentry)(log_store),
+                                mkIRExprVec_2(run->addr, run->words[0]));
+      break;
+   case 2:
+      dirty = unsafeIRDirty_0_N(0, "log_store2", (void*)VG_(fnptr_to_fnentry)(log_store2),
+                                mkIRExprVec_4(run->addr, stride, run->words[0], run->words[1]));
+      break;
+   case 3:
+      dirty = unsafeIRDirty_0_N(0, "log_store3", (void*)VG_(fnptr_to_fnentry)(log_store3),
+                                mkIRExprVec_5(run->addr, stride, run->words[0], run->words[1],
+                                              run->words[2]));
+      break;
+   default:
+      dirty = unsafeIRDirty_0_N(0, "log_store4", (void*)VG_(fnptr_to_fnentry)(log_store4),
+                                mkIRExprVec_6(run->addr, stride, run->words[0], run->words[1],
+                                              run->words[2], run->words[3]));
+      break;
+   }
+   dirty->guard = tracked_range_guard(bb_out, run->addr, last);
    addStmtToIRSB(bb_out, IRStmt_Dirty(dirty));
+   run->n = 0;
+}
+
+/* Splits the data of a store into the 64-bit words to log, highest half
+   first for 128- and 256-bit values. Returns the number of words (0 for
+   types that are not logged). */
+static UInt store_words(IRSB* bb_out, IRExpr* data, IRType ty, IRExpr** words)
+{
+   switch (ty) {
+   case Ity_I1:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_1Uto64, data));
+      return 1;
+   case Ity_I8:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_8Uto64, data));
+      return 1;
+   case Ity_I16:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_16Uto64, data));
+      return 1;
+   case Ity_I32:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_32Uto64, data));
+      return 1;
+   case Ity_I64:
+      words[0] = data;
+      return 1;
+   case Ity_F16:
+      data = assign_new_tmp(bb_out, Ity_F64, IRExpr_Unop(Iop_F16toF64, data));
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpF64asI64, data));
+      return 1;
+   case Ity_F32:
+      data = assign_new_tmp(bb_out, Ity_I32, IRExpr_Unop(Iop_ReinterpF32asI32, data));
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_32Uto64, data));
+      return 1;
+   case Ity_F64:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpF64asI64, data));
+      return 1;
+   case Ity_V128:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V128HIto64, data));
+      words[1] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V128to64, data));
+      return 2;
+   case Ity_I128:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_128HIto64, data));
+      words[1] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_128to64, data));
+      return 2;
+   case Ity_F128: {
+      IRExpr* hi = assign_new_tmp(bb_out, Ity_F64, IRExpr_Unop(Iop_F128HItoF64, data));
+      IRExpr* lo = assign_new_tmp(bb_out, Ity_F64, IRExpr_Unop(Iop_F128LOtoF64, data));
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpF64asI64, hi));
+      words[1] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpF64asI64, lo));
+      return 2;
+   }
+   case Ity_D128: {
+      IRExpr* hi = assign_new_tmp(bb_out, Ity_D64, IRExpr_Unop(Iop_D128HItoD64, data));
+      IRExpr* lo = assign_new_tmp(bb_out, Ity_D64, IRExpr_Unop(Iop_D128LOtoD64, data));
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpD64asI64, hi));
+      words[1] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_ReinterpD64asI64, lo));
+      return 2;
+   }
+   case Ity_V256:
+      words[0] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V256to64_3, data));
+      words[1] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V256to64_2, data));
+      words[2] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V256to64_1, data));
+      words[3] = assign_new_tmp(bb_out, Ity_I64, IRExpr_Unop(Iop_V256to64_0, data));
+      return 4;
+   case Ity_D32:
+   case Ity_D64:
+      // TODO: add support for D32 and D64
+   default:
+      return 0;
+   }
 }
 
 static INLINE IRSB* wire_memlog(IRSB* bb_in)
 {
    IRSB* bb_out = deepCopyIRSBExceptStmts(bb_in);
-   IRTemp addr_tmp, data_tmp, addr_tmp1, data_tmp1, addr_tmp2, data_tmp2, addr_tmp3, data_tmp3;
+   StoreRun run = { .n = 0 };
+
+   /* Address temps as base temp + constant offset, so stores through
+      t2 = Add64(t1, 8) are recognised as adjacent to stores through t1 */
+   Int     n_tmps   = bb_in->tyenv->types_used;
+   IRTemp* tmp_base = VG_(malloc)("memlog.tmp_base", (n_tmps + 1) * sizeof(IRTemp));
+   Long*   tmp_off  = VG_(malloc)("memlog.tmp_off",  (n_tmps + 1) * sizeof(Long));
+   for (Int t = 0; t < n_tmps; t++) {
+      tmp_base[t] = t;
+      tmp_off[t]  = 0;
+   }
 
    for (Int i = 0; i < bb_in->stmts_used; i++) {
       IRStmt* stmt = bb_in->stmts[i];
       if (!stmt)
          continue;
 
-      if (stmt->tag == Ist_Store) {
-         IRExpr* data       = stmt->Ist.Store.data;
-         IRExpr* addr       = stmt->Ist.Store.addr;
-         addr_tmp           = newIRTemp(bb_out->tyenv, Ity_I64);
-         data_tmp           = newIRTemp(bb_out->tyenv, Ity_I64);
-         addr_tmp1          = newIRTemp(bb_out->tyenv, Ity_I64);
-         data_tmp1          = newIRTemp(bb_out->tyenv, Ity_I64);
-         addr_tmp2          = newIRTemp(bb_out->tyenv, Ity_I64);
-         data_tmp2          = newIRTemp(bb_out->tyenv, Ity_I64);
-         addr_tmp3          = newIRTemp(bb_out->tyenv, Ity_I64);
-         data_tmp3          = newIRTemp(bb_out->tyenv, Ity_I64);
-         IRType  ty         = typeOfIRExpr(bb_in->tyenv, data);
-         switch (ty) {
-         case Ity_I1:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_1Uto64, data));
-            break;
-         case Ity_I8:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_8Uto64, data));
-            break;
-         case Ity_I16:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_16Uto64, data));
-            break;
-         case Ity_I32:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_32Uto64, data));
-            break;
-         case Ity_I64:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, data);
-            break;
-         case Ity_F32:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_F32toI64U, data));
-            break;
-         case Ity_F64:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, data);
-            break;
-         case Ity_V128:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_V128HIto64, data));
-            wire_log_store(bb_out, addr_tmp1, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(8))), data_tmp1, IRExpr_Unop(Iop_V128to64, data));
-            break;
-         case Ity_I128:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_128HIto64, data));
-            wire_log_store(bb_out, addr_tmp1, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(8))), data_tmp1, IRExpr_Unop(Iop_128to64, data));
-            break;
-         case Ity_F128:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_F128HItoF64, data));
-            wire_log_store(bb_out, addr_tmp1, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(8))), data_tmp1, IRExpr_Unop(Iop_F128LOtoF64, data));
-            break;
-         case Ity_D128:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_D128HItoD64, data));
-            wire_log_store(bb_out, addr_tmp1, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(8))), data_tmp1, IRExpr_Unop(Iop_D128LOtoD64, data));
-            break;
-         case Ity_F16:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_F16toF64, data));
-            break;
-         case Ity_V256:
-            wire_log_store(bb_out, addr_tmp, addr, data_tmp, IRExpr_Unop(Iop_V256to64_3, data));
-            wire_log_store(bb_out, addr_tmp1, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(8))), data_tmp1, IRExpr_Unop(Iop_V256to64_2, data));
-            wire_log_store(bb_out, addr_tmp2, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(16))), data_tmp2, IRExpr_Unop(Iop_V256to64_1, data));
-            wire_log_store(bb_out, addr_tmp3, IRExpr_Binop(Iop_Add64, addr, IRExpr_Const(IRConst_U64(24))), data_tmp3, IRExpr_Unop(Iop_V256to64_0, data));
+      switch (stmt->tag) {
+      case Ist_WrTmp: {
+         IRExpr* e = stmt->Ist.WrTmp.data;
+         if (e->tag == Iex_Binop
+             && (e->Iex.Binop.op == Iop_Add64 || e->Iex.Binop.op == Iop_Sub64)
+             && e->Iex.Binop.arg1->tag == Iex_RdTmp
+             && e->Iex.Binop.arg2->tag == Iex_Const
+             && e->Iex.Binop.arg2->Iex.Const.con->tag == Ico_U64) {
+            IRTemp src = e->Iex.Binop.arg1->Iex.RdTmp.tmp;
+            Long   c   = (Long)e->Iex.Binop.arg2->Iex.Const.con->Ico.U64;
+            tmp_base[stmt->Ist.WrTmp.tmp] = tmp_base[src];
+            tmp_off[stmt->Ist.WrTmp.tmp]  = tmp_off[src]
+                                          + (e->Iex.Binop.op == Iop_Add64 ? c : -c);
+         }
+         break;
+      }
+      case Ist_Store: {
+         IRExpr* addr  = stmt->Ist.Store.addr;
+         IRExpr* data  = stmt->Ist.Store.data;
+         IRType  ty    = typeOfIRExpr(bb_in->tyenv, data);
+         IRTemp  base  = IRTemp_INVALID;
+         Long    off   = 0;
+         if (addr->tag == Iex_RdTmp) {
+            base = tmp_base[addr->Iex.RdTmp.tmp];
+            off  = tmp_off[addr->Iex.RdTmp.tmp];
+         } else if (addr->tag == Iex_Const && addr->Iex.Const.con->tag == Ico_U64) {
+            off  = (Long)addr->Iex.Const.con->Ico.U64;
+         } else {
             break;
-         case Ity_D32:
-         case Ity_D64:
-            // TODO: add support for D32 and D64
+         }
+
+         IRExpr* words[MAX_RUN_WORDS];
+         UInt    n = store_words(bb_out, data, ty, words);
+         if (n == 0)
             break;
-         case Ity_INVALID:
+         Bool scalar = n == 1;
+         UInt width  = !scalar ? sizeof(HWord) : ty == Ity_I1 ? 1 : sizeofIRType(ty);
+
+         if (scalar && run.n > 0 && run.scalar && run.n < MAX_RUN_WORDS
+             && run.stride == width && run.base == base
+             && run.offset + (Long)(run.n * width) == off) {
+            run.words[run.n++] = words[0];
             break;
          }
+
+         flush_store_run(bb_out, &run);
+         run = (StoreRun){
+            .addr = addr, .base = base, .offset = off,
+            .stride = width, .n = n, .scalar = scalar
+         };
+         for (UInt w = 0; w < n; w++)
+            run.words[w] = words[w];
+         break;
+      }
+      case Ist_NoOp:
+      case Ist_IMark:
+      case Ist_AbiHint:
+      case Ist_Put:
+      case Ist_PutI:
+         break;
+      default:
+         // Exits, helper calls, atomics: log what was stored before them
+         flush_store_run(bb_out, &run);
+         break;
       }
 
       addStmtToIRSB(bb_out, stmt);
    }
+   flush_store_run(bb_out, &run);
 
+   VG_(free)(tmp_base);
+   VG_(free)(tmp_off);
    return bb_out;
 }
 
@@ -292,21 +1135,25 @@ INLINE IRSB* memlog_instrument(VgCallbackClosure* closure,
 INLINE void memlog_handle_new_block(MC_Chunk* mc) {
    if (mc->szB < MIN_BLOCK_SIZE) return;
 
-   ExeContext* where = MC_(allocated_at)(mc);
-   add_to_buffer(LOG_ALLOC, mc->data, 0, mc->szB, where);
+   if (clo_format != FORMAT_STATS) {
+      ExeContext* where = MC_(allocated_at)(mc);
+      add_block_event(LOG_ALLOC, mc->data, mc->szB, where);
+   }
 
-   insert_block_rb(mc);
+   insert_block_pt(mc);
 }
 
 INLINE void memlog_handle_free_block(MC_Chunk* mc) {
    if (mc->szB < MIN_BLOCK_SIZE) return;
 
-   ExeContext* where = MC_(freed_at)(mc);
-   add_to_buffer(LOG_FREE, mc->data, 0, mc->szB, where);
-   
-   rb_node_t * deleted = rb_delete(&tracked_blocks, mc->data);
+   if (clo_format != FORMAT_STATS) {
+      ExeContext* where = MC_(freed_at)(mc);
+      add_block_event(LOG_FREE, mc->data, mc->szB, where);
+   }
 
-   if (deleted) {
-      VG_(free)(deleted);
+   TrackedBlock* tb = remove_block_pt(mc);
+   if (tb) {
+      if (tb->stats) print_block_stats(tb);
+      release_block(tb);
    }
 }
\ No newline at end of file
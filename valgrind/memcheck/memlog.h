@@ -5,10 +5,12 @@
 #include "pub_tool_options.h"
 #include "pub_tool_addrinfo.h"
 #include "pub_tool_execontext.h"
-#include "rbtree.h"
 
 void  memlog_init(void);
+void  memlog_post_clo_init(void);
 void  memlog_fini(void);
+Bool  memlog_process_cmd_line_option(const HChar* arg);
+void  memlog_print_usage(void);
 IRSB* memlog_instrument(
     VgCallbackClosure* closure,
     IRSB* bb_in,